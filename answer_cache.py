@@ -0,0 +1,106 @@
+"""
+Semantic answer cache for generated answers.
+
+An entry is reused only when both hold:
+  - the new question's embedding has cosine similarity >= `threshold` with the cached question, and
+  - retrieval returned exactly the same (table, row_id, content_hash) documents.
+Because content hashes are part of the key, an entry stops matching as soon as one of its rows is
+re-indexed with new content (also when the re-index ran in another process). In-process re-indexing
+also drops those entries via invalidate_rows(). Entries expire after `ttl_s` and the cache is LRU
+bounded at `max_entries`.
+"""
+
+import math
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+def _unit(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def doc_id(meta: Dict[str, Any]) -> str:
+    return f"{meta.get('table')}:{meta.get('row_id')}"
+
+
+def fingerprint(metadatas: Iterable[Dict[str, Any]]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((doc_id(m), str(m.get("content_hash", ""))) for m in metadatas))
+
+
+class AnswerCache:
+    def __init__(self, threshold: float = 0.95, ttl_s: float = 3600, max_entries: int = 1000):
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()          # entry id -> (query unit vector, fingerprint, answer, created)
+        self._by_fingerprint: Dict[tuple, set] = {}
+        self._by_doc: Dict[str, set] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def get(self, query_embedding: Sequence[float], metadatas: Sequence[Dict[str, Any]]) -> Optional[str]:
+        key = fingerprint(metadatas)
+        query = _unit(query_embedding)
+        now = time.time()
+        with self._lock:
+            best_id, best_sim = None, self.threshold
+            for entry_id in list(self._by_fingerprint.get(key, ())):
+                vector, _, _, created = self._entries[entry_id]
+                if now - created > self.ttl_s:
+                    self._drop(entry_id)
+                    continue
+                sim = sum(a * b for a, b in zip(query, vector))
+                if sim >= best_sim:
+                    best_id, best_sim = entry_id, sim
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][2]
+
+    def put(self, query_embedding: Sequence[float], metadatas: Sequence[Dict[str, Any]], answer: str):
+        key = fingerprint(metadatas)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (_unit(query_embedding), key, answer, time.time())
+            self._by_fingerprint.setdefault(key, set()).add(entry_id)
+            for doc, _ in key:
+                self._by_doc.setdefault(doc, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_rows(self, doc_ids: Iterable[str]) -> int:
+        """Drop every entry built from any of the given '<table>:<row_id>' documents."""
+        with self._lock:
+            stale = set()
+            for doc in doc_ids:
+                stale |= self._by_doc.get(doc, set())
+            for entry_id in stale:
+                self._drop(entry_id)
+            return len(stale)
+
+    def _drop(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        key = entry[1]
+        self._by_fingerprint[key].discard(entry_id)
+        if not self._by_fingerprint[key]:
+            del self._by_fingerprint[key]
+        for doc, _ in key:
+            self._by_doc[doc].discard(entry_id)
+            if not self._by_doc[doc]:
+                del self._by_doc[doc]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
@@ -0,0 +1,209 @@
+"""
+Fake Ollama HTTP server for local testing and benchmarks.
+
+Implements the subset of the Ollama REST API this project uses:
+  POST /api/embed       {"model", "input": str | [str]}  -> {"embeddings": [[...], ...]}
+  POST /api/embeddings  {"model", "prompt": str}         -> {"embedding": [...]}
+  POST /api/chat        {"model", "messages", "stream"}  -> JSON or NDJSON stream
+  POST /api/generate    {"model", "prompt", "stream"}    -> JSON or NDJSON stream
+
+Vectors and tokens are deterministic (derived from a hash of the input), latency is configurable (plus
+random jitter, so concurrent requests finish out of order) and a fraction of requests can be failed with
+HTTP 503 to exercise client retries. For repeatable tests, the first --fail-first requests get a 503 and
+the next --hang-first stall for --hang-ms before answering, long enough for a client timeout. Prompt processing
+costs --prompt-token-ms per evaluated prompt token; like Ollama, the prefix shared with the previous
+prompt is reused from the KV cache, is not evaluated again and is left out of prompt_eval_count.
+
+Usage:
+    python bench/fake_ollama.py --port 11555 --latency-ms 50 --per-item-ms 2
+    OLLAMA_HOST=http://127.0.0.1:11555 python rag_chatbot_sqlserver_ollama.py --index
+"""
+
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+
+def fake_vector(text: str, dim: int) -> List[float]:
+    """Deterministic unit vector for a text (same text -> same vector)."""
+    values = []
+    counter = 0
+    while len(values) < dim:
+        digest = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+        values.extend((b - 127.5) / 127.5 for b in digest)
+        counter += 1
+    values = values[:dim]
+    norm = math.sqrt(sum(v * v for v in values)) or 1.0
+    return [v / norm for v in values]
+
+
+def fake_tokens(prompt: str, count: int) -> List[str]:
+    words = ["Based", "on", "the", "context", "the", "answer", "is", "listed", "below", "-", "item"]
+    seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+    return [words[(seed + i) % len(words)] + " " for i in range(count)]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately; without TCP_NODELAY each response waits on a delayed ACK
+    disable_nagle_algorithm = True
+    # set by start_server()
+    config = {}
+    stats = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _count(self, key: str, n: int = 1) -> int:
+        with self.stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + n
+            return self.stats[key]
+
+    def _send_json(self, status: int, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _sleep(self, items: int = 1):
+        cfg = self.config
+        time.sleep((cfg["latency_ms"] + cfg["per_item_ms"] * items + random.uniform(0, cfg["jitter_ms"])) / 1000.0)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "fake"}]})
+        elif self.path == "/stats":
+            with self.stats_lock:
+                self._send_json(200, dict(self.stats))
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        served = self._count("requests")
+        cfg = self.config
+        if served <= cfg["fail_first"] or random.random() < cfg["fail_rate"]:
+            self._count("failures")
+            self._sleep()
+            self._send_json(503, {"error": "fake overload"})
+            return
+        if served <= cfg["fail_first"] + cfg["hang_first"]:
+            self._count("hangs")
+            time.sleep(cfg["hang_ms"] / 1000.0)
+        dim = self.config["dim"]
+        if self.path == "/api/embed":
+            inputs = payload.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            self._count("embed_inputs", len(inputs))
+            self._sleep(len(inputs))
+            self._send_json(200, {"model": payload.get("model"), "embeddings": [fake_vector(t, dim) for t in inputs]})
+        elif self.path == "/api/embeddings":
+            self._count("embed_inputs")
+            self._sleep()
+            self._send_json(200, {"embedding": fake_vector(payload.get("prompt", ""), dim)})
+        elif self.path in ("/api/chat", "/api/generate"):
+            if self.path == "/api/chat":
+                prompt = "".join(m.get("content", "") for m in payload.get("messages", []))
+            else:
+                prompt = payload.get("prompt", "")
+            self._count("generations")
+            self._generate(payload, prompt)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _generate(self, payload, prompt: str):
+        cfg = self.config
+        tokens = fake_tokens(prompt, cfg["tokens"])
+        is_chat = self.path == "/api/chat"
+        with self.stats_lock:
+            previous, cfg["last_prompt"] = cfg["last_prompt"], prompt
+        reused = 0
+        for a, b in zip(previous, prompt):
+            if a != b:
+                break
+            reused += 1
+        prompt_eval_count = max(1, (len(prompt) - reused) // 4)
+        self._count("prompt_tokens_reused", reused // 4)
+
+        def chunk(text, done):
+            body = {"model": payload.get("model"), "created_at": "1970-01-01T00:00:00Z", "done": done}
+            if is_chat:
+                body["message"] = {"role": "assistant", "content": text}
+            else:
+                body["response"] = text
+            if done:
+                body.update({"done_reason": "stop", "prompt_eval_count": prompt_eval_count, "eval_count": len(tokens)})
+            return body
+
+        self._sleep()
+        time.sleep(cfg["prompt_token_ms"] * prompt_eval_count / 1000.0)
+        if payload.get("stream", True) is False:
+            time.sleep(cfg["token_ms"] * len(tokens) / 1000.0)
+            self._send_json(200, chunk("".join(tokens), True))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for part in [chunk(t, False) for t in tokens] + [chunk("", True)]:
+            time.sleep(cfg["token_ms"] / 1000.0)
+            line = (json.dumps(part) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, dim: int = 64, latency_ms: float = 0.0,
+                 per_item_ms: float = 0.0, token_ms: float = 0.0, tokens: int = 20, fail_rate: float = 0.0,
+                 prompt_token_ms: float = 0.0, jitter_ms: float = 0.0, fail_first: int = 0, hang_first: int = 0,
+                 hang_ms: float = 0.0):
+    """Start the fake server on a background thread. Returns (server, base_url); call server.shutdown() to stop.
+       server.RequestHandlerClass.stats counts requests, failures, hangs, embed_inputs and generations."""
+    handler = type("ConfiguredFakeOllamaHandler", (FakeOllamaHandler,), {
+        "config": {"dim": dim, "latency_ms": latency_ms, "per_item_ms": per_item_ms, "token_ms": token_ms,
+                   "tokens": tokens, "fail_rate": fail_rate, "prompt_token_ms": prompt_token_ms, "last_prompt": "",
+                   "jitter_ms": jitter_ms, "fail_first": fail_first, "hang_first": hang_first, "hang_ms": hang_ms},
+        "stats": {},
+        "stats_lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama HTTP server with deterministic output")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11555)
+    parser.add_argument("--dim", type=int, default=64, help="Embedding dimension")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Fixed latency per request")
+    parser.add_argument("--per-item-ms", type=float, default=2.0, help="Extra latency per embedded input")
+    parser.add_argument("--token-ms", type=float, default=5.0, help="Delay between generated tokens")
+    parser.add_argument("--tokens", type=int, default=20, help="Tokens per generated answer")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 503")
+    parser.add_argument("--prompt-token-ms", type=float, default=0.0, help="Delay per evaluated prompt token")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra latency per request, up to this")
+    parser.add_argument("--fail-first", type=int, default=0, help="Answer the first N requests with HTTP 503")
+    parser.add_argument("--hang-first", type=int, default=0, help="Stall the next N requests for --hang-ms")
+    parser.add_argument("--hang-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, url = start_server(args.host, args.port, args.dim, args.latency_ms, args.per_item_ms,
+                               args.token_ms, args.tokens, args.fail_rate, args.prompt_token_ms,
+                               args.jitter_ms, args.fail_first, args.hang_first, args.hang_ms)
+    print(f"[+] Fake Ollama listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,416 @@
+"""
+End-to-end benchmarks without SQL Server or Ollama.
+
+Rows come from a SQLite stand-in (bench/sqlite_db.py), embeddings and answers from the fake Ollama
+server (bench/fake_ollama.py) with configurable latency. Every run works in a fresh temporary state
+directory and prints one JSON document, so results can be stored and compared across commits.
+
+Scenarios:
+  index_full           load_and_index_all(full=True) on the largest size: docs/sec
+  index_incremental    re-index after changing --mutate of the rows, and a no-change re-index
+  retrieve             retrieve_context latency (p50/p95/p99) at each --sizes collection size
+  concurrent           answer_question throughput and latency at each --concurrency level
+  batch                a question workload answered one at a time (answer_question) and with answer_batch at each
+                       --concurrency level: questions/sec and the number of embedding and vector search calls
+  router               answer_question latency per route (sql / both / rag) with the query router, and the
+                       same questions with every one sent to vector RAG
+  context              answer latency and prompt size with context packing (CONTEXT_TOKEN_BUDGET) and without,
+                       at --context-top-k rows; pass --prompt-token-ms to charge for prompt processing
+  text_to_sql          repeated analytical questions without and with the SQL/result cache (sql_cache.py),
+                       and again after --mutate of the rows changed; the LLM is a --sql-llm-ms delay
+
+Usage:
+    python bench/main.py --sizes 1000,5000 --queries 200 --output bench.json
+    python bench/main.py --sizes 1000,5000 --baseline bench.json      # exit 1 on a >20% regression
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import platform
+import sqlite3
+import argparse
+import tempfile
+import subprocess
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+import rag_chatbot_sqlserver_ollama as rag
+from ollama import Client
+from fake_ollama import start_server
+from sql_cache import QueryCache, ResultCache, cached_query, normalize_question
+from sqlite_db import connect, mutate, populate, sample_questions, sql_questions, use_sqlite
+
+# metric name suffix -> whether a larger value is better (used by --baseline)
+_HIGHER_IS_BETTER = {"_per_s": True, "_ms": False, "_s": False}
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max (nearest rank) in milliseconds for samples in seconds."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    pick = lambda p: ordered[max(0, math.ceil(p / 100.0 * len(ordered)) - 1)]
+    return {"p50_ms": round(pick(50) * 1000, 3), "p95_ms": round(pick(95) * 1000, 3),
+            "p99_ms": round(pick(99) * 1000, 3), "max_ms": round(ordered[-1] * 1000, 3)}
+
+
+def configure(state_dir: str, db_path: str, ollama_url: str, args):
+    """Point the RAG module at the stand-ins and a private state directory, dropping any warm handles."""
+    rag._handles.clear()
+    rag.OLLAMA_HOST = ollama_url
+    rag.CHROMA_PERSIST_DIR = os.path.join(state_dir, "chroma_db")
+    rag.VECTOR_STORE_DIR = os.path.join(state_dir, "vectors")
+    rag.EMBED_CACHE_PATH = os.path.join(state_dir, "embedding_cache.sqlite3")
+    rag.GEO_INDEX_PATH = os.path.join(state_dir, "geo_index.sqlite3")
+    rag.LEXICAL_INDEX_PATH = os.path.join(state_dir, "lexical_index.sqlite3")
+    rag.RELATION_INDEX_PATH = os.path.join(state_dir, "relation_index.sqlite3")
+    rag.VECTOR_BACKEND = args.backend
+    rag.RETRIEVAL_MODE = args.retrieval_mode
+    # cached embeddings/answers would hide the cost being measured
+    rag.EMBED_CACHE = False
+    rag.ANSWER_CACHE = False
+    # every question takes the vector RAG path unless a scenario measures the router
+    rag.ROUTER = False
+    use_sqlite(rag, db_path)
+
+
+def stage_means() -> Dict[str, float]:
+    """Mean milliseconds per call of every stage recorded since the last metrics.reset()."""
+    return {key[0]: round(total / count * 1000, 3)
+            for key, (total, count, _) in sorted(metrics.STAGE_SECONDS.series().items()) if count}
+
+
+def build_database(path: str, rows: int, seed: int):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = connect(path)
+    populate(conn, persons=rows // 2, events=rows - rows // 2, seed=seed)
+    conn.close()
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def index_scenarios(work: str, ollama_url: str, args) -> Dict[str, Any]:
+    rows = max(args.sizes)
+    db_path = os.path.join(work, f"rows_{rows}.sqlite3")
+    build_database(db_path, rows, args.seed)
+    state_dir = os.path.join(work, "state_index")
+    configure(state_dir, db_path, ollama_url, args)
+
+    _, full_s = timed(rag.load_and_index_all, full=True)
+    results = {"index_full": {"rows": rows, "chunks": rag.get_query_collection().count(),
+                              "wall_s": round(full_s, 3), "docs_per_s": round(rows / full_s, 1)}}
+
+    _, noop_s = timed(rag.load_and_index_all)
+    conn = connect(db_path)
+    changes = mutate(conn, args.mutate, seed=args.seed + 1)
+    conn.close()
+    _, incr_s = timed(rag.load_and_index_all)
+    results["index_incremental"] = {"rows": rows, "changes": changes, "unchanged_wall_s": round(noop_s, 3),
+                                    "unchanged_docs_per_s": round(rows / noop_s, 1),
+                                    "wall_s": round(incr_s, 3), "docs_per_s": round(rows / incr_s, 1)}
+    return results
+
+
+def retrieve_scenario(work: str, ollama_url: str, args) -> Dict[str, Any]:
+    results = {}
+    for size in args.sizes:
+        db_path = os.path.join(work, f"rows_{size}.sqlite3")
+        if not os.path.exists(db_path):
+            build_database(db_path, size, args.seed)
+        configure(os.path.join(work, f"state_{size}"), db_path, ollama_url, args)
+        rag.load_and_index_all(full=True)
+        conn = connect(db_path)
+        questions = sample_questions(conn, args.queries, seed=args.seed + 2)
+        conn.close()
+        rag.retrieve_context(questions[0], args.top_k)     # warm the handles
+        metrics.reset()
+        latencies = [timed(rag.retrieve_context, q, args.top_k)[1] for q in questions]
+        results[str(size)] = {"rows": size, "chunks": rag.get_query_collection().count(),
+                              "queries": len(questions), **percentiles(latencies),
+                              "stage_mean_ms": stage_means()}
+    return results
+
+
+def concurrent_scenario(work: str, ollama_url: str, args) -> Dict[str, Any]:
+    size = min(args.sizes)
+    db_path = os.path.join(work, f"rows_{size}.sqlite3")
+    if not os.path.exists(db_path):
+        build_database(db_path, size, args.seed)
+    configure(os.path.join(work, f"state_{size}"), db_path, ollama_url, args)
+    # no-op when the retrieve scenario already indexed this size
+    rag.load_and_index_all()
+    conn = connect(db_path)
+    questions = sample_questions(conn, args.queries, seed=args.seed + 3)
+    conn.close()
+    results = {}
+    for workers in args.concurrency:
+        rag._handles.pop("llm_slots", None)
+        rag.LLM_CONCURRENCY = workers
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            start = time.perf_counter()
+            latencies = list(pool.map(lambda q: timed(rag.answer_question, q, args.top_k)[1], questions))
+            elapsed = time.perf_counter() - start
+        results[str(workers)] = {"workers": workers, "questions": len(questions), "wall_s": round(elapsed, 3),
+                                 "questions_per_s": round(len(questions) / elapsed, 2), **percentiles(latencies)}
+    return results
+
+
+def context_scenario(work: str, ollama_url: str, args) -> Dict[str, Any]:
+    size = min(args.sizes)
+    db_path = os.path.join(work, f"rows_{size}.sqlite3")
+    if not os.path.exists(db_path):
+        build_database(db_path, size, args.seed)
+    configure(os.path.join(work, f"state_{size}"), db_path, ollama_url, args)
+    rag.load_and_index_all()
+    conn = connect(db_path)
+    questions = sample_questions(conn, args.queries, seed=args.seed + 7)
+    conn.close()
+    budget = rag.CONTEXT_TOKEN_BUDGET
+    results = {}
+    for name, rag_budget in (("unpacked", 0), ("packed", budget)):
+        rag.CONTEXT_TOKEN_BUDGET = rag_budget
+        rag.warm_llm()
+        answers = [timed(rag.answer_question, q, args.context_top_k) for q in questions]
+        mean = lambda key: round(sum(a["timings"][key] or 0 for a, _ in answers) / len(answers), 1)
+        results[name] = {"questions": len(answers), "top_k": args.context_top_k,
+                         "context_tokens_mean": mean("context_tokens"), "prompt_tokens_mean": mean("prompt_tokens"),
+                         "ttft_p50_ms": percentiles([a["timings"]["ttft_s"] for a, _ in answers])["p50_ms"],
+                         **percentiles([seconds for _, seconds in answers])}
+    rag.CONTEXT_TOKEN_BUDGET = budget
+    return results
+
+
+def stage_calls(*names: str) -> Dict[str, int]:
+    series = metrics.STAGE_SECONDS.series()
+    return {f"{name}_calls": series.get((name,), (0, 0, 0))[1] for name in names}
+
+
+def batch_scenario(work: str, ollama_url: str, args) -> Dict[str, Any]:
+    size = min(args.sizes)
+    db_path = os.path.join(work, f"rows_{size}.sqlite3")
+    if not os.path.exists(db_path):
+        build_database(db_path, size, args.seed)
+    configure(os.path.join(work, f"state_{size}"), db_path, ollama_url, args)
+    rag.load_and_index_all()
+    conn = connect(db_path)
+    questions = sample_questions(conn, args.queries, seed=args.seed + 8)
+    conn.close()
+    rag.retrieve_context(questions[0], args.top_k)     # warm the handles
+
+    def measure(answer_all) -> Dict[str, Any]:
+        metrics.reset()
+        answers, elapsed = timed(answer_all)
+        return {"questions": len(answers), "failed": sum("error" in a for a in answers), "wall_s": round(elapsed, 3),
+                "questions_per_s": round(len(answers) / elapsed, 2), **stage_calls("embed", "vector_query")}
+
+    results = {"sequential": measure(lambda: [rag.answer_question(q, args.top_k) for q in questions])}
+    for workers in args.concurrency:
+        rag._handles.pop("llm_slots", None)
+        rag.LLM_CONCURRENCY = workers
+        requests = [{"id": i, "question": q} for i, q in enumerate(questions)]
+        results[f"batch_{workers}"] = measure(lambda: list(rag.answer_batch(requests, args.top_k, workers)))
+    return results
+
+
+def router_scenario(work: str, ollama_url: str, args) -> Dict[str, Any]:
+    size = min(args.sizes)
+    db_path = os.path.join(work, f"rows_{size}.sqlite3")
+    if not os.path.exists(db_path):
+        build_database(db_path, size, args.seed)
+    configure(os.path.join(work, f"state_{size}"), db_path, ollama_url, args)
+    rag.load_and_index_all()
+    conn = connect(db_path)
+    questions = sample_questions(conn, args.queries, seed=args.seed + 6)
+    conn.close()
+    results = {}
+    for routed in (False, True):
+        rag.ROUTER = routed
+        rag._handles.pop("sql_results", None)
+        latencies: Dict[str, List[float]] = {}
+        for question in questions:
+            answer, seconds = timed(rag.answer_question, question, args.top_k)
+            latencies.setdefault(answer["route"], []).append(seconds)
+        results["routed" if routed else "rag_only"] = {
+            route: {"questions": len(samples), **percentiles(samples)} for route, samples in sorted(latencies.items())}
+    rag.ROUTER = False
+    return results
+
+
+def text_to_sql_scenario(work: str, ollama_url: str, args) -> Dict[str, Any]:
+    size = min(args.sizes)
+    db_path = os.path.join(work, f"sql_{size}.sqlite3")        # own copy: this scenario writes to it
+    build_database(db_path, size, args.seed)
+    conn = connect(db_path)
+    questions = sql_questions(conn, args.queries, seed=args.seed + 4)
+    conn.close()
+    sql_for = {normalize_question(q): sql for q, sql in questions}
+    tables = ["Person", "Event", "EventPerson"]
+    db = sqlite3.connect(db_path)
+    client = Client(host=ollama_url)
+    calls = {"llm": 0, "db": 0}
+
+    def write_sql(question: str) -> str:
+        calls["llm"] += 1
+        time.sleep(args.sql_llm_ms / 1000.0)
+        return sql_for[normalize_question(question)]
+
+    def run_sql(sql: str) -> Dict[str, Any]:
+        calls["db"] += 1
+        cursor = db.execute(sql)
+        return {"columns": [d[0] for d in cursor.description], "rows": cursor.fetchall()}
+
+    def embed(question: str) -> List[float]:
+        return client.embed(model=rag.EMBED_MODEL, input=[question])["embeddings"][0]
+
+    # PRAGMA data_version changes when another connection commits: one write version for every table
+    versions = lambda: dict.fromkeys(tables, db.execute("PRAGMA data_version").fetchone()[0])
+    queries, results = QueryCache(), ResultCache(versions=versions, check_interval_s=0)
+
+    def run(answer) -> Dict[str, Any]:
+        calls.update(llm=0, db=0)
+        sql_hits, result_hits = queries.hits, results.hits
+        latencies = [timed(answer, q)[1] for q, _ in questions]
+        return {"queries": len(questions), "llm_calls": calls["llm"], "db_queries": calls["db"],
+                "sql_hit_rate": round((queries.hits - sql_hits) / len(questions), 4),
+                "result_hit_rate": round((results.hits - result_hits) / len(questions), 4), **percentiles(latencies)}
+
+    cached = lambda q: cached_query(q, write_sql, run_sql, queries, results, tables, embed=embed)
+    report = {"rows": size, "distinct_questions": len(sql_for),
+              "uncached": run(lambda q: run_sql(write_sql(q))), "cached": run(cached)}
+    writer = connect(db_path)
+    report["changes"] = mutate(writer, args.mutate, seed=args.seed + 5)
+    writer.close()
+    report["after_write"] = run(cached)
+    db.close()
+    return report
+
+
+def run_scenarios(scenarios: List[str], work: str, ollama_url: str, args, results: Dict[str, Any]):
+    if "index" in scenarios:
+        results.update(index_scenarios(work, ollama_url, args))
+    if "retrieve" in scenarios:
+        results["retrieve"] = retrieve_scenario(work, ollama_url, args)
+    if "concurrent" in scenarios:
+        results["concurrent"] = concurrent_scenario(work, ollama_url, args)
+    if "batch" in scenarios:
+        results["batch"] = batch_scenario(work, ollama_url, args)
+    if "context" in scenarios:
+        results["context"] = context_scenario(work, ollama_url, args)
+    if "router" in scenarios:
+        results["router"] = router_scenario(work, ollama_url, args)
+    if "text_to_sql" in scenarios:
+        results["text_to_sql"] = text_to_sql_scenario(work, ollama_url, args)
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Metrics that got worse than the baseline by more than `tolerance` (a fraction)."""
+    regressions = []
+    base = flatten(baseline["results"])
+    for name, value in flatten(current["results"]).items():
+        better = next((v for suffix, v in _HIGHER_IS_BETTER.items() if name.endswith(suffix)), None)
+        old = base.get(name)
+        if better is None or not old:
+            continue
+        change = (value - old) / old
+        if (better and change < -tolerance) or (not better and change > tolerance):
+            regressions.append(f"{name}: {old} -> {value} ({change:+.0%})")
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG pipeline benchmarks against local stand-ins")
+    parser.add_argument("--sizes", default="1000,5000", help="Comma-separated row counts for the retrieve scenario")
+    parser.add_argument("--queries", type=int, default=200, help="Questions per retrieve/concurrency run")
+    parser.add_argument("--concurrency", default="1,4,8", help="Comma-separated worker counts")
+    parser.add_argument("--mutate", type=float, default=0.05, help="Fraction of rows changed before re-indexing")
+    parser.add_argument("--scenarios", default="index,retrieve,concurrent")
+    parser.add_argument("--backend", default=rag.VECTOR_BACKEND, choices=["chroma", "numpy"])
+    parser.add_argument("--retrieval-mode", default=rag.RETRIEVAL_MODE, choices=["hybrid", "vector", "lexical"])
+    parser.add_argument("--top-k", type=int, default=rag.TOP_K)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dim", type=int, default=384, help="Fake embedding dimension")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Fake Ollama latency per request")
+    parser.add_argument("--per-item-ms", type=float, default=0.5, help="Fake Ollama latency per embedded input")
+    parser.add_argument("--token-ms", type=float, default=2.0, help="Fake Ollama delay between tokens")
+    parser.add_argument("--tokens", type=int, default=40, help="Tokens per fake answer")
+    parser.add_argument("--prompt-token-ms", type=float, default=0.0,
+                        help="Fake Ollama delay per evaluated prompt token (a prefix reused from the last prompt is free)")
+    parser.add_argument("--context-top-k", type=int, default=8, help="Rows retrieved per question in the context scenario")
+    parser.add_argument("--sql-llm-ms", type=float, default=50.0, help="Stand-in LLM delay per generated SQL query")
+    parser.add_argument("--output", help="Write the JSON results to this file as well as stdout")
+    parser.add_argument("--baseline", help="Earlier results file; exit 1 if a metric regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression for --baseline")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary work directory")
+    args = parser.parse_args()
+    args.sizes = [int(s) for s in args.sizes.split(",")]
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    metrics.configure_logging(rag.LOG_LEVEL, rag.LOG_FORMAT)
+    scenarios = args.scenarios.split(",")
+
+    server, url = start_server(dim=args.dim, latency_ms=args.latency_ms, per_item_ms=args.per_item_ms,
+                               token_ms=args.token_ms, tokens=args.tokens,
+                               prompt_token_ms=args.prompt_token_ms)
+    work = tempfile.mkdtemp(prefix="rag_bench_")
+    results: Dict[str, Any] = {}
+    try:
+        # any progress output goes to stderr so stdout stays valid JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            run_scenarios(scenarios, work, url, args, results)
+    finally:
+        server.shutdown()
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+    report = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": git_commit(),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "params": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "keep")}},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"[!] Regression: {line}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
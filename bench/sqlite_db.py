@@ -0,0 +1,174 @@
+"""
+SQLite stand-in for the SQL Server Person / Event / EventPerson schema, used by the benchmarks.
+
+Rows are generated deterministically from a seed: Events are placed around a fixed set of US cities
+(so date, place and radius questions have answers), and EventPerson links are skewed so a few people
+appear in many events. use_sqlite() points the RAG module at the SQLite file instead of SQL Server.
+
+Usage:
+    python bench/sqlite_db.py bench.sqlite3 --persons 10000 --events 10000
+"""
+
+import os
+import random
+import sqlite3
+import argparse
+import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS Person (Id INTEGER PRIMARY KEY, Name TEXT, SSN TEXT, BioData TEXT, Education TEXT, Work TEXT);
+CREATE TABLE IF NOT EXISTS Event (Id INTEGER PRIMARY KEY, Subject TEXT, Date TEXT, Source TEXT, Latitude REAL,
+                                  Longitude REAL, Address TEXT, Description TEXT);
+CREATE TABLE IF NOT EXISTS EventPerson (EventId INTEGER NOT NULL, PersonId INTEGER NOT NULL,
+                                        PRIMARY KEY (EventId, PersonId));
+"""
+
+# Same columns as PERSON_SQL / EVENT_SQL in rag_chatbot_sqlserver_ollama.py, in SQLite syntax
+PERSON_SQL = "SELECT Id, Name, SSN, BioData, Education, Work FROM Person"
+EVENT_SQL = "SELECT e.Id, e.Subject, e.Date, e.Source, e.Latitude, e.Longitude, e.Address, e.Description FROM Event e"
+
+CITIES = [("Washington", "DC", 38.9072, -77.0369), ("New York", "NY", 40.7128, -74.0060),
+          ("Austin", "TX", 30.2672, -97.7431), ("Seattle", "WA", 47.6062, -122.3321),
+          ("Chicago", "IL", 41.8781, -87.6298), ("Denver", "CO", 39.7392, -104.9903),
+          ("Boston", "MA", 42.3601, -71.0589), ("Atlanta", "GA", 33.7490, -84.3880)]
+FIRST = ["John", "Mary", "James", "Linda", "Robert", "Susan", "Michael", "Karen", "David", "Lisa", "Daniel", "Nancy"]
+LAST = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Lopez", "Wilson", "Moore"]
+PROFESSIONS = ["doctor", "engineer", "teacher", "lawyer", "nurse", "architect", "journalist", "accountant"]
+SUBJECTS = ["Climate Change summit", "Tech expo", "Health conference", "Trade fair", "Town hall meeting",
+            "Charity gala", "Science festival", "Election debate"]
+WORDS = ("community project budget policy report meeting research program public local national review "
+         "support market energy education health security network design plan growth data").split()
+
+
+def _sentences(rng: random.Random, count: int) -> str:
+    return " ".join(" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14))).capitalize() + "."
+                    for _ in range(count))
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Connection whose rows support attribute access like pyodbc rows; usable from the fetch thread."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = lambda cursor, row: SimpleNamespace(**{d[0]: v for d, v in zip(cursor.description, row)})
+    return conn
+
+
+def _person(rng: random.Random, person_id: int) -> tuple:
+    profession = rng.choice(PROFESSIONS)
+    return (person_id, f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+            f"{rng.randint(100, 899):03d}-{rng.randint(1, 99):02d}-{rng.randint(1, 9999):04d}",
+            f"Works as a {profession}. " + _sentences(rng, rng.randint(2, 8)),
+            _sentences(rng, rng.randint(1, 3)), f"{profession.capitalize()}. " + _sentences(rng, rng.randint(1, 3)))
+
+
+def _event(rng: random.Random, event_id: int) -> tuple:
+    city, state, lat, lon = rng.choice(CITIES)
+    day = datetime.date(2022, 1, 1) + datetime.timedelta(days=rng.randint(0, 3 * 365))
+    return (event_id, rng.choice(SUBJECTS), day.isoformat(), f"Source {rng.randint(1, 50)}",
+            round(lat + rng.uniform(-0.3, 0.3), 6), round(lon + rng.uniform(-0.3, 0.3), 6),
+            f"{rng.randint(1, 9999)} Main St, {city}, {state} {rng.randint(10000, 99999)}",
+            _sentences(rng, rng.randint(2, 10)))
+
+
+def _links(rng: random.Random, event_id: int, persons: int) -> List[tuple]:
+    # pareto-distributed person ids: a few people are linked to a large share of the events
+    count = min(persons, rng.randint(1, 5))
+    chosen = {min(persons, int(rng.paretovariate(1.2))) for _ in range(count)}
+    chosen |= {rng.randint(1, persons) for _ in range(count - len(chosen))}
+    return [(event_id, person_id) for person_id in sorted(chosen)]
+
+
+def populate(conn: sqlite3.Connection, persons: int, events: int, seed: int = 0, batch: int = 5000):
+    """Create the schema and insert the rows in batches (all persons first, so every link is valid)."""
+    rng = random.Random(seed)
+    conn.executescript(SCHEMA)
+    for start in range(1, persons + 1, batch):
+        conn.executemany("INSERT INTO Person VALUES (?, ?, ?, ?, ?, ?)",
+                         [_person(rng, i) for i in range(start, min(start + batch, persons + 1))])
+    for start in range(1, events + 1, batch):
+        ids = range(start, min(start + batch, events + 1))
+        conn.executemany("INSERT INTO Event VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [_event(rng, i) for i in ids])
+        conn.executemany("INSERT INTO EventPerson VALUES (?, ?)", [l for i in ids for l in _links(rng, i, persons)])
+    conn.commit()
+
+
+def mutate(conn: sqlite3.Connection, fraction: float, seed: int = 1) -> Dict[str, int]:
+    """Change a fraction of the rows the way a day of edits would: updated text, new and deleted rows."""
+    rng = random.Random(seed)
+    max_person = conn.execute("SELECT MAX(Id) AS n FROM Person").fetchone().n
+    max_event = conn.execute("SELECT MAX(Id) AS n FROM Event").fetchone().n
+    n_person, n_event = max(1, int(max_person * fraction)), max(1, int(max_event * fraction))
+    updated = rng.sample(range(1, max_person + 1), n_person)
+    conn.executemany("UPDATE Person SET BioData = ? WHERE Id = ?", [(_sentences(rng, 4), i) for i in updated])
+    updated_events = rng.sample(range(1, max_event + 1), n_event)
+    conn.executemany("UPDATE Event SET Description = ? WHERE Id = ?", [(_sentences(rng, 4), i) for i in updated_events])
+    # a tenth of the changes are deletions and inserts
+    deleted = rng.sample(range(1, max_event + 1), max(1, n_event // 10))
+    conn.executemany("DELETE FROM EventPerson WHERE EventId = ?", [(i,) for i in deleted])
+    conn.executemany("DELETE FROM Event WHERE Id = ?", [(i,) for i in deleted])
+    new_ids = range(max_event + 1, max_event + 1 + max(1, n_event // 10))
+    conn.executemany("INSERT INTO Event VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [_event(rng, i) for i in new_ids])
+    conn.executemany("INSERT INTO EventPerson VALUES (?, ?)", [l for i in new_ids for l in _links(rng, i, max_person)])
+    conn.commit()
+    return {"persons_updated": n_person, "events_updated": n_event, "events_deleted": len(deleted),
+            "events_inserted": len(new_ids)}
+
+
+def sample_questions(conn: sqlite3.Connection, count: int, seed: int = 2) -> List[str]:
+    """Questions mixing names, subjects, dates and places that exist in the data."""
+    rng = random.Random(seed)
+    names = [r.Name for r in conn.execute("SELECT Name FROM Person ORDER BY Id LIMIT 500").fetchall()]
+    templates = [
+        lambda: f"Who is {rng.choice(names)}?",
+        lambda: f"What events involved {rng.choice(names)}?",
+        lambda: f"Which {rng.choice(PROFESSIONS)}s are in the records?",
+        lambda: f"List the {rng.choice(SUBJECTS)} events in {rng.choice(['March', 'June', 'October'])} {rng.randint(2022, 2024)}",
+        lambda: "What events happened in {} {}?".format(*rng.choice(CITIES)[:2]),
+        lambda: "Events within 25 km of {} {}".format(*rng.choice(CITIES)[:2]),
+    ]
+    return [rng.choice(templates)() for _ in range(count)]
+
+
+def sql_questions(conn: sqlite3.Connection, count: int, seed: int = 4, distinct: int = 40) -> List[tuple]:
+    """(question, SQL) pairs for the text-to-SQL benchmark: `count` draws from `distinct` analytical
+       questions, asked with varying case and punctuation. The SQL stands in for what the LLM would write."""
+    rng = random.Random(seed)
+    names = [r.Name for r in conn.execute("SELECT DISTINCT Name FROM Person ORDER BY Name LIMIT 20").fetchall()]
+    pool = [("How many Persons are there?", "SELECT COUNT(*) AS n FROM Person"),
+            ("What are the most common event subjects?",
+             "SELECT Subject, COUNT(*) AS n FROM Event GROUP BY Subject ORDER BY n DESC LIMIT 10")]
+    pool += [(f"How many events were held in {year}?", f"SELECT COUNT(*) AS n FROM Event WHERE Date LIKE '{year}-%'")
+             for year in (2022, 2023, 2024)]
+    pool += [(f"How many events took place in {city}?",
+              f"SELECT COUNT(*) AS n FROM Event WHERE Address LIKE '%{city}, {state}%'") for city, state, _, _ in CITIES]
+    pool += [(f"How many events did {name} attend?",
+              f"SELECT COUNT(*) AS n FROM EventPerson ep JOIN Person p ON p.Id = ep.PersonId WHERE p.Name = '{name}'")
+             for name in names]
+    pool += [(f"Which {work}s attended the most events?",
+              "SELECT p.Name, COUNT(*) AS n FROM Person p JOIN EventPerson ep ON ep.PersonId = p.Id "
+              f"WHERE p.Work LIKE '{work.capitalize()}%' GROUP BY p.Id ORDER BY n DESC LIMIT 10") for work in PROFESSIONS]
+    pool = rng.sample(pool, min(distinct, len(pool)))
+    variants = [lambda q: q, str.lower, lambda q: q.rstrip("?"), lambda q: " " + q.replace(" ", "  ")]
+    return [(rng.choice(variants)(q), sql) for q, sql in (rng.choice(pool) for _ in range(count))]
+
+
+def use_sqlite(rag: Any, path: str):
+    """Make the RAG module read rows from the SQLite file instead of SQL Server."""
+    rag.get_sql_connection = lambda: connect(path)
+    rag.SQL_DIALECT = "sqlite"
+    rag.PERSON_SQL = PERSON_SQL
+    rag.EVENT_SQL = EVENT_SQL
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create a SQLite Person/Event/EventPerson database for benchmarks")
+    parser.add_argument("path")
+    parser.add_argument("--persons", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if os.path.exists(args.path):
+        os.remove(args.path)
+    populate(connect(args.path), args.persons, args.events, args.seed)
+    print(f"[+] Wrote {args.persons} persons and {args.events} events to {args.path}")
@@ -0,0 +1,68 @@
+"""
+Field-aware chunking of row documents.
+
+A row is described by an identity line (e.g. "Person Id: 7 | Name: John Smith"), short fields
+(Name, Date, Address, ...) and long free-text fields (BioData, Education, Work, Description).
+Long fields are split on sentence boundaries into windows of at most `size` words that overlap by
+about `overlap` words; the pieces are then packed into chunks, each starting with the identity line
+so a chunk is still meaningful on its own. Every chunk links back to its parent row.
+"""
+
+import re
+from typing import List, Sequence, Tuple
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in _SENTENCE_RE.split(" ".join(str(text).split())) if s]
+
+
+def window_passages(text: str, size: int, overlap: int) -> List[str]:
+    """Sentence windows of at most `size` words; consecutive windows share ~`overlap` words."""
+    sentences = []
+    for sentence in split_sentences(text):
+        words = sentence.split()
+        # a single over-long sentence is cut on word boundaries
+        for i in range(0, len(words), size):
+            sentences.append(words[i:i + size])
+    passages, window = [], []
+    for sentence in sentences:
+        if window and sum(map(len, window)) + len(sentence) > size:
+            passages.append(" ".join(w for s in window for w in s))
+            carried = []
+            while window and sum(map(len, carried)) < overlap:
+                carried.insert(0, window.pop())
+            # never carry so much that the next sentence would not fit
+            while carried and sum(map(len, carried)) + len(sentence) > size:
+                carried.pop(0)
+            window = carried
+        window.append(sentence)
+    if window:
+        passages.append(" ".join(w for s in window for w in s))
+    return passages
+
+
+def chunk_fields(short_fields: Sequence[Tuple[str, str]], long_fields: Sequence[Tuple[str, str]],
+                 size: int, overlap: int) -> List[str]:
+    """Chunk bodies for one row. The first chunk holds the short fields; long-field passages are packed
+       after them while they fit in `size` words. size <= 0 disables chunking (one body with every field)."""
+    head = [f"{label}: {value}" for label, value in short_fields]
+    if size <= 0:
+        return ["\n".join(head + [f"{label}: {value}" for label, value in long_fields])]
+    pieces = []
+    for label, value in long_fields:
+        passages = window_passages(value, size, overlap) if str(value or "").strip() else [""]
+        pieces += [f"{label}: {p}" for p in passages]
+    bodies, current = [], list(head)
+    count = sum(len(line.split()) for line in current)
+    for piece in pieces:
+        words = len(piece.split())
+        if current and count + words > size:
+            bodies.append("\n".join(current))
+            current, count = [], 0
+        current.append(piece)
+        count += words
+    if current:
+        bodies.append("\n".join(current))
+    return bodies
@@ -0,0 +1,178 @@
+"""
+Context assembly for the answer prompt: trimming, near-duplicate removal and packing into a token budget.
+
+Retrieved rows arrive ranked. pack_context():
+  1. trims each row to what the question needs. It keeps the identity line and short fields. Long
+     free-text fields (Bio, Education, Work, Description) are cut to the sentences that share words with
+     the question, or dropped; a field the question asks about by name keeps its opening sentences.
+     SSN, coordinates and Source are dropped unless the question mentions them;
+  2. orders the rows by maximal marginal relevance (retrieval rank vs. similarity to the rows already
+     chosen, over bag-of-words vectors) and drops rows with cosine >= `dedup_threshold` to a chosen one;
+  3. adds rows until `budget` estimated tokens are used, cutting the last row to fit.
+Pinned blocks (the router's SQL result) go first and count against the same budget. With retrieved rows to
+follow they get at most PINNED_SHARE of it; a list too long keeps its first rows and says how many are shown.
+
+Tokens are estimated at about 4 characters each, which is close enough for budgeting without a tokenizer.
+"""
+
+import re
+import math
+from collections import Counter
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+CHARS_PER_TOKEN = 4
+MIN_PARTIAL_TOKENS = 48          # a cut-down last block must still say something
+PINNED_SHARE = 0.5               # most of the budget pinned blocks take when retrieved rows follow them
+
+LONG_FIELDS = {"Bio", "Education", "Work", "Description"}
+# field -> words in the question that ask for it
+FIELD_HINTS = {
+    "Bio": ("bio", "biography", "background", "who is", "who was", "about"),
+    "Education": ("education", "educated", "study", "studied", "degree", "school", "university"),
+    "Work": ("work", "works", "job", "profession", "occupation", "career", "employ"),
+    "Description": ("describe", "description", "about", "what happened", "details", "summary"),
+}
+DROP_UNLESS_ASKED = {"SSN": ("ssn", "social security"), "Latitude": ("latitude", "coordinate"),
+                     "Longitude": ("longitude", "coordinate"), "Source": ("source",)}
+STOPWORDS = set("a an and are as at be by did do does for from had has have he her him his how i in is it its "
+                "list me of on or she show that the their them there they this to was were what when where "
+                "which who whom why with".split())
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_FIELD_RE = re.compile(r"^([A-Z][A-Za-z ]*?): (.*)$")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _stem(word: str) -> str:
+    # plural -> singular is enough for "doctors" to match "Doctor"
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def terms(text: str) -> List[str]:
+    return [_stem(w) for w in _WORD_RE.findall(text.lower()) if w not in STOPWORDS and len(w) > 1]
+
+
+def _asks_for(question: str, hints: Sequence[str]) -> bool:
+    return any(re.search(r"\b" + re.escape(h), question) for h in hints)
+
+
+def trim_document(text: str, question: str) -> str:
+    """The lines of a row document that matter for the question (see module docstring)."""
+    q = question.lower()
+    q_terms = set(terms(question))
+    kept: List[str] = []
+    for line in text.split("\n"):
+        if line == "...":
+            continue
+        match = _FIELD_RE.match(line)
+        label = match.group(1) if match else None
+        if label in DROP_UNLESS_ASKED and not _asks_for(q, DROP_UNLESS_ASKED[label]):
+            continue
+        if label not in LONG_FIELDS:
+            kept.append(line)
+            continue
+        sentences = _SENTENCE_RE.split(match.group(2))
+        matching = [s for s in sentences if q_terms & set(terms(s))]
+        if not matching and _asks_for(q, FIELD_HINTS[label]):
+            matching = sentences[:2]
+        if matching:
+            kept.append(f"{label}: {' '.join(matching)}")
+    return "\n".join(kept)
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    dot = sum(v * b.get(k, 0) for k, v in a.items())
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+def mmr_order(texts: Sequence[str], mmr_lambda: float = 0.7, dedup_threshold: float = 0.9) -> Tuple[List[int], int]:
+    """(indexes of `texts` in MMR order, number dropped as near-duplicates); texts are ranked best first."""
+    vectors = [Counter(terms(t)) for t in texts]
+    relevance = [1.0 - i / len(texts) for i in range(len(texts))]
+    remaining, chosen, duplicates = list(range(len(texts))), [], 0
+    while remaining:
+        best, best_score = None, -math.inf
+        for i in list(remaining):
+            similarity = max((_cosine(vectors[i], vectors[j]) for j in chosen), default=0.0)
+            if similarity >= dedup_threshold:
+                remaining.remove(i)
+                duplicates += 1
+                continue
+            score = mmr_lambda * relevance[i] - (1 - mmr_lambda) * similarity
+            if score > best_score:
+                best, best_score = i, score
+        if best is None:
+            break
+        chosen.append(best)
+        remaining.remove(best)
+    return chosen, duplicates
+
+
+def _cut(text: str, tokens: int) -> str:
+    limit = tokens * CHARS_PER_TOKEN - 2
+    cut = text[:limit]
+    # end on a line, else a word boundary
+    end = cut.rfind("\n") if cut.rfind("\n") > limit // 2 else cut.rfind(" ")
+    return cut[:end if end > 0 else limit].rstrip() + " …"
+
+
+def cut_rows(text: str, tokens: int) -> str:
+    """A "- row" list cut to about `tokens`: heading lines, as many rows as fit, then "(first N of M rows shown)"."""
+    lines = text.split("\n")
+    rows = [line for line in lines if line.startswith("- ")]
+    marker = f"(first {len(rows)} of {len(rows)} rows shown)"
+    kept = lines[:lines.index(rows[0])] if rows else lines
+    used = estimate_tokens("\n".join(kept + [marker]))
+    shown = 0
+    for row in rows:
+        cost = estimate_tokens("\n" + row)
+        if used + cost > tokens:
+            break
+        kept.append(row)
+        used += cost
+        shown += 1
+    if shown == len(rows):
+        return text if estimate_tokens(text) <= tokens else _cut(text, tokens)
+    return "\n".join(kept + [f"(first {shown} of {len(rows)} rows shown)"])
+
+
+def pack_context(docs: Sequence[Dict[str, Any]], question: str, budget: int, mmr_lambda: float = 0.7,
+                 dedup_threshold: float = 0.9, header: Callable[[int, Dict[str, Any]], str] = lambda i, d: "",
+                 pinned: Callable[[Dict[str, Any]], bool] = lambda d: False) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """(packed docs, stats). Each packed doc is a copy of the input with "doc" replaced by its trimmed text.
+       `header(i, doc)` is the block heading counted against the budget; `pinned` docs are not trimmed or
+       deduplicated and go first, cut row by row to their share of the budget if needed (cut_rows)."""
+    pins = [d for d in docs if pinned(d)]
+    rest = [d for d in docs if not pinned(d)]
+    trimmed = [trim_document(d["doc"], question) for d in rest]
+    order, duplicates = mmr_order(trimmed, mmr_lambda, dedup_threshold) if rest else ([], 0)
+    candidates = [(d, d["doc"]) for d in pins] + [(rest[i], trimmed[i]) for i in order]
+
+    pin_budget = int(budget * PINNED_SHARE) if rest else budget
+    packed, used = [], 0
+    for doc, text in candidates:
+        block = header(len(packed) + 1, doc)
+        cost = estimate_tokens(block + text)
+        if used + cost > pin_budget and pinned(doc):
+            text = cut_rows(text, max(0, pin_budget - used - estimate_tokens(block)))
+            cost = estimate_tokens(block + text)
+        elif used + cost > budget:
+            left = budget - used - estimate_tokens(block)
+            if left >= MIN_PARTIAL_TOKENS:
+                packed.append({**doc, "doc": _cut(text, left)})
+                used = budget
+            break
+        packed.append({**doc, "doc": text})
+        used += cost
+    stats = {"candidates": len(docs), "packed": len(packed), "duplicates": duplicates, "tokens": used,
+             "raw_tokens": sum(estimate_tokens(d["doc"]) for d in docs)}
+    return packed, stats
@@ -1,61 +1,337 @@
+"""
+Seed the Person / Event / EventPerson tables with synthetic data at any scale.
+
+Rows are generated in a streaming way (constant memory) from a deterministic seed. Faker is only used
+to build pools of names, streets and sentences up front, so millions of rows take minutes, not hours.
+Events are placed within a few km of one of the US_CITIES, and the address carries that city's own state
+and zip prefix, so place and radius questions have consistent answers.
+Ids are assigned explicitly (Person 1..N, Event 1..M), so every EventPerson link is valid whatever the
+load order. Event dates span two years from --start-date (2023-01-01 by default), not from today, so the
+same arguments give the same data on any day. Links are skewed: a few people are involved in many events,
+most in few.
+
+Targets (pick one):
+  --sql FILE       INSERT script (multi-row VALUES, IDENTITY_INSERT around each table)
+  --csv DIR        person.csv / event.csv / event_person.csv plus bulk_load.sql (BULK INSERT ... KEEPIDENTITY)
+  --odbc           load directly into SQL Server (SQL_* settings from .env) with fast_executemany
+  --sqlite FILE    load into a SQLite file with the benchmarks' schema (bench/sqlite_db.SCHEMA), e.g. to run
+                   the pipeline on seeder data through bench/sqlite_db.use_sqlite(). The benchmarks build
+                   their own rows around a fixed set of cities and subjects so their questions have answers.
+
+Usage:
+    python db_seeder/main.py --persons 5 --events 10 --sql insert_queries.sql
+    python db_seeder/main.py --persons 1000000 --events 2000000 --csv seed_csv
+    python db_seeder/main.py --persons 100000 --events 200000 --odbc --truncate
+"""
+
+import os
+import sys
+import csv
+import time
 import random
+import sqlite3
+import argparse
+import datetime
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Iterator, List, Sequence, Tuple
+
 from faker import Faker
 
-fake = Faker()
-
-# Configuration
-num_events = 10
-num_persons = 5
-
-# Generate Event INSERTs
-event_inserts = []
-for _ in range(num_events):
-    subject = fake.sentence(nb_words=6).replace("'", "''")
-    date = fake.date_between(start_date='-2y', end_date='today')
-    source = fake.company().replace("'", "''")[:50]
-    latitude = round(fake.latitude(), 6)
-    longitude = round(fake.longitude(), 6)
-    address = fake.address().replace("'", "''").replace("\n", ", ")
-    description = fake.text(max_nb_chars=500).replace("'", "''")
-    query = f"INSERT INTO [dbo].[Event] (Subject, Date, Source, Latitude, Longitude, Address, Description) VALUES ('{subject}', '{date}', '{source}', {latitude}, {longitude}, '{address}', '{description}');"
-    event_inserts.append(query)
-
-# Generate Person INSERTs
-person_inserts = []
-for _ in range(num_persons):
-    name = fake.name().replace("'", "''")
-    ssn = fake.ssn()
-    biodata = fake.text(max_nb_chars=500).replace("'", "''")
-    education = fake.text(max_nb_chars=300).replace("'", "''")
-    work = fake.text(max_nb_chars=300).replace("'", "''")
-    query = f"INSERT INTO [dbo].[Person] (Name, SSN, BioData, Education, Work) VALUES ('{name}', '{ssn}', '{biodata}', '{education}', '{work}');"
-    person_inserts.append(query)
-
-# Generate EventPerson INSERTs (ensuring each Event has multiple persons)
-event_person_inserts = set()  # use a set to avoid duplicates
-
-for event_id in range(1, num_events + 1):
-    num_links = random.randint(1, 5)  # each event linked to 1–5 people
-    person_ids = random.sample(range(1, num_persons + 1), num_links)
-    for person_id in person_ids:
-        event_person_inserts.add((event_id, person_id))
-
-# Create SQL INSERT statements for EventPerson
-event_person_queries = [
-    f"INSERT INTO [dbo].[EventPerson] (EventId, PersonId) VALUES ({event_id}, {person_id});"
-    for (event_id, person_id) in event_person_inserts
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "bench")]
+
+from sql_pool import env_connection_string
+from sqlite_db import SCHEMA as SQLITE_SCHEMA
+
+PERSON_COLUMNS = ["Id", "Name", "SSN", "BioData", "Education", "Work"]
+EVENT_COLUMNS = ["Id", "Subject", "Date", "Source", "Latitude", "Longitude", "Address", "Description"]
+EVENT_PERSON_COLUMNS = ["EventId", "PersonId"]
+TABLES = {"Person": PERSON_COLUMNS, "Event": EVENT_COLUMNS, "EventPerson": EVENT_PERSON_COLUMNS}
+DEFAULT_START = datetime.date(2023, 1, 1)
+
+# (city, state, 3-digit zip prefix, latitude, longitude): events are placed around real cities, each with
+# its own state and zip, so "events in Boston MA" or "within 25 km of Denver" have answers in seeded data
+US_CITIES = [
+    ("Seattle", "WA", "981", 47.6062, -122.3321), ("Spokane", "WA", "992", 47.6588, -117.4260),
+    ("Portland", "OR", "972", 45.5152, -122.6784), ("Boise", "ID", "837", 43.6150, -116.2023),
+    ("Sacramento", "CA", "958", 38.5816, -121.4944), ("San Francisco", "CA", "941", 37.7749, -122.4194),
+    ("Los Angeles", "CA", "900", 34.0522, -118.2437), ("San Diego", "CA", "921", 32.7157, -117.1611),
+    ("Las Vegas", "NV", "891", 36.1699, -115.1398), ("Phoenix", "AZ", "850", 33.4484, -112.0740),
+    ("Tucson", "AZ", "857", 32.2226, -110.9747), ("Salt Lake City", "UT", "841", 40.7608, -111.8910),
+    ("Denver", "CO", "802", 39.7392, -104.9903), ("Albuquerque", "NM", "871", 35.0844, -106.6504),
+    ("El Paso", "TX", "799", 31.7619, -106.4850), ("Cheyenne", "WY", "820", 41.1400, -104.8202),
+    ("Billings", "MT", "591", 45.7833, -108.5007), ("Fargo", "ND", "581", 46.8772, -96.7898),
+    ("Sioux Falls", "SD", "571", 43.5446, -96.7311), ("Omaha", "NE", "681", 41.2565, -95.9345),
+    ("Kansas City", "MO", "641", 39.0997, -94.5786), ("Oklahoma City", "OK", "731", 35.4676, -97.5164),
+    ("Dallas", "TX", "752", 32.7767, -96.7970), ("Austin", "TX", "787", 30.2672, -97.7431),
+    ("Houston", "TX", "770", 29.7604, -95.3698), ("San Antonio", "TX", "782", 29.4241, -98.4936),
+    ("Minneapolis", "MN", "554", 44.9778, -93.2650), ("Des Moines", "IA", "503", 41.5868, -93.6250),
+    ("St. Louis", "MO", "631", 38.6270, -90.1994), ("Little Rock", "AR", "722", 34.7465, -92.2896),
+    ("New Orleans", "LA", "701", 29.9511, -90.0715), ("Jackson", "MS", "392", 32.2988, -90.1848),
+    ("Memphis", "TN", "381", 35.1495, -90.0490), ("Nashville", "TN", "372", 36.1627, -86.7816),
+    ("Louisville", "KY", "402", 38.2527, -85.7585), ("Birmingham", "AL", "352", 33.5186, -86.8104),
+    ("Atlanta", "GA", "303", 33.7490, -84.3880), ("Miami", "FL", "331", 25.7617, -80.1918),
+    ("Orlando", "FL", "328", 28.5383, -81.3792), ("Tampa", "FL", "336", 27.9506, -82.4572),
+    ("Charleston", "SC", "294", 32.7765, -79.9311), ("Charlotte", "NC", "282", 35.2271, -80.8431),
+    ("Raleigh", "NC", "276", 35.7796, -78.6382), ("Richmond", "VA", "232", 37.5407, -77.4360),
+    ("Washington", "DC", "200", 38.9072, -77.0369), ("Baltimore", "MD", "212", 39.2904, -76.6122),
+    ("Wilmington", "DE", "198", 39.7391, -75.5398), ("Philadelphia", "PA", "191", 39.9526, -75.1652),
+    ("Pittsburgh", "PA", "152", 40.4406, -79.9959), ("Newark", "NJ", "071", 40.7357, -74.1724),
+    ("New York", "NY", "100", 40.7128, -74.0060), ("Albany", "NY", "122", 42.6526, -73.7562),
+    ("Buffalo", "NY", "142", 42.8864, -78.8784), ("Hartford", "CT", "061", 41.7658, -72.6734),
+    ("Providence", "RI", "029", 41.8240, -71.4128), ("Boston", "MA", "021", 42.3601, -71.0589),
+    ("Manchester", "NH", "031", 42.9956, -71.4548), ("Burlington", "VT", "054", 44.4759, -73.2121),
+    ("Portland", "ME", "041", 43.6591, -70.2568), ("Chicago", "IL", "606", 41.8781, -87.6298),
+    ("Milwaukee", "WI", "532", 43.0389, -87.9065), ("Madison", "WI", "537", 43.0731, -89.4012),
+    ("Detroit", "MI", "482", 42.3314, -83.0458), ("Indianapolis", "IN", "462", 39.7684, -86.1581),
+    ("Columbus", "OH", "432", 39.9612, -82.9988), ("Cleveland", "OH", "441", 41.4993, -81.6944),
+    ("Anchorage", "AK", "995", 61.2181, -149.9003), ("Honolulu", "HI", "968", 21.3069, -157.8583),
 ]
 
-# Combine and shuffle all queries
-all_inserts = event_inserts + person_inserts + event_person_queries
-random.shuffle(all_inserts)
 
-# Select up to 1000 queries
-output_queries = all_inserts[:1000]
+# ---------- Generation ----------
+class Pools:
+    """Faker output generated once and sampled many times."""
+
+    def __init__(self, seed: int, size: int = 5000):
+        fake = Faker("en_US")
+        fake.seed_instance(seed)
+        self.names = [fake.name() for _ in range(size)]
+        self.companies = [fake.company()[:50] for _ in range(size // 5)]
+        self.streets = [fake.street_address() for _ in range(size)]
+        # (lat, lon, city, state, zip prefix) from US_CITIES, so coordinates, city, state and zip agree
+        self.places = [(lat, lon, city, state, zip_prefix) for city, state, zip_prefix, lat, lon in US_CITIES]
+        self.sentences = [fake.sentence(nb_words=12) for _ in range(size * 4)]
+        self.subjects = [fake.sentence(nb_words=6).rstrip(".") for _ in range(size)]
+
+
+def _text(rng: random.Random, pools: Pools, max_chars: int) -> str:
+    parts, length = [], 0
+    target = rng.randint(max_chars // 3, max_chars)
+    while length < target:
+        sentence = rng.choice(pools.sentences)
+        parts.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(parts)[:max_chars]
+
+
+def iter_persons(count: int, pools: Pools, rng: random.Random) -> Iterator[Tuple]:
+    for person_id in range(1, count + 1):
+        ssn = f"{rng.randint(1, 899):03d}-{rng.randint(1, 99):02d}-{rng.randint(1, 9999):04d}"
+        yield (person_id, rng.choice(pools.names), ssn, _text(rng, pools, 500),
+               _text(rng, pools, 300), _text(rng, pools, 300))
+
+
+def iter_events(count: int, pools: Pools, rng: random.Random, start: datetime.date = DEFAULT_START,
+                years: int = 2) -> Iterator[Tuple]:
+    """Events dated over `years` years from `start`; a fixed anchor keeps a seed's data the same on any day."""
+    for event_id in range(1, count + 1):
+        lat, lon, city, state, zip_prefix = rng.choice(pools.places)
+        day = start + datetime.timedelta(days=rng.randint(0, 365 * years))
+        address = f"{rng.choice(pools.streets)}, {city}, {state} {zip_prefix}{rng.randint(0, 99):02d}"
+        yield (event_id, rng.choice(pools.subjects), day.isoformat(), rng.choice(pools.companies),
+               round(lat + rng.uniform(-0.05, 0.05), 6), round(lon + rng.uniform(-0.05, 0.05), 6),
+               address, _text(rng, pools, 500))
+
+
+def iter_links(events: int, persons: int, rng: random.Random, max_links: int = 5, skew: float = 1.1) -> Iterator[Tuple]:
+    """EventPerson pairs; person popularity follows a Zipf-like law (weight 1 / rank**skew) over a shuffled
+       ranking, so a few people show up in many events."""
+    ranking = list(range(1, persons + 1))
+    rng.shuffle(ranking)
+    cum_weights = list(accumulate(1.0 / (rank ** skew) for rank in range(1, persons + 1)))
+    for event_id in range(1, events + 1):
+        wanted = min(persons, rng.randint(1, max_links))
+        chosen = set()
+        while len(chosen) < wanted:
+            chosen.update(ranking[i] for i in _weighted_indexes(rng, cum_weights, wanted - len(chosen)))
+        for person_id in sorted(chosen):
+            yield (event_id, person_id)
+
+
+def _weighted_indexes(rng: random.Random, cum_weights: List[float], k: int) -> List[int]:
+    total = cum_weights[-1]
+    return [min(bisect_left(cum_weights, rng.random() * total), len(cum_weights) - 1) for _ in range(k)]
+
+
+def batches(rows: Iterator[Tuple], size: int) -> Iterator[List[Tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ---------- Targets ----------
+def _sql_literal(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "N'" + str(value).replace("'", "''") + "'"
+
+
+class SqlFileTarget:
+    """INSERT script; SQL Server accepts at most 1000 rows per VALUES list."""
+
+    def __init__(self, path: str):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def begin(self, table: str):
+        if table != "EventPerson":
+            self.file.write(f"SET IDENTITY_INSERT [dbo].[{table}] ON;\n")
+
+    def write(self, table: str, rows: Sequence[Tuple]):
+        columns = ", ".join(TABLES[table])
+        for start in range(0, len(rows), 1000):
+            values = ",\n".join("(" + ", ".join(_sql_literal(v) for v in row) + ")" for row in rows[start:start + 1000])
+            self.file.write(f"INSERT INTO [dbo].[{table}] ({columns}) VALUES\n{values};\n")
+
+    def end(self, table: str):
+        if table != "EventPerson":
+            self.file.write(f"SET IDENTITY_INSERT [dbo].[{table}] OFF;\n")
+
+    def close(self):
+        self.file.close()
+
+
+class CsvTarget:
+    """One CSV per table plus a BULK INSERT script that keeps the generated ids."""
+
+    FILES = {"Person": "person.csv", "Event": "event.csv", "EventPerson": "event_person.csv"}
+
+    def __init__(self, directory: str):
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.files, self.writers = {}, {}
+
+    def begin(self, table: str):
+        self.files[table] = open(os.path.join(self.directory, self.FILES[table]), "w", newline="", encoding="utf-8")
+        self.writers[table] = csv.writer(self.files[table])
+        self.writers[table].writerow(TABLES[table])
+
+    def write(self, table: str, rows: Sequence[Tuple]):
+        self.writers[table].writerows(rows)
+
+    def end(self, table: str):
+        self.files.pop(table).close()
+
+    def close(self):
+        with open(os.path.join(self.directory, "bulk_load.sql"), "w") as f:
+            for table, name in self.FILES.items():
+                keep = "KEEPIDENTITY, " if table != "EventPerson" else ""
+                f.write(f"BULK INSERT [dbo].[{table}] FROM '{os.path.join(self.directory, name)}'\n"
+                        "WITH (FORMAT = 'CSV', FIRSTROW = 2, FIELDQUOTE = '\"', CODEPAGE = '65001', "
+                        f"{keep}TABLOCK, BATCHSIZE = 100000);\n")
+
+
+class OdbcTarget:
+    """Parameterized inserts straight into SQL Server; fast_executemany sends each batch as one array."""
+
+    def __init__(self, truncate: bool = False):
+        import pyodbc
+        from dotenv import load_dotenv
+        load_dotenv()
+        # same settings and defaults as the app, so both connect to the same database as the same user
+        self.conn = pyodbc.connect(env_connection_string(), autocommit=False)
+        self.cursor = self.conn.cursor()
+        self.cursor.fast_executemany = True
+        if truncate:
+            for table in ("EventPerson", "Event", "Person"):
+                self.cursor.execute(f"DELETE FROM [dbo].[{table}]")
+            self.conn.commit()
+
+    def begin(self, table: str):
+        if table != "EventPerson":
+            self.cursor.execute(f"SET IDENTITY_INSERT [dbo].[{table}] ON")
+
+    def write(self, table: str, rows: Sequence[Tuple]):
+        columns = TABLES[table]
+        self.cursor.executemany(f"INSERT INTO [dbo].[{table}] ({', '.join(columns)}) "
+                                f"VALUES ({', '.join('?' * len(columns))})", rows)
+        self.conn.commit()
+
+    def end(self, table: str):
+        if table != "EventPerson":
+            self.cursor.execute(f"SET IDENTITY_INSERT [dbo].[{table}] OFF")
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class SqliteTarget:
+    def __init__(self, path: str, truncate: bool = False):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SQLITE_SCHEMA)
+        if truncate:
+            self.conn.executescript("DELETE FROM EventPerson; DELETE FROM Event; DELETE FROM Person;")
+
+    def begin(self, table: str):
+        pass
+
+    def write(self, table: str, rows: Sequence[Tuple]):
+        columns = TABLES[table]
+        self.conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows)
+        self.conn.commit()
+
+    def end(self, table: str):
+        pass
+
+    def close(self):
+        self.conn.close()
+
+
+def seed(target, persons: int, events: int, seed_value: int = 42, batch_size: int = 5000,
+         max_links: int = 5, skew: float = 1.1, start: datetime.date = DEFAULT_START):
+    """Stream all three tables into `target`, parents first."""
+    pools = Pools(seed_value)
+    rng = random.Random(seed_value)
+    plan = [("Person", iter_persons(persons, pools, rng), persons),
+            ("Event", iter_events(events, pools, rng, start), events),
+            ("EventPerson", iter_links(events, persons, rng, max_links, skew), None)]
+    for table, rows, total in plan:
+        started, written = time.perf_counter(), 0
+        target.begin(table)
+        for batch in batches(rows, batch_size):
+            target.write(table, batch)
+            written += len(batch)
+            if written % (batch_size * 20) == 0 and (total is None or written < total):
+                print(f"[+] {table}: {written} rows")
+        target.end(table)
+        elapsed = time.perf_counter() - started
+        print(f"[+] {table}: {written} rows in {elapsed:.1f}s ({written / elapsed if elapsed else 0:.0f} rows/s)")
+    target.close()
+
 
-# Save to file (optional)
-with open("insert_queries.sql", "w") as f:
-    for query in output_queries:
-        f.write(query + "\n")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate Person/Event/EventPerson rows for load testing")
+    parser.add_argument("--persons", type=int, default=5)
+    parser.add_argument("--events", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42, help="Same seed -> same data")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--max-links", type=int, default=5, help="Max persons linked to one event")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of person popularity (0 = uniform)")
+    parser.add_argument("--start-date", type=datetime.date.fromisoformat, default=DEFAULT_START,
+                        help="First possible event date (YYYY-MM-DD); events span two years from it")
+    parser.add_argument("--truncate", action="store_true", help="With --odbc/--sqlite: empty the tables first")
+    target_group = parser.add_mutually_exclusive_group()
+    target_group.add_argument("--sql", metavar="FILE", help="Write an INSERT script")
+    target_group.add_argument("--csv", metavar="DIR", help="Write CSV files and a BULK INSERT script")
+    target_group.add_argument("--odbc", action="store_true", help="Insert directly into SQL Server")
+    target_group.add_argument("--sqlite", metavar="FILE", help="Insert into a SQLite file")
+    args = parser.parse_args()
 
-print(f"Generated {len(output_queries)} SQL INSERT queries and saved to insert_queries.sql")
+    if args.csv:
+        target = CsvTarget(args.csv)
+    elif args.odbc:
+        target = OdbcTarget(truncate=args.truncate)
+    elif args.sqlite:
+        target = SqliteTarget(args.sqlite, truncate=args.truncate)
+    else:
+        target = SqlFileTarget(args.sql or "insert_queries.sql")
+    seed(target, args.persons, args.events, args.seed, args.batch_size, args.max_links, args.skew, args.start_date)
@@ -0,0 +1,174 @@
+"""
+Persistent, content-addressed embedding cache.
+
+Vectors are keyed by sha256(model + normalized text) and stored as float32 blobs in SQLite, with
+an in-memory LRU in front. When the file grows past `max_bytes` the least recently used rows are
+evicted. Shared by indexing (document texts) and querying (questions).
+
+Lookups only read: the `last_used` times of hits are collected in memory and written in one batch with
+the next put, before an eviction, or once `touch_batch` keys or `touch_interval_s` seconds have piled up.
+Touches not yet written when the process exits are lost, which only makes eviction slightly less exact.
+
+Several processes (e.g. `--index --workers N`) may share the file: a writer waits up to `busy_timeout_s`
+for the lock, and a write that still fails is skipped with a warning, since the cache is only an
+optimization and must not fail the indexing run.
+"""
+
+import os
+import time
+import logging
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+from metrics import fields
+
+log = logging.getLogger("rag.embedding_cache")
+
+def normalize_text(text: str) -> str:
+    return " ".join(str(text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str, memory_items: int = 10000, max_bytes: int = 512 * 1024 * 1024,
+                 touch_batch: int = 1000, touch_interval_s: float = 30.0, busy_timeout_s: float = 30.0):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.touch_batch = touch_batch
+        self.touch_interval_s = touch_interval_s
+        self._touched: Dict[str, float] = {}   # key -> last read time, not yet written
+        self._touched_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout_s, check_same_thread=False)
+        self._conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_s * 1000)}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Cached vectors aligned with `texts`; None where the text has not been embedded before."""
+        keys = [cache_key(model, t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self.memory_hits += 1
+            disk_keys = list({k for k in keys if k not in found})
+            for i in range(0, len(disk_keys), 500):
+                chunk = disk_keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f", blob).tolist()
+                    found[key] = vector
+                    self._remember(key, vector)
+            now = time.time()
+            self._touched.update((key, now) for key in found)
+            if (len(self._touched) >= self.touch_batch
+                    or time.monotonic() - self._touched_at >= self.touch_interval_s):
+                self._commit_touches()
+            result = [found.get(k) for k in keys]
+            self.hits += sum(v is not None for v in result)
+            self.misses += sum(v is None for v in result)
+        return result
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        now = time.time()
+        rows = [(cache_key(model, t), model, array("f", v).tobytes(), now) for t, v in zip(texts, vectors)]
+        with self._lock:
+            for (key, _, _, _), vector in zip(rows, vectors):
+                self._remember(key, list(vector))
+                self._touched.pop(key, None)
+            size = self._bytes
+            try:
+                self._write_touches()
+                self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+                self._bytes += sum(len(r[2]) for r in rows)
+                if self._bytes > self.max_bytes:
+                    self._evict()
+                self._conn.commit()
+            except sqlite3.OperationalError as exc:
+                # e.g. "database is locked" past busy_timeout_s; the vectors stay in memory
+                self._conn.rollback()
+                self._bytes = size
+                log.warning("Embedding cache write skipped", extra=fields(rows=len(rows), error=repr(exc)))
+
+    def flush(self):
+        """Write pending last_used times now."""
+        with self._lock:
+            if self._touched:
+                self._commit_touches()
+
+    def _commit_touches(self):
+        try:
+            self._write_touches()
+            self._conn.commit()
+        except sqlite3.OperationalError as exc:
+            self._conn.rollback()
+            self._touched.clear()
+            self._touched_at = time.monotonic()
+            log.warning("Embedding cache last_used update skipped", extra=fields(error=repr(exc)))
+
+    def _write_touches(self):
+        if self._touched:
+            self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                   [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+        self._touched_at = time.monotonic()
+
+    def _evict(self):
+        # Drop least recently used rows until the store is back under 90% of its budget
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        target = self.max_bytes * 0.9
+        while self._bytes > target:
+            oldest = self._conn.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 1000").fetchall()
+            if not oldest:
+                break
+            evicted = []
+            for key, size in oldest:
+                if self._bytes <= target:
+                    break
+                evicted.append((key,))
+                self._memory.pop(key, None)
+                self._bytes -= size
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_hits": self.memory_hits,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+                "bytes": self._bytes,
+            }
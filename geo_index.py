@@ -0,0 +1,129 @@
+"""
+Grid-based spatial index over Event coordinates.
+
+Events are bucketed into fixed-size lat/lon cells (default 0.5 degrees) in a small SQLite table,
+so radius and bounding-box lookups only touch the cells that overlap the search area, then an
+exact haversine check trims the candidates. Kept up to date incrementally by the indexer.
+"""
+
+import os
+import math
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoIndex:
+    def __init__(self, path: str, cell_deg: float = 0.5):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.cell_deg = cell_deg
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS geo ("
+            " doc_id TEXT PRIMARY KEY, lat REAL NOT NULL, lon REAL NOT NULL,"
+            " cell_lat INTEGER NOT NULL, cell_lon INTEGER NOT NULL, city TEXT, state TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS geo_cell ON geo(cell_lat, cell_lon)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS geo_place ON geo(city, state)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def upsert(self, points: Iterable[Tuple[str, float, float, Optional[str], Optional[str]]]):
+        """points: (doc_id, lat, lon, city, state)."""
+        rows = [(doc_id, lat, lon, *self._cell(lat, lon), city, state) for doc_id, lat, lon, city, state in points]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO geo VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def remove(self, doc_ids: Iterable[str]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM geo WHERE doc_id = ?", [(d,) for d in doc_ids])
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM geo")
+            self._conn.execute("DELETE FROM state")
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM geo").fetchone()[0]
+
+    def filled_version(self) -> Optional[str]:
+        """Version marker set by mark_filled() once the index holds every indexed row; None until then."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM state WHERE key = 'filled'").fetchone()
+        return row[0] if row else None
+
+    def mark_filled(self, version: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO state VALUES ('filled', ?)", (version,))
+            self._conn.commit()
+
+    def _scan(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[Tuple[str, float, float]]:
+        lat_lo, lon_lo = self._cell(max(min_lat, -90.0), min_lon)
+        lat_hi, lon_hi = self._cell(min(max_lat, 90.0), max_lon)
+        with self._lock:
+            return self._conn.execute(
+                "SELECT doc_id, lat, lon FROM geo WHERE cell_lat BETWEEN ? AND ? AND cell_lon BETWEEN ? AND ?",
+                (lat_lo, lat_hi, lon_lo, lon_hi)).fetchall()
+
+    def within_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[str]:
+        """Doc ids inside the box; min_lon > max_lon means the box crosses the antimeridian."""
+        spans = [(min_lon, max_lon)] if min_lon <= max_lon else [(min_lon, 180.0), (-180.0, max_lon)]
+        hits = []
+        for lo, hi in spans:
+            hits += [doc_id for doc_id, lat, lon in self._scan(min_lat, lo, max_lat, hi)
+                     if min_lat <= lat <= max_lat and lo <= lon <= hi]
+        return hits
+
+    def within_radius(self, lat: float, lon: float, km: float, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """(doc_id, distance_km) for events within `km` of the point, nearest first."""
+        dlat = math.degrees(km / EARTH_RADIUS_KM)
+        cos_lat = math.cos(math.radians(lat))
+        dlon = 180.0 if cos_lat < 1e-6 else min(180.0, dlat / cos_lat)
+        min_lon, max_lon = lon - dlon, lon + dlon
+        if dlon >= 180.0:
+            spans = [(-180.0, 180.0)]
+        elif min_lon < -180.0:
+            spans = [(min_lon + 360.0, 180.0), (-180.0, max_lon)]
+        elif max_lon > 180.0:
+            spans = [(min_lon, 180.0), (-180.0, max_lon - 360.0)]
+        else:
+            spans = [(min_lon, max_lon)]
+        hits: Dict[str, float] = {}
+        for lo, hi in spans:
+            for doc_id, p_lat, p_lon in self._scan(lat - dlat, lo, lat + dlat, hi):
+                dist = haversine_km(lat, lon, p_lat, p_lon)
+                if dist <= km:
+                    hits[doc_id] = dist
+        ranked = sorted(hits.items(), key=lambda item: item[1])
+        return ranked[:limit] if limit else ranked
+
+    def locate(self, city: Optional[str] = None, state: Optional[str] = None) -> Optional[Tuple[float, float]]:
+        """Centroid of indexed events in a city/state, used to resolve place names in questions."""
+        conditions, params = [], []
+        for column, value in (("city", city), ("state", state)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if not conditions:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT AVG(lat), AVG(lon) FROM geo WHERE {' AND '.join(conditions)}", params).fetchone()
+        return (row[0], row[1]) if row and row[0] is not None else None
@@ -0,0 +1,62 @@
+"""
+Progress of a partitioned indexing run, kept in a small JSON file next to the other local state.
+
+The file records the Id-range partitions planned for the run and which of them are finished. It is
+rewritten atomically after each partition, so a run that crashes or is interrupted resumes with only the
+unfinished partitions. A checkpoint written with different settings (collection, embedding model,
+chunking) is ignored, so it can never resume into an index built differently.
+"""
+
+import os
+import json
+from typing import Any, Dict, List, Optional
+
+
+def partition_key(table: str, low: Optional[int], high: Optional[int]) -> str:
+    return f"{table}:{'' if low is None else low}-{'' if high is None else high}"
+
+
+class IndexCheckpoint:
+    def __init__(self, path: str, settings: Dict[str, Any], partitions: List[Dict[str, Any]], full: bool = False,
+                 done: Optional[List[str]] = None):
+        self.path = path
+        self.settings = settings
+        self.partitions = partitions        # [{"table", "low", "high"}], None = open end
+        self.full = full
+        self.done = set(done or [])
+
+    @classmethod
+    def load(cls, path: str, settings: Dict[str, Any]) -> Optional["IndexCheckpoint"]:
+        """The unfinished run saved at `path`, or None if there is none for these settings."""
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("settings") != settings:
+            return None
+        return cls(path, settings, state["partitions"], state.get("full", False), state.get("done"))
+
+    def key(self, partition: Dict[str, Any]) -> str:
+        return partition_key(partition["table"], partition["low"], partition["high"])
+
+    def pending(self) -> List[Dict[str, Any]]:
+        return [p for p in self.partitions if self.key(p) not in self.done]
+
+    def mark_done(self, key: str):
+        self.done.add(key)
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"settings": self.settings, "full": self.full, "partitions": self.partitions,
+                       "done": sorted(self.done)}, f)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,118 @@
+"""
+BM25 inverted index over document text, stored in SQLite.
+
+Postings are (term, doc_id, tf) rows with per-document lengths, so adding, replacing or removing a
+document only touches that document's rows. Scoring reads just the postings of the query terms.
+Used next to the vector index for hybrid retrieval (see reciprocal_rank_fusion).
+"""
+
+import os
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be by did do does for from had has have how i in is it its list of on or show tell that
+the their them these they this those to was were what when where which who whom whose why will with
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(str(text).lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (doc_id TEXT PRIMARY KEY, length INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL,
+                                                 PRIMARY KEY (term, doc_id)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings(doc_id);
+            CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self._conn.commit()
+
+    def _delete(self, doc_ids: Sequence[str]):
+        rows = [(d,) for d in doc_ids]
+        self._conn.executemany("DELETE FROM postings WHERE doc_id = ?", rows)
+        self._conn.executemany("DELETE FROM docs WHERE doc_id = ?", rows)
+
+    def upsert(self, docs: Iterable[Tuple[str, str]]):
+        """docs: (doc_id, text); replaces any previous postings of the same doc_id."""
+        docs = list(docs)
+        with self._lock:
+            self._delete([doc_id for doc_id, _ in docs])
+            for doc_id, text in docs:
+                terms = Counter(tokenize(text))
+                self._conn.execute("INSERT INTO docs VALUES (?, ?)", (doc_id, sum(terms.values())))
+                self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?)",
+                                       [(term, doc_id, tf) for term, tf in terms.items()])
+            self._conn.commit()
+
+    def remove(self, doc_ids: Iterable[str]):
+        with self._lock:
+            self._delete(list(doc_ids))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM docs")
+            self._conn.execute("DELETE FROM state")
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def filled_version(self) -> Optional[str]:
+        """Version marker set by mark_filled() once the index holds every indexed row; None until then."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM state WHERE key = 'filled'").fetchone()
+        return row[0] if row else None
+
+    def mark_filled(self, version: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO state VALUES ('filled', ?)", (version,))
+            self._conn.commit()
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """(doc_id, bm25 score) for the best matching documents, highest first."""
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            n_docs, total_len = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+            if not n_docs:
+                return []
+            avg_len = total_len / n_docs
+            marks = ",".join("?" * len(terms))
+            df = dict(self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({marks}) GROUP BY term", terms).fetchall())
+            rows = self._conn.execute(
+                f"SELECT p.term, p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.doc_id = p.doc_id"
+                f" WHERE p.term IN ({marks})", terms).fetchall()
+        scores: Dict[str, float] = {}
+        for term, doc_id, tf, length in rows:
+            idf = math.log(1 + (n_docs - df[term] + 0.5) / (df[term] + 0.5))
+            norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_len))
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+        return sorted(scores.items(), key=lambda item: -item[1])[:top_k]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse several ranked id lists: score(d) = sum over lists of 1 / (k + rank)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
@@ -0,0 +1,205 @@
+"""
+Typed metadata for indexed rows and query-side filter extraction.
+
+Index time: Event dates become sortable YYYYMMDD integers and US-style addresses
+("1306 Maria Station, Samanthaton, CT 02136") are split into city/state.
+Query time: date ranges ("in 2023", "during Feb 2023 to June 2023"), places ("in Washington DC",
+"in Texas") and radius/box searches ("within 50 km of Austin TX", "near 38.9, -77.0") are pulled out of
+the question and turned into a Chroma `where` clause.
+"""
+
+import re
+import calendar
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+US_STATES = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA", "colorado": "CO",
+    "connecticut": "CT", "delaware": "DE", "florida": "FL", "georgia": "GA", "hawaii": "HI", "idaho": "ID",
+    "illinois": "IL", "indiana": "IN", "iowa": "IA", "kansas": "KS", "kentucky": "KY", "louisiana": "LA",
+    "maine": "ME", "maryland": "MD", "massachusetts": "MA", "michigan": "MI", "minnesota": "MN",
+    "mississippi": "MS", "missouri": "MO", "montana": "MT", "nebraska": "NE", "nevada": "NV",
+    "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM", "new york": "NY", "north carolina": "NC",
+    "north dakota": "ND", "ohio": "OH", "oklahoma": "OK", "oregon": "OR", "pennsylvania": "PA",
+    "rhode island": "RI", "south carolina": "SC", "south dakota": "SD", "tennessee": "TN", "texas": "TX",
+    "utah": "UT", "vermont": "VT", "virginia": "VA", "washington": "WA", "west virginia": "WV",
+    "wisconsin": "WI", "wyoming": "WY", "district of columbia": "DC", "puerto rico": "PR", "guam": "GU",
+}
+STATE_CODES = set(US_STATES.values()) | {"AS", "MP", "VI", "PW", "FM", "MH", "AA", "AE", "AP"}
+
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+MONTHS["sept"] = 9
+_MONTH = r"\b(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+_YEAR = r"((?:19|20)\d{2})"
+_RANGE_SEP = r"\s*(?:-|–|to|through|thru|until|till|and)\s*"
+
+_KM_PER_UNIT = {"km": 1.0, "kilometer": 1.0, "kilometers": 1.0, "kilometre": 1.0, "kilometres": 1.0,
+                "mi": 1.609344, "mile": 1.609344, "miles": 1.609344}
+_NUM = r"(-?\d{1,3}(?:\.\d+)?)"
+_POINT = _NUM + r"\s*,\s*" + _NUM
+_RADIUS_RE = re.compile(r"\bwithin\s+(\d+(?:\.\d+)?)\s*(km|kilomet(?:er|re)s?|mi|miles?)\s+(?:of|from|around)\s+"
+                        r"(" + _POINT + r"|(?:[A-Z][\w.']*,?\s*)+)")
+_NEAR_RE = re.compile(r"\b(?:near|around|close to)\s+(" + _POINT + r"|(?:[A-Z][\w.']*,?\s*)+)")
+_BBOX_RE = re.compile(r"\bbetween\s*\(?\s*" + _POINT + r"\s*\)?\s*and\s*\(?\s*" + _POINT + r"\s*\)?")
+
+_ADDRESS_RE = re.compile(r"([^,]+),\s*([A-Z]{2})(?:\s+\d{5}(?:-\d{4})?)?\s*$")
+_PLACE_RE = re.compile(r"\b(?:in|at|near|around)\s+((?:[A-Z][\w.']*,?\s*)+)")
+
+
+def date_num(value: Any) -> Optional[int]:
+    """Date/datetime/ISO string -> sortable YYYYMMDD int (None if not a date)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.year * 10000 + value.month * 100 + value.day
+    match = re.match(r"(\d{4})-(\d{2})-(\d{2})", str(value))
+    return int("".join(match.groups())) if match else None
+
+
+def parse_address(address: str) -> Tuple[Optional[str], Optional[str]]:
+    """'..., City, ST 12345' -> ('city', 'ST'); city is lower-cased for exact-match filtering."""
+    if not address:
+        return None, None
+    match = _ADDRESS_RE.search(" ".join(str(address).split()))
+    if not match or match.group(2) not in STATE_CODES:
+        return None, None
+    return match.group(1).strip().lower(), match.group(2)
+
+
+def _month_start(year: int, month: int) -> int:
+    return year * 10000 + month * 100 + 1
+
+
+def _month_end(year: int, month: int) -> int:
+    return year * 10000 + month * 100 + calendar.monthrange(year, month)[1]
+
+
+def extract_date_range(question: str) -> Optional[Tuple[int, int]]:
+    """Inclusive (from, to) YYYYMMDD range mentioned in the question, if any."""
+    q = question.lower()
+    # "Feb 2023 to June 2023", "Feb to June 2023"
+    m = re.search(_MONTH + r"(?:\s+" + _YEAR + r")?" + _RANGE_SEP + _MONTH + r"\s+" + _YEAR, q)
+    if m:
+        end_year = int(m.group(4))
+        start_year = int(m.group(2)) if m.group(2) else end_year
+        return _month_start(start_year, MONTHS[m.group(1)]), _month_end(end_year, MONTHS[m.group(3)])
+    # "2021 to 2023", "between 2021 and 2023"
+    m = re.search(_YEAR + _RANGE_SEP + _YEAR, q)
+    if m:
+        return int(m.group(1)) * 10000 + 101, int(m.group(2)) * 10000 + 1231
+    # "June 2023"
+    m = re.search(_MONTH + r"\s+" + _YEAR, q)
+    if m:
+        year, month = int(m.group(2)), MONTHS[m.group(1)]
+        return _month_start(year, month), _month_end(year, month)
+    # "in 2023" / "since 2022" / "before 2024"
+    m = re.search(r"\b(since|after|before)\s+" + _YEAR, q)
+    if m:
+        year = int(m.group(2))
+        if m.group(1) == "before":
+            return 0, (year - 1) * 10000 + 1231
+        return (year + (m.group(1) == "after")) * 10000 + 101, 99991231
+    m = re.search(r"\b" + _YEAR + r"\b", q)
+    if m:
+        year = int(m.group(1))
+        return year * 10000 + 101, year * 10000 + 1231
+    return None
+
+
+def extract_places(question: str) -> List[Dict[str, str]]:
+    """Candidate {'city', 'state'} filters for capitalised place phrases after in/at/near."""
+    places = []
+    for phrase in _PLACE_RE.findall(question):
+        words = [w.strip(",.") for w in phrase.replace(",", " ").split()]
+        words = [w for w in words if w and w.lower() not in MONTHS]
+        if not words:
+            continue
+        place: Dict[str, str] = {}
+        last = words[-1].replace(".", "").upper()
+        if len(words) > 1 and last in STATE_CODES:
+            place["state"] = last
+            words = words[:-1]
+        else:
+            # trailing full state name: "Austin Texas", "New York"
+            for n in (3, 2, 1):
+                name = " ".join(words[-n:]).lower()
+                if len(words) >= n and name in US_STATES:
+                    place["state"] = US_STATES[name]
+                    words = words[:-n]
+                    break
+        if words:
+            place["city"] = " ".join(words).lower()
+        if place:
+            places.append(place)
+    return places
+
+
+def _geo_target(text: str) -> Dict[str, Any]:
+    point = re.fullmatch(r"\s*" + _POINT + r"\s*", text)
+    if point:
+        return {"lat": float(point.group(1)), "lon": float(point.group(2))}
+    places = extract_places("in " + text)
+    return {"place": places[0]} if places else {}
+
+
+def extract_geo(question: str, default_km: float = 25.0) -> Optional[Dict[str, Any]]:
+    """Spatial intent in the question:
+       {'km', 'lat', 'lon'} or {'km', 'place': {...}} for radius searches ('within 50 km of X', 'near X'),
+       {'bbox': (min_lat, min_lon, max_lat, max_lon)} for 'between (lat, lon) and (lat, lon)'."""
+    m = _BBOX_RE.search(question)
+    if m:
+        lat1, lon1, lat2, lon2 = (float(g) for g in m.groups())
+        return {"bbox": (min(lat1, lat2), min(lon1, lon2), max(lat1, lat2), max(lon1, lon2))}
+    m = _RADIUS_RE.search(question)
+    if m:
+        target = _geo_target(m.group(3))
+        if target:
+            return {"km": float(m.group(1)) * _KM_PER_UNIT[m.group(2).lower()], **target}
+    m = _NEAR_RE.search(question)
+    if m:
+        target = _geo_target(m.group(1))
+        if target:
+            return {"km": default_km, **target}
+    return None
+
+
+def extract_filters(question: str, default_km: float = 25.0) -> Dict[str, Any]:
+    """{'date_from', 'date_to', 'places': [...], 'geo': {...}} for whatever structure the question carries."""
+    filters: Dict[str, Any] = {}
+    date_range = extract_date_range(question)
+    if date_range:
+        filters["date_from"], filters["date_to"] = date_range
+    geo = extract_geo(question, default_km)
+    if geo:
+        # a radius/box search replaces exact city/state matching for the same phrase
+        filters["geo"] = geo
+        return filters
+    places = extract_places(question)
+    if places:
+        filters["places"] = places
+    return filters
+
+
+def place_clause(place: Dict[str, str]) -> Dict[str, Any]:
+    conditions = [{key: {"$eq": value}} for key, value in sorted(place.items())]
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def build_where(filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Chroma `where` clause restricting the search to Event rows matching the filters."""
+    if not filters:
+        return None
+    conditions: List[Dict[str, Any]] = [{"table": {"$eq": "Event"}}]
+    if "date_from" in filters:
+        conditions.append({"date_num": {"$gte": filters["date_from"]}})
+        conditions.append({"date_num": {"$lte": filters["date_to"]}})
+    places = filters.get("places") or []
+    if len(places) == 1:
+        conditions.append(place_clause(places[0]))
+    elif places:
+        conditions.append({"$or": [place_clause(p) for p in places]})
+    if "row_ids" in filters:
+        # candidates from a side index (e.g. the geo index); vector search ranks only these
+        conditions.append({"row_id": {"$in": list(filters["row_ids"])}})
+    return {"$and": conditions}
@@ -0,0 +1,216 @@
+"""
+Process-wide metrics and logging setup for the RAG pipeline.
+
+Stages (SQL fetch, embedding calls, vector store calls, LLM generation, ...) record their wall time in
+the `rag_stage_seconds` histogram; batch sizes, token counts, cache lookups and retries have their own
+series. render_prometheus() produces the Prometheus text format (served on /metrics by rag_server.py),
+profile_report() a per-stage table for `--profile`.
+
+Logging is leveled (LOG_LEVEL) and structured: extra key/value fields given as
+`log.info("message", extra=fields(rows=10))` are appended as `key=value` pairs, or emitted as JSON
+objects with LOG_FORMAT=json.
+"""
+
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names: Sequence[str], values: Tuple[str, ...], le: Optional[str] = None) -> str:
+    pairs = [(n, v) for n, v in zip(names, values)] + ([("le", le)] if le is not None else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join('%s="%s"' % (n, _escape(str(v))) for n, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[n]) for n in self.labelnames), 0)
+
+    def labelsets(self) -> List[Tuple[str, ...]]:
+        with self._lock:
+            return list(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {value:g}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}     # labels -> [bucket counts, sum, count, max]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+            series[3] = max(series[3], value)
+
+    def series(self) -> Dict[Tuple[str, ...], Tuple[float, int, float]]:
+        """labels -> (sum, count, max)."""
+        with self._lock:
+            return {key: (s[1], s[2], s[3]) for key, s in self._series.items()}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count, _) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, f'{bound:g}')} {cumulative}")
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, '+Inf')} {count}")
+                lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {total:g}")
+                lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {count}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Wall time of a pipeline stage", ["stage"])
+BATCH_SIZE = Histogram("rag_batch_size", "Items per batch (SQL page, embedding call, vector store write)",
+                       ["stage"], buckets=SIZE_BUCKETS)
+STAGE_ERRORS = Counter("rag_stage_errors_total", "Pipeline stages that raised", ["stage"])
+TOKENS = Counter("rag_llm_tokens_total", "Tokens processed by the LLM", ["kind"])
+CACHE_LOOKUPS = Counter("rag_cache_lookups_total", "Cache lookups by cache and result", ["cache", "result"])
+EMBED_RETRIES = Counter("rag_embed_retries_total", "Embedding batches retried after a transient failure")
+ROWS = Counter("rag_index_rows_total", "Rows seen by the indexer by outcome", ["outcome"])
+
+REGISTRY = [STAGE_SECONDS, BATCH_SIZE, STAGE_ERRORS, TOKENS, CACHE_LOOKUPS, EMBED_RETRIES, ROWS]
+
+
+@contextmanager
+def stage(name: str, batch: Optional[int] = None) -> Iterator[None]:
+    """Time a block as pipeline stage `name` (and record its batch size, if given)."""
+    if batch is not None:
+        BATCH_SIZE.observe(batch, stage=name)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+
+
+def cache_lookups(cache: str, hits: int, misses: int):
+    if hits:
+        CACHE_LOOKUPS.inc(hits, cache=cache, result="hit")
+    if misses:
+        CACHE_LOOKUPS.inc(misses, cache=cache, result="miss")
+
+
+def render_prometheus() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+def reset():
+    for metric in REGISTRY:
+        metric.reset()
+
+
+def profile_report() -> str:
+    """Per-stage breakdown: calls, total and mean time, slowest call; plus tokens and cache hit rates."""
+    rows = sorted(STAGE_SECONDS.series().items(), key=lambda item: -item[1][0])
+    lines = [f"{'stage':<22}{'calls':>8}{'total s':>11}{'mean ms':>11}{'max ms':>11}{'batch':>8}"]
+    batches = {key[0]: s for key, s in BATCH_SIZE.series().items()}
+    for (name,), (total, count, slowest) in rows:
+        batch = batches.get(name)
+        mean_batch = f"{batch[0] / batch[1]:.1f}" if batch and batch[1] else ""
+        lines.append(f"{name:<22}{count:>8}{total:>11.3f}{total / count * 1000:>11.2f}{slowest * 1000:>11.2f}"
+                     f"{mean_batch:>8}")
+    prompt, completion = TOKENS.value(kind="prompt"), TOKENS.value(kind="completion")
+    if prompt or completion:
+        lines.append(f"tokens: prompt {prompt:g}, completion {completion:g}")
+    for cache in sorted({key[0] for key in CACHE_LOOKUPS.labelsets()}):
+        hits, misses = CACHE_LOOKUPS.value(cache=cache, result="hit"), CACHE_LOOKUPS.value(cache=cache, result="miss")
+        lines.append(f"{cache} cache: {hits:g} hits, {misses:g} misses ({hits / ((hits + misses) or 1):.1%} hit rate)")
+    if EMBED_RETRIES.value():
+        lines.append(f"embedding retries: {EMBED_RETRIES.value():g}")
+    return "\n".join(lines)
+
+
+# ---------- Logging ----------
+def fields(**values) -> Dict[str, Dict[str, object]]:
+    """`extra=` argument carrying structured key/value fields for a log record."""
+    return {"fields": values}
+
+
+class KeyValueFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        extra = getattr(record, "fields", None)
+        if extra:
+            text += " " + " ".join(f"{k}={v}" for k, v in extra.items())
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        body = {"ts": round(record.created, 3), "level": record.levelname, "logger": record.name,
+                "msg": record.getMessage(), **getattr(record, "fields", {})}
+        if record.exc_info:
+            body["exc"] = self.formatException(record.exc_info)
+        return json.dumps(body, default=str)
+
+
+def configure_logging(level: str = "INFO", fmt: str = "text"):
+    """Leveled logging to stderr, so stdout stays reserved for answers."""
+    handler = logging.StreamHandler(sys.stderr)
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(KeyValueFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
+    # HTTP clients log every request at INFO/DEBUG; keep them to warnings so the pipeline's own lines stand out
+    for noisy in ("httpx", "httpcore", "chromadb", "urllib3"):
+        logging.getLogger(noisy).setLevel(max(logging.WARNING, root.level))
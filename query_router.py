@@ -0,0 +1,227 @@
+"""
+Rules-based router for questions about the Person / Event / EventPerson schema.
+
+Counts, date and place ranges, "who attended X" and "which events did <name> attend" have exact answers
+in SQL. Top-k vector retrieval answers them slowly and, for lists, incompletely. classify() recognises
+these shapes with a few regular expressions (plus the date and place parsing in metadata_filters) and
+returns one of three routes:
+
+  sql    a parameterised query answers the question on its own; no embedding or LLM call
+  both   the query gives the exact rows, and the question also asks for description ("describe",
+         "profession", "why", ...), so the rows are added to the vector RAG prompt as a context block
+  rag    anything else, including radius/box searches, which need the geo index
+
+Questions the rules do not recognise go to RAG, so a miss costs nothing compared with no router. A
+question only goes to "sql" when the patterns account for every word of it (stopwords aside); a condition
+they cannot parse ("canceled", "had violence") sends a list to "both" and a count to "rag".
+"""
+
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from metadata_filters import MONTHS, US_STATES, extract_filters
+
+_COUNT_RE = re.compile(r"\b(how many|number of|count|total)\b", re.I)
+_LIST_RE = re.compile(r"^\s*(list|show|which|what|who|give|find|get)\b", re.I)
+_PEOPLE_RE = re.compile(r"\b(people|persons?|individuals|attendees|participants)\b|^\s*who\b", re.I)
+_EVENT_RE = re.compile(r"\bevents?\b", re.I)
+_ATTEND_RE = re.compile(r"\b(attend(?:ed|s|ing)?|participat\w*|involv\w*|took part|take part)\b", re.I)
+_SEMANTIC_RE = re.compile(r"\b(why|how did|describe\w*|description|summar\w*|explain|tell me|(?<!event )(?<!events )about|background|"
+                          r"biograph\w*|bio|education|profession\w*|occupation|work(?:s|ed)? as)\b", re.I)
+_EVENT_ID_RE = re.compile(r"\bevent\s*(?:id\s*)?#?\s*(\d+)\b", re.I)
+_QUOTED_RE = re.compile(r"[\"“]([^\"”]+)[\"”]")
+_STOP = r"(?=\s+(?:in|on|during|between|from|before|after|since|near|within|and|who|that|with|events?)\b|\s*[?.!,]|\s*$)"
+_SUBJECT_AFTER_RE = re.compile(r"\b(?:attend(?:ed|s)?|participated in|took part in|involved in)\s+(?:the\s+|an?\s+)?"
+                               r"(?:events?\s+(?:on|about|called|named|titled)\s+)?(.+?)" + _STOP)
+_SUBJECT_ABOUT_RE = re.compile(r"\bevents?\s+(?:about|on|called|named|titled|regarding)\s+(?:the\s+)?(.+?)" + _STOP)
+_SUBJECT_BEFORE_RE = re.compile(r"\b(?:the|all|any)\s+([A-Z][\w'-]*(?:\s+[\w'-]+){0,4}?)\s+events?\b")
+_NAME_RE = re.compile(r"\b([A-Z][a-z'-]+(?:\s+[A-Z][a-z'-]+)+)\b")
+_WORD_RE = re.compile(r"[a-z0-9']+")
+_YEAR_RE = re.compile(r"(?:19|20)\d{2}")
+# words the patterns below account for without adding a condition: question shape, tables, dates, linking verbs
+_FILLER = set("""
+    a an the of in on at to for from by with and or is are was were be been being did do does done has have had
+    how many much number count counted total list show which what who whom whose give me find get all any every
+    there their they them those these that this it its please also name names id ids
+    event events people person persons individual individuals attendee attendees participant participants
+    attend attended attends attending participate participated participating involve involved involves involving
+    take took taken takes part place places happen happened happens occur occurred held hold
+    during between since before after until till through thru year years month months date dates
+    about called named titled regarding database record records row rows table data stored exist exists
+""".split())
+
+def _iso(value: int) -> str:
+    return date(value // 10000, value // 100 % 100, value % 100).isoformat()
+
+
+def _next_day(value: int) -> str:
+    return (date(value // 10000, value // 100 % 100, value % 100) + timedelta(days=1)).isoformat()
+
+
+def event_subject(question: str) -> Optional[str]:
+    """Event subject named in the question: quoted, after 'attended' or 'events about/on/called', or a capitalised
+       phrase in 'the ... events'."""
+    quoted = _QUOTED_RE.search(question)
+    if quoted:
+        return quoted.group(1).strip()
+    for pattern in (_SUBJECT_AFTER_RE, _SUBJECT_ABOUT_RE, _SUBJECT_BEFORE_RE):
+        match = pattern.search(question)
+        if match and match.group(1)[:1].isupper() and match.group(1).split()[0].lower() not in MONTHS:
+            return match.group(1).strip()
+    return None
+
+
+def person_names(question: str, exclude: List[str] = ()) -> List[str]:
+    """Capitalised multi-word names that are not places, months or the event subject."""
+    excluded = " ".join(exclude).lower()
+    names = []
+    for name in _NAME_RE.findall(question):
+        words = name.lower().split()
+        if name.lower() in excluded or any(w in MONTHS or w in US_STATES for w in words) or name.lower() in US_STATES:
+            continue
+        names.append(name)
+    return names
+
+
+def unmatched_terms(question: str, filters: Dict[str, Any], phrases: List[str] = ()) -> List[str]:
+    """Words of the question no pattern accounted for: what is left after removing quoted text, the matched
+       subject / names / places / dates, descriptive words and filler. A non-empty list means the question
+       has a condition the SQL would silently drop ("canceled", "had violence")."""
+    text = _QUOTED_RE.sub(" ", question)
+    for phrase in phrases:
+        if phrase:
+            text = re.sub(re.escape(phrase), " ", text, flags=re.I)
+    text = _SEMANTIC_RE.sub(" ", _EVENT_ID_RE.sub(" ", text))
+    place_words = set()
+    for place in filters.get("places", []):
+        place_words.update(place.get("city", "").split())
+        if "state" in place:
+            place_words.add(place["state"].lower())
+            place_words.update(w for name, code in US_STATES.items() if code == place["state"] for w in name.split())
+    return [w for w in _WORD_RE.findall(text.lower())
+            if w not in _FILLER and w not in MONTHS and w not in place_words and not _YEAR_RE.fullmatch(w)]
+
+
+def _select(columns: str, rest: str, limit: int, dialect: str) -> str:
+    if dialect == "mssql":
+        distinct, columns = ("DISTINCT ", columns[9:]) if columns.startswith("DISTINCT ") else ("", columns)
+        return f"SELECT {distinct}TOP ({limit}) {columns} {rest}"
+    return f"SELECT {columns} {rest} LIMIT {limit}"
+
+
+def event_conditions(question: str, filters: Dict[str, Any]) -> tuple:
+    """(SQL conditions on alias e, params, description words) for subject, event id, date range and places."""
+    conditions, params, label = [], [], ["events"]
+    event_id = _EVENT_ID_RE.search(question)
+    subject = event_subject(question)
+    if event_id:
+        conditions.append("e.Id = ?")
+        params.append(int(event_id.group(1)))
+        label = [f"event {event_id.group(1)}"]
+    elif subject:
+        conditions.append("e.Subject LIKE ?")
+        params.append(f"%{subject}%")
+        label = [f'"{subject}" events']
+    if "date_from" in filters:
+        # open ends ("before 2024", "since 2022") come as 0 / 99991231
+        if filters["date_from"] > 0:
+            conditions.append("e.Date >= ?")
+            params.append(_iso(filters["date_from"]))
+            label.append(f"from {_iso(filters['date_from'])}")
+        if filters["date_to"] < 99991231:
+            conditions.append("e.Date < ?")
+            params.append(_next_day(filters["date_to"]))
+            label.append(f"to {_iso(filters['date_to'])}" if filters["date_from"] > 0
+                         else f"until {_iso(filters['date_to'])}")
+    places = filters.get("places") or []
+    if places:
+        # addresses end in ", City, ST 12345"
+        likes = []
+        for place in places:
+            if "city" in place:
+                likes.append(f"%, {place['city']}, {place.get('state', '')}%")
+            else:
+                likes.append(f"%, {place['state']} %")
+        conditions.append("(" + " OR ".join("e.Address LIKE ?" for _ in likes) + ")")
+        params.extend(likes)
+        label.append("in " + " or ".join(" ".join(v for v in (p.get("city", "").title(), p.get("state", "")) if v)
+                                        for p in places))
+    return conditions, params, label
+
+
+def plan_sql(question: str, dialect: str = "mssql", max_rows: int = 200) -> Optional[Dict[str, Any]]:
+    """{"intent", "sql", "params", "count", "label", "max_rows", "unmatched"} for a question whose shape SQL
+       answers, else None. "unmatched" lists the words the query does not filter on (see unmatched_terms)."""
+    filters = extract_filters(question)
+    if "geo" in filters:
+        return None
+    counting = bool(_COUNT_RE.search(question))
+    listing = bool(_LIST_RE.match(question))
+    people = bool(_PEOPLE_RE.search(question))
+    events = bool(_EVENT_RE.search(question))
+    attend = bool(_ATTEND_RE.search(question))
+    conditions, params, label = event_conditions(question, filters)
+    subject = event_subject(question)
+    names = person_names(question, exclude=[subject or ""] + [p.get("city", "") for p in filters.get("places", [])])
+    join = "FROM Event e JOIN EventPerson ep ON ep.EventId = e.Id JOIN Person p ON p.Id = ep.PersonId"
+
+    if people and (attend or counting) and conditions and not names:
+        intent, label = "persons_for_event", ["people who attended"] + label
+        where = " AND ".join(conditions)
+        count_sql = f"SELECT COUNT(DISTINCT p.Id) AS n {join} WHERE {where}"
+        list_sql = _select("DISTINCT p.Id AS Id, p.Name AS Name", f"{join} WHERE {where} ORDER BY p.Name",
+                           max_rows + 1, dialect)
+    elif events and names and (attend or counting or listing):
+        intent, label = "events_for_person", label + ["involving " + " or ".join(names)]
+        where = " AND ".join(["(" + " OR ".join("p.Name = ?" for _ in names) + ")"] + conditions)
+        params = list(names) + params
+        count_sql = f"SELECT COUNT(DISTINCT e.Id) AS n {join} WHERE {where}"
+        list_sql = _select("DISTINCT e.Id AS Id, e.Subject AS Subject, e.Date AS Date, e.Address AS Address",
+                           f"{join} WHERE {where} ORDER BY e.Date", max_rows + 1, dialect)
+    elif events and (counting or (listing and conditions)):
+        intent = "events"
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        count_sql = f"SELECT COUNT(*) AS n FROM Event e{where}"
+        list_sql = _select("e.Id AS Id, e.Subject AS Subject, e.Date AS Date, e.Address AS Address",
+                           f"FROM Event e{where} ORDER BY e.Date", max_rows + 1, dialect)
+    elif counting and people and not names:
+        intent, label = "persons", ["people"]
+        count_sql, list_sql = "SELECT COUNT(*) AS n FROM Person", None
+    else:
+        return None
+    return {"intent": intent, "sql": count_sql if counting else list_sql, "params": params, "count": counting,
+            "label": " ".join(label), "max_rows": max_rows,
+            "unmatched": unmatched_terms(question, filters, [subject or ""] + names)}
+
+
+def classify(question: str, dialect: str = "mssql", max_rows: int = 200) -> Dict[str, Any]:
+    """{"route": "sql" | "both" | "rag", "reason", "plan"} for one question. "sql" only when the patterns
+       cover the whole question; with a condition left over, a list becomes the superset the RAG prompt
+       narrows down ("both"), and a count, which would be wrong, goes to RAG."""
+    plan = plan_sql(question, dialect, max_rows)
+    if plan is None:
+        return {"route": "rag", "reason": "no structured pattern", "plan": None}
+    if plan["unmatched"]:
+        unmatched = " ".join(plan["unmatched"])
+        if plan["count"]:
+            return {"route": "rag", "reason": f"{plan['intent']} + unparsed: {unmatched}", "plan": None}
+        return {"route": "both", "reason": f"{plan['intent']} + unparsed: {unmatched}", "plan": plan}
+    if _SEMANTIC_RE.search(question):
+        return {"route": "both", "reason": plan["intent"] + " + descriptive", "plan": plan}
+    return {"route": "sql", "reason": plan["intent"], "plan": plan}
+
+
+def format_result(plan: Dict[str, Any], result: Dict[str, Any]) -> str:
+    """Plain-text answer for a plan's result ({"columns", "rows"})."""
+    rows = result["rows"]
+    if plan["count"]:
+        return f"{rows[0][0] if rows else 0} {plan['label']}."
+    if not rows:
+        return f"No {plan['label']} found."
+    shown = rows[:plan["max_rows"]]
+    more = f" (first {len(shown)} shown)" if len(rows) > len(shown) else ""
+    lines = [f"{len(shown)} {plan['label']}{more}:"]
+    lines += ["- " + " | ".join(f"{c} {v}" if c == "Id" else str(v) for c, v in zip(result["columns"], row)
+                                if v is not None) for row in shown]
+    return "\n".join(lines)
@@ -7,17 +7,45 @@ RAG Chatbot over SQL Server using Ollama + ChromaDB.
 """
 
 import os
+import re
 import json
+import time
+import logging
+import queue
+import random
+import threading
+import multiprocessing
+import hashlib
 import textwrap
-from typing import List, Dict, Any
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Iterable, Iterator
 
+import httpx
 import pyodbc
-from ollama import Client
+from ollama import Client, ResponseError
 # import chromadb
 from chromadb import PersistentClient
 from chromadb.config import Settings
 from dotenv import load_dotenv
 
+from answer_cache import AnswerCache
+from chunking import chunk_fields
+from context_packing import cut_rows, estimate_tokens, pack_context
+from embedding_cache import EmbeddingCache
+from geo_index import GeoIndex
+from index_checkpoint import IndexCheckpoint, partition_key
+import metrics
+from metrics import fields, stage
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from metadata_filters import build_where, date_num, extract_filters, parse_address, place_clause
+from query_router import classify, format_result
+from relation_index import RelationIndex
+from sql_cache import TABLE_VERSIONS_SQL, ResultCache, tables_in
+from sql_pool import SQL_DEFAULTS, ConnectionPool, connection_string
+from vector_store import NumpyVectorStore
+
 
 # print(pyodbc.drivers())
 
@@ -25,37 +53,199 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # ---------- Config ----------
+log = logging.getLogger("rag")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")       # text or json
 # SQL Server connection — set in .env or environment
-SQL_SERVER = os.getenv("SQL_SERVER", "localhost")
-SQL_DATABASE = os.getenv("SQL_DATABASE", "rag_chatbot_ollama")
-SQL_USERNAME = os.getenv("SQL_USERNAME", "sa")
-SQL_PASSWORD = os.getenv("SQL_PASSWORD", "pakistan")
-SQL_DRIVER = os.getenv("SQL_DRIVER", "{ODBC Driver 18 for SQL Server}")
+SQL_SERVER = os.getenv("SQL_SERVER", SQL_DEFAULTS["SQL_SERVER"])
+SQL_DATABASE = os.getenv("SQL_DATABASE", SQL_DEFAULTS["SQL_DATABASE"])
+SQL_USERNAME = os.getenv("SQL_USERNAME", SQL_DEFAULTS["SQL_USERNAME"])
+SQL_PASSWORD = os.getenv("SQL_PASSWORD", SQL_DEFAULTS["SQL_PASSWORD"])
+SQL_DRIVER = os.getenv("SQL_DRIVER", SQL_DEFAULTS["SQL_DRIVER"])
+# Connection pool shared by all SQL access: max open connections, wait for a free one, idle time before a health check
+SQL_POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "4"))
+SQL_POOL_TIMEOUT = float(os.getenv("SQL_POOL_TIMEOUT", "30"))
+SQL_HEALTH_CHECK_S = float(os.getenv("SQL_HEALTH_CHECK_S", "30"))
 
 # Ollama host & models
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+# Ollama replicas shared round-robin by parallel indexing workers (comma-separated; defaults to OLLAMA_HOST)
+OLLAMA_HOSTS = os.getenv("OLLAMA_HOSTS", "")
 # Embedding model name available in your Ollama installation (example names; change if needed)
 EMBED_MODEL = os.getenv("EMBED_MODEL", "mxbai-embed-large:latest")   # pick an embed model you pulled
 LLM_MODEL = os.getenv("LLM_MODEL", "llama3.2:latest")                 # pick an instruct/LLM model
 
+# Embedding pipeline: texts per /api/embed call, max in-flight calls, per-call timeout and retries
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "120"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "3"))
+EMBED_RETRY_BACKOFF = float(os.getenv("EMBED_RETRY_BACKOFF", "1.0"))
+
+# Streaming ingestion: rows per fetchmany page, docs per Chroma upsert, items buffered between stages
+FETCH_PAGE_SIZE = int(os.getenv("FETCH_PAGE_SIZE", "500"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "256"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+# Id-range partitions per table; Person/Event partitions are fetched in parallel over pooled connections
+FETCH_PARTITIONS = int(os.getenv("FETCH_PARTITIONS", "2"))
+# Parallel indexing (--workers): worker processes, Id-range partitions per table, resumable progress file
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", "0"))
+INDEX_PARTITIONS = int(os.getenv("INDEX_PARTITIONS", "16"))
+
+# Local state (caches, side indexes) lives next to the Chroma store
+RAG_STATE_DIR = os.getenv("RAG_STATE_DIR", "./rag_state")
+
+# On-disk embedding cache shared by indexing and querying (EMBED_CACHE=0 disables it)
+EMBED_CACHE = os.getenv("EMBED_CACHE", "1") == "1"
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", os.path.join(RAG_STATE_DIR, "embedding_cache.sqlite3"))
+EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", "512"))
+EMBED_CACHE_MEMORY_ITEMS = int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", "10000"))
+
+# Spatial index over Event coordinates (grid cell size in degrees, default radius for "near X")
+GEO_INDEX_PATH = os.getenv("GEO_INDEX_PATH", os.path.join(RAG_STATE_DIR, "geo_index.sqlite3"))
+GEO_CELL_DEG = float(os.getenv("GEO_CELL_DEG", "0.5"))
+GEO_DEFAULT_RADIUS_KM = float(os.getenv("GEO_DEFAULT_RADIUS_KM", "25"))
+GEO_MAX_CANDIDATES = int(os.getenv("GEO_MAX_CANDIDATES", "500"))
+
+# BM25 inverted index over document text
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(RAG_STATE_DIR, "lexical_index.sqlite3"))
+
+# Person <-> Event links (from EventPerson), used to build Event documents and to expand entity questions
+RELATION_INDEX_PATH = os.getenv("RELATION_INDEX_PATH", os.path.join(RAG_STATE_DIR, "relation_index.sqlite3"))
+ENTITY_MAX_ROWS = int(os.getenv("ENTITY_MAX_ROWS", "50"))       # 0 disables entity expansion
+ENTITY_TOKEN_BUDGET = int(os.getenv("ENTITY_TOKEN_BUDGET", "1000"))   # linked-events list, on top of the context budget
+
+INDEX_CHECKPOINT_PATH = os.getenv("INDEX_CHECKPOINT_PATH", os.path.join(RAG_STATE_DIR, "index_checkpoint.json"))
+
+# Field-aware chunking of long free-text fields (words per chunk, words of overlap; CHUNK_SIZE=0 = one chunk per row)
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "120"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "20"))
+CHUNK_CANDIDATES_PER_ROW = int(os.getenv("CHUNK_CANDIDATES_PER_ROW", "4"))
+
 # Chromadb client settings (persist locally)
 CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+COLLECTION_NAME = os.getenv("CHROMA_COLLECTION", "sql_docs")
+
+# Vector backend: chroma, or numpy = in-process exact index on memory-mapped files (shared across processes)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", os.path.join(RAG_STATE_DIR, "vectors"))
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32")     # float32 or int8 (4x smaller, ~exact ranking)
 
 # retrieval config
 TOP_K = int(os.getenv("TOP_K", "3"))
+MAX_TOP_K = int(os.getenv("MAX_TOP_K", "50"))  # largest top_k the service accepts
+# hybrid = BM25 + vector fused with reciprocal rank fusion; vector / lexical use a single path
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))   # hits taken from each path before fusion
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Max concurrent LLM generations in long-lived modes (REPL / HTTP service), to protect the Ollama backend
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "2"))
+# How long Ollama keeps the model (and the KV cache of the fixed prompt prefix) loaded after a request
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")
+# --batch: questions routed, embedded and searched together before their answers are generated
+BATCH_QUESTIONS = int(os.getenv("BATCH_QUESTIONS", "64"))
+
+# Context packing: estimated-token budget for the CONTEXT blocks (0 disables packing), MMR relevance weight,
+# near-duplicate cutoff
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.9"))
+
+# Semantic answer cache for long-lived modes (ANSWER_CACHE=0 disables it)
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+# Query routing: counts, date/place ranges and attendance lists are answered by SQL (ROUTER=0: always vector RAG)
+ROUTER = os.getenv("ROUTER", "1") == "1"
+ROUTE_MAX_ROWS = int(os.getenv("ROUTE_MAX_ROWS", "200"))
+# SQL result cache: seconds to keep a result, max results, seconds between table-write checks
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "300"))
+SQL_CACHE_SIZE = int(os.getenv("SQL_CACHE_SIZE", "1000"))
+SQL_VERSION_CHECK_S = float(os.getenv("SQL_VERSION_CHECK_S", "5"))
+
+# ---------- Warm clients ----------
+# Ollama/Chroma handles are created once per process and reused by every question.
+_handles: Dict[str, Any] = {}
+# re-entrant: a handle's factory may open other handles
+_handles_lock = threading.RLock()
+
+def _warm_handle(name: str, factory):
+    handle = _handles.get(name)
+    if handle is None:
+        with _handles_lock:
+            handle = _handles.get(name)
+            if handle is None:
+                handle = _handles[name] = factory()
+    return handle
+
+def get_embed_client() -> Client:
+    return _warm_handle("embed_client", lambda: Client(host=OLLAMA_HOST, timeout=EMBED_TIMEOUT))
+
+def get_llm_client() -> Client:
+    return _warm_handle("llm_client", lambda: Client(host=OLLAMA_HOST))
+
+def get_chroma_client():
+    """Vector store client: ChromaDB, or the NumPy index (same collection API) when VECTOR_BACKEND=numpy."""
+    if VECTOR_BACKEND == "numpy":
+        return _warm_handle("chroma_client", lambda: NumpyVectorStore(VECTOR_STORE_DIR, dtype=VECTOR_DTYPE))
+    return _warm_handle("chroma_client", lambda: PersistentClient(path=CHROMA_PERSIST_DIR))
+
+def get_embedding_cache():
+    """Process-wide embedding cache, or None when EMBED_CACHE=0."""
+    if not EMBED_CACHE:
+        return None
+    return _warm_handle("embedding_cache", lambda: EmbeddingCache(
+        EMBED_CACHE_PATH, memory_items=EMBED_CACHE_MEMORY_ITEMS, max_bytes=EMBED_CACHE_MAX_MB * 1024 * 1024))
+
+def get_answer_cache():
+    """Process-wide semantic answer cache, or None when ANSWER_CACHE=0."""
+    if not ANSWER_CACHE:
+        return None
+    return _warm_handle("answer_cache", lambda: AnswerCache(
+        threshold=ANSWER_CACHE_THRESHOLD, ttl_s=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_MAX_ENTRIES))
+
+def _invalidate_answers(doc_ids: List[str]):
+    # Only an already-warm cache can hold answers built from these rows
+    cache = _handles.get("answer_cache")
+    if cache is not None and doc_ids:
+        cache.invalidate_rows(doc_ids)
+
+def get_geo_index() -> GeoIndex:
+    return _warm_handle("geo_index", lambda: GeoIndex(GEO_INDEX_PATH, cell_deg=GEO_CELL_DEG))
+
+def get_sql_pool() -> ConnectionPool:
+    # the factory looks get_sql_connection up on each call, so a replaced connection function is picked up
+    return _warm_handle("sql_pool", lambda: ConnectionPool(lambda: get_sql_connection(), max_size=SQL_POOL_SIZE,
+                                                           timeout=SQL_POOL_TIMEOUT, check_after_s=SQL_HEALTH_CHECK_S))
+
+def get_sql_result_cache() -> ResultCache:
+    return _warm_handle("sql_results", lambda: ResultCache(ttl_s=SQL_CACHE_TTL, max_entries=SQL_CACHE_SIZE,
+                                                           max_rows=ROUTE_MAX_ROWS + 1, versions=table_versions,
+                                                           check_interval_s=SQL_VERSION_CHECK_S))
+
+def get_lexical_index() -> LexicalIndex:
+    return _warm_handle("lexical_index", lambda: LexicalIndex(LEXICAL_INDEX_PATH))
+
+def get_relation_index() -> RelationIndex:
+    return _warm_handle("relation_index", lambda: RelationIndex(RELATION_INDEX_PATH))
+
+def get_query_collection():
+    """The collection used for retrieval, opened (and counted) once per process."""
+    def open_collection():
+        collection = get_collection(get_chroma_client(), create=False)
+        log.info("Opened collection", extra=fields(collection=COLLECTION_NAME, documents=collection.count()))
+        return collection
+    return _warm_handle("collection", open_collection)
 
 # ---------- Utilities ----------
 def get_sql_connection():
-    conn_str = (
-        f"DRIVER={SQL_DRIVER};"
-        f"SERVER={SQL_SERVER};"
-        f"DATABASE={SQL_DATABASE};"
-    )
-    if SQL_USERNAME:
-        conn_str += f"UID={SQL_USERNAME};PWD={SQL_PASSWORD};"
-    else:
-        conn_str += "Trusted_Connection=yes;"
-    return pyodbc.connect(conn_str, autocommit=True)
+    """A new SQL Server connection; ingestion takes connections from get_sql_pool() instead."""
+    conn_str = connection_string(SQL_DRIVER, SQL_SERVER, SQL_DATABASE, SQL_USERNAME, SQL_PASSWORD)
+    with stage("sql_connect"):
+        return pyodbc.connect(conn_str, autocommit=True)
 
 def mask_ssn(ssn: str) -> str:
     """Simple SSN masking: keep last 4 digits only, rest replaced with X's.
@@ -67,231 +257,1308 @@ def mask_ssn(ssn: str) -> str:
         return "XXX-XX-" + digits[-4:]
     return "[REDACTED]"
 
+def _doc_text(kind: str, fields: List[tuple]) -> str:
+    return "\n".join([f"{kind}:"] + [f"{label}: {value}" for label, value in fields])
+
 def row_to_person_doc(row: pyodbc.Row) -> Dict[str, Any]:
-    """Convert Person row to a textual document and metadata."""
+    """Convert Person row to a textual document and metadata.
+       Short identifying fields and long free-text fields are also returned separately for chunking."""
     meta = {"table": "Person", "id": str(row.Id)}
     name = getattr(row, "Name", "")
     ssn = mask_ssn(getattr(row, "SSN", "") or "")
     bio = getattr(row, "BioData", "") 
     # To be robust, try typical column names
-    # Compose a short document
-    doc_text = textwrap.dedent(f"""
-        Person:
-        Id: {row.Id}
-        Name: {name}
-        SSN: {ssn}
-        Bio: {bio}
-        Education: {getattr(row, 'Education', '')}
-        Work: {getattr(row, 'Work', '')}
-    """).strip()
-    return {"id": meta["id"], "text": doc_text, "meta": meta}
-
-def row_to_event_doc(row: pyodbc.Row) -> Dict[str, Any]:
-    meta = {"table": "Event", "id": str(row.Id)}
+    short_fields = [("Id", row.Id), ("Name", name), ("SSN", ssn)]
+    long_fields = [("Bio", bio), ("Education", getattr(row, 'Education', '')), ("Work", getattr(row, 'Work', ''))]
+    return {"id": meta["id"], "text": _doc_text("Person", short_fields + long_fields), "meta": meta,
+            "identity": f"Person Id: {row.Id} | Name: {name}",
+            "short_fields": short_fields, "long_fields": long_fields}
+
+def _float_or_none(value) -> Any:
+    try:
+        return float(value) if value is not None and value != "" else None
+    except (TypeError, ValueError):
+        return None
+
+def row_to_event_doc(row: pyodbc.Row, persons: str = None) -> Dict[str, Any]:
+    """`persons` is the event's "Name, Name" list from the relation index; without it the row's own column is used."""
     # handle possible column names for Persons Involved variations
-    persons_involved = getattr(row, "Persons Involved", None) or getattr(row, "PersonsInvolved", None) or getattr(row, "PersonsInvolvedList", None) or getattr(row, "Persons_Involved", "")
-    doc_text = textwrap.dedent(f"""
-        Event:
-        Id: {row.Id}
-        Subject: {getattr(row, 'Subject', '')}
-        Date: {getattr(row, 'Date', '')}
-        Source: {getattr(row, 'Source', '')}
-        Latitude: {getattr(row, 'Latitude', '')}
-        Longitude: {getattr(row, 'Longitude', '')}
-        Address: {getattr(row, 'Address', '')}
-        Description: {getattr(row, 'Description', '')}
-        Persons Involved: {persons_involved}
-    """).strip()
-    # print(doc_text)
-    return {"id": meta["id"], "text": doc_text, "meta": meta}
+    persons_involved = persons if persons is not None else getattr(row, "Persons Involved", None) or getattr(row, "PersonsInvolved", None) or getattr(row, "PersonsInvolvedList", None) or getattr(row, "Persons_Involved", "")
+    # Typed fields for structured pre-filtering (Chroma metadata cannot hold None, so missing values are left out)
+    city, state = parse_address(getattr(row, "Address", ""))
+    meta = {"table": "Event", "id": str(row.Id), "date_num": date_num(getattr(row, "Date", None)),
+            "latitude": _float_or_none(getattr(row, "Latitude", None)),
+            "longitude": _float_or_none(getattr(row, "Longitude", None)),
+            "city": city, "state": state, "persons": persons_involved or None}
+    meta = {k: v for k, v in meta.items() if v is not None}
+    short_fields = [("Id", row.Id), ("Subject", getattr(row, 'Subject', '')), ("Date", getattr(row, 'Date', '')),
+                    ("Source", getattr(row, 'Source', '')), ("Latitude", getattr(row, 'Latitude', '')),
+                    ("Longitude", getattr(row, 'Longitude', '')), ("Address", getattr(row, 'Address', '')),
+                    ("Persons Involved", persons_involved)]
+    long_fields = [("Description", getattr(row, 'Description', ''))]
+    # same field order as before: Description comes right before Persons Involved
+    doc_text = _doc_text("Event", short_fields[:-1] + long_fields + short_fields[-1:])
+    return {"id": meta["id"], "text": doc_text, "meta": meta,
+            "identity": f"Event Id: {row.Id} | Subject: {getattr(row, 'Subject', '')} | Date: {getattr(row, 'Date', '')}",
+            "short_fields": short_fields, "long_fields": long_fields}
+
+def content_hash(text: str, meta: Dict[str, Any] = None) -> str:
+    """Stable fingerprint of a document's text and metadata, used to detect changed rows between index runs."""
+    payload = text if meta is None else text + "\0" + json.dumps(meta, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# ---------- Embeddings ----------
+def clean_text(text: str) -> str:
+    """Collapse newlines/whitespace; the embedding endpoint does better on single-line input."""
+    return " ".join(str(text).split())
+
+def _is_retryable(exc: Exception) -> bool:
+    # ollama turns connect errors into ConnectionError but lets httpx timeouts through
+    if isinstance(exc, (httpx.TimeoutException, httpx.TransportError, ConnectionError)):
+        return True
+    return isinstance(exc, ResponseError) and exc.status_code >= 500
+
+def _embed_batch(client: Client, texts: List[str]) -> List[List[float]]:
+    """One multi-input /api/embed call, retried with exponential backoff on timeouts and 5xx."""
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        try:
+            with stage("embed", batch=len(texts)):
+                vectors = client.embed(model=EMBED_MODEL, input=texts)["embeddings"]
+            if len(vectors) != len(texts):
+                raise ValueError(f"Ollama returned {len(vectors)} embeddings for {len(texts)} inputs")
+            return [list(v) for v in vectors]
+        except Exception as exc:
+            if attempt == EMBED_MAX_RETRIES or not _is_retryable(exc):
+                raise
+            delay = EMBED_RETRY_BACKOFF * (2 ** attempt) * (1 + random.random() / 2)
+            metrics.EMBED_RETRIES.inc()
+            log.warning("Embedding batch failed, retrying",
+                        extra=fields(batch=len(texts), error=repr(exc), attempt=attempt + 1, delay_s=round(delay, 1)))
+            time.sleep(delay)
+
+def _embed_batch_cached(client: Client, texts: List[str]) -> List[List[float]]:
+    """Serve what we can from the embedding cache and send only the misses to Ollama."""
+    cache = get_embedding_cache()
+    if cache is None:
+        return _embed_batch(client, texts)
+    vectors = cache.get_many(EMBED_MODEL, texts)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    metrics.cache_lookups("embedding", len(texts) - len(missing), len(missing))
+    if missing:
+        fresh = _embed_batch(client, [texts[i] for i in missing])
+        cache.put_many(EMBED_MODEL, [texts[i] for i in missing], fresh)
+        for i, vector in zip(missing, fresh):
+            vectors[i] = vector
+    return vectors
+
+def embed_batches(batches: Iterable[List[str]], client: Client = None) -> Iterator[List[List[float]]]:
+    """Embed each batch of texts with at most EMBED_CONCURRENCY requests in flight.
+       Yields one list of vectors per batch, in the same order the batches came in."""
+    client = client or get_embed_client()
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.submit(_embed_batch_cached, client, [clean_text(t) for t in batch]))
+            if len(pending) >= EMBED_CONCURRENCY:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def embed_texts(texts: List[str], client: Client = None, batch_size: int = EMBED_BATCH_SIZE) -> List[List[float]]:
+    """Embed a list of texts; the result is aligned with the input order."""
+    batches = (texts[i:i + batch_size] for i in range(0, len(texts), batch_size))
+    return [vector for vectors in embed_batches(batches, client) for vector in vectors]
+
+def embed_query(query: str, client: Client = None) -> List[float]:
+    # Same endpoint and cleaning as the documents, so query and document vectors are comparable
+    with stage("embed_query"):
+        return _embed_batch_cached(client or get_embed_client(), [clean_text(query)])[0]
+
+def embed_queries(queries: List[str], client: Client = None) -> List[List[float]]:
+    """embed_query() for many questions, in EMBED_BATCH_SIZE multi-input calls."""
+    with stage("embed_query", batch=len(queries)):
+        if len(queries) <= EMBED_BATCH_SIZE:
+            return _embed_batch_cached(client or get_embed_client(), [clean_text(q) for q in queries])
+        return embed_texts(queries, client)
 
 # ---------- DB ingestion ----------
-def load_and_index_all():
+# dialect of the routed queries (bench/sqlite_db.use_sqlite switches it to "sqlite")
+SQL_DIALECT = "mssql"
+SCHEMA_TABLES = ("Person", "Event", "EventPerson")
+PERSON_SQL = "SELECT [Id],[Name],[SSN],[BioData],[Education],[Work] FROM Person"
+# Linked person names come from the relation index (synced from the two queries below) instead of a
+# STRING_AGG join; they are listed in name order so the content hash only changes when the EventPerson
+# links (or a linked person's name) actually change.
+EVENT_SQL = "SELECT e.Id,e.Subject,e.Date,e.Source,e.Latitude,e.Longitude,e.Address,e.Description FROM Event e"
+PERSON_NAMES_SQL = "SELECT Id, Name FROM Person"
+EVENT_LINKS_SQL = "SELECT EventId, PersonId FROM EventPerson"
+
+def iter_rows(cursor, sql: str, params: tuple = (), page_size: int = FETCH_PAGE_SIZE) -> Iterator[Any]:
+    """Stream a result set page by page with fetchmany instead of fetchall."""
+    with stage("sql_execute"):
+        if params:
+            cursor.execute(sql, params)
+        else:
+            cursor.execute(sql)
+    while True:
+        with stage("sql_fetch"):
+            rows = cursor.fetchmany(page_size)
+        if not rows:
+            return
+        metrics.BATCH_SIZE.observe(len(rows), stage="sql_fetch")
+        yield from rows
+
+def split_chunks(doc: Dict[str, Any], parent_id: str, meta: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Chunk documents '<parent>#<n>' for one row; each starts with the row's identity line."""
+    bodies = chunk_fields(doc["short_fields"], doc["long_fields"], CHUNK_SIZE, CHUNK_OVERLAP)
+    return [{"id": f"{parent_id}#{n}", "text": f"{doc['identity']}\n{body}",
+             "meta": {**meta, "parent": parent_id, "chunk": n, "chunks": len(bodies)}}
+            for n, body in enumerate(bodies)]
+
+def to_document(table: str, row: Any, to_doc, **extra) -> Dict[str, Any]:
+    """Document keyed by '<table>:<id>', carrying the chunks that actually get embedded."""
+    doc = to_doc(row, **extra)
+    parent_id = f"{table}:{doc['id']}"
+    meta = {k: v for k, v in doc["meta"].items() if k != "id"}
+    meta.update({"table": table, "row_id": doc["id"]})
+    # chunking settings are part of the hash so changing them re-chunks every row
+    meta["content_hash"] = content_hash(doc["text"], {**meta, "chunking": [CHUNK_SIZE, CHUNK_OVERLAP]})
+    return {"id": parent_id, "text": doc["text"], "meta": meta, "chunks": split_chunks(doc, parent_id, meta)}
+
+def id_partitions(conn, table: str, parts: int) -> List[tuple]:
+    """(low, high) Id ranges of `table` covering every Id, None meaning an open end: the first range is open
+       below and the last open above, so rows added after MIN/MAX were read are still fetched.
+       Ranges are of equal width."""
+    if parts <= 1:
+        return [(None, None)]
+    bounds = conn.cursor().execute(f"SELECT MIN(Id) AS lo, MAX(Id) AS hi FROM {table}").fetchone()
+    if bounds is None or bounds.lo is None or bounds.hi == bounds.lo:
+        return [(None, None)]
+    lo, hi = int(bounds.lo), int(bounds.hi)
+    step = -(-(hi - lo + 1) // parts)
+    cuts = list(range(lo + step, hi + 1, step))
+    return list(zip([None] + cuts, cuts + [None]))
+
+def partition_query(sql: str, low: Any, high: Any) -> tuple:
+    """(sql, params) reading only the rows of `sql` with low <= Id < high."""
+    clauses = [("part.Id >= ?", low), ("part.Id < ?", high)]
+    clauses = [(clause, value) for clause, value in clauses if value is not None]
+    if not clauses:
+        return sql, ()
+    return (f"SELECT * FROM ({sql.strip().rstrip(';')}) AS part WHERE " + " AND ".join(c for c, _ in clauses),
+            tuple(v for _, v in clauses))
+
+def table_sources() -> List[tuple]:
+    return [("Person", PERSON_SQL, row_to_person_doc), ("Event", EVENT_SQL, row_to_event_doc)]
+
+def fetch_plan(partitions: int = FETCH_PARTITIONS) -> List[tuple]:
+    """(table, sql, params, row converter) for every table/partition to fetch."""
+    plan = []
+    with get_sql_pool().connection() as conn:
+        for table, sql, to_doc in table_sources():
+            plan.extend((table, *partition_query(sql, low, high), to_doc) for low, high in id_partitions(conn, table, partitions))
+    return plan
+
+def fetch_documents(table: str, sql: str, params: tuple, to_doc) -> Iterator[List[Dict[str, Any]]]:
+    """Pages of documents for one table/partition, read over its own pooled connection.
+       Event pages get their linked person names from the relation index in one lookup per page."""
+    with get_sql_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            for rows in batched(iter_rows(cursor, sql, params), FETCH_PAGE_SIZE):
+                if table != "Event":
+                    yield [to_document(table, row, to_doc) for row in rows]
+                    continue
+                persons = get_relation_index().persons_involved([row.Id for row in rows])
+                yield [to_document(table, row, to_doc, persons=persons.get(int(row.Id), "")) for row in rows]
+        finally:
+            cursor.close()
+
+def iter_documents(partitions: int = FETCH_PARTITIONS) -> Iterator[Dict[str, Any]]:
+    """Read Person and Event rows and turn them into documents keyed by '<table>:<id>'.
+       Tables and Id-range partitions are fetched in parallel, up to SQL_POOL_SIZE at a time;
+       documents come out in no particular order."""
+    plan = fetch_plan(partitions)
+    sources = [lambda task=task: fetch_documents(*task) for task in plan]
+    for page in merge_parallel(sources, workers=SQL_POOL_SIZE):
+        yield from page
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class _StageError:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+def prefetch(items: Iterable[Any], maxsize: int = PIPELINE_QUEUE_SIZE) -> Iterator[Any]:
+    """Run a generator stage on a background thread, handing items over through a bounded queue.
+       The producer blocks once `maxsize` items are waiting, so memory stays bounded;
+       exceptions are re-raised in the consumer and closing the consumer stops the producer."""
+    return merge_parallel([lambda: items], workers=1, maxsize=maxsize)
+
+def merge_parallel(sources: List[Callable[[], Iterable[Any]]], workers: int,
+                   maxsize: int = PIPELINE_QUEUE_SIZE) -> Iterator[Any]:
+    """Like prefetch, for several generator stages run on up to `workers` threads;
+       their items are interleaved in arrival order."""
+    q = queue.Queue(maxsize)
+    done = object()
+    stop = threading.Event()
+    pending = iter(sources)
+    pending_lock = threading.Lock()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            while not stop.is_set():
+                with pending_lock:
+                    source = next(pending, None)
+                if source is None:
+                    break
+                for item in source():
+                    if not put(item):
+                        return
+            put(done)
+        except BaseException as exc:
+            put(_StageError(exc))
+
+    running = max(1, min(workers, len(sources)))
+    for _ in range(running):
+        threading.Thread(target=produce, daemon=True).start()
+    try:
+        while running:
+            item = q.get()
+            if item is done:
+                running -= 1
+                continue
+            if isinstance(item, _StageError):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+
+def embed_doc_batches(doc_batches: Iterable[List[Dict[str, Any]]], client: Client = None) -> Iterator[tuple]:
+    """Pair each batch of documents with its embeddings, preserving order."""
+    in_flight = deque()
+
+    def texts():
+        for batch in doc_batches:
+            in_flight.append(batch)
+            yield [d["text"] for d in batch]
+
+    for vectors in embed_batches(texts(), client):
+        yield in_flight.popleft(), vectors
+
+def get_collection(chroma_client, create: bool = True):
+    if create:
+        return chroma_client.get_or_create_collection(name=COLLECTION_NAME)
+    return chroma_client.get_collection(COLLECTION_NAME)
+
+def iter_indexed(collection, include: List[str], page_size: int = 5000) -> Iterator[Dict[str, Any]]:
+    """Page through everything stored in the collection as {"id", "meta"[, "text"]} dicts."""
+    offset = 0
+    while True:
+        page = collection.get(include=include, limit=page_size, offset=offset)
+        for i, doc_id in enumerate(page["ids"]):
+            doc = {"id": doc_id, "meta": page["metadatas"][i] or {}}
+            if "documents" in include:
+                doc["text"] = page["documents"][i]
+            yield doc
+        if len(page["ids"]) < page_size:
+            return
+        offset += page_size
+
+def parent_of(doc_id: str) -> str:
+    return doc_id.split("#", 1)[0]
+
+def load_index_state(collection, page_size: int = 5000):
+    """({parent_id: content_hash}, {parent_id: [chunk ids]}) for everything currently in the collection.
+       A row whose chunks were only partly written by an interrupted run (mixed hashes, or fewer chunks
+       than recorded) gets an empty hash, so it is re-indexed."""
+    hashes, chunk_ids, expected = {}, {}, {}
+    for d in iter_indexed(collection, ["metadatas"], page_size):
+        parent = d["meta"].get("parent") or d["id"]
+        digest = d["meta"].get("content_hash", "")
+        hashes[parent] = digest if hashes.get(parent, digest) == digest else ""
+        chunk_ids.setdefault(parent, []).append(d["id"])
+        if "chunks" in d["meta"]:
+            expected[parent] = d["meta"]["chunks"]
+    for parent, count in expected.items():
+        if len(chunk_ids[parent]) < count:
+            hashes[parent] = ""
+    return hashes, chunk_ids
+
+# ---------- Side indexes ----------
+# Secondary indexes kept next to Chroma and updated by the same indexing run.
+# Bump when what they store changes, so existing installs rebuild them from Chroma once.
+SIDE_INDEX_VERSION = "1"
+# The lexical index holds chunks; the geo index holds one point per Event row; the relation index holds
+# EventPerson (synced from SQL before the rows are read) and the date of every Event row.
+def update_side_indexes(chunks: List[Dict[str, Any]]):
+    geo_points, event_dates = {}, {}
+    for c in chunks:
+        meta = c["meta"]
+        if "latitude" in meta and "longitude" in meta:
+            geo_points[parent_of(c["id"])] = (meta["latitude"], meta["longitude"], meta.get("city"), meta.get("state"))
+        if meta.get("table") == "Event":
+            event_dates[meta["row_id"]] = meta.get("date_num")
+    geo = get_geo_index()
+    # rows that lost their coordinates must leave the geo index
+    geo.remove({parent_of(c["id"]) for c in chunks if c["meta"].get("table") == "Event"})
+    geo.upsert([(parent, *point) for parent, point in geo_points.items()])
+    get_lexical_index().upsert([(c["id"], c["text"]) for c in chunks])
+    get_relation_index().upsert_events(event_dates.items())
+
+def remove_from_side_indexes(chunk_ids: List[str], removed_parents: Iterable[str] = ()):
+    get_lexical_index().remove(chunk_ids)
+    get_geo_index().remove(removed_parents)
+    get_relation_index().remove_events(p.split(":", 1)[1] for p in removed_parents if p.startswith("Event:"))
+
+def reset_side_indexes():
+    get_geo_index().clear()
+    get_lexical_index().clear()
+    get_relation_index().clear()
+
+def sync_relation_index() -> Dict[str, int]:
+    """Bring the relation index's people and links up to date with Person and EventPerson. Two plain scans,
+       no join; only changed links are written. Runs before Event documents are built from it."""
+    with stage("relation_sync"), get_sql_pool().connection() as conn:
+        # one cursor: sync() reads the people to the end before it starts on the links
+        cursor = conn.cursor()
+        changes = get_relation_index().sync(((row.Id, row.Name) for row in iter_rows(cursor, PERSON_NAMES_SQL)),
+                                            ((row.EventId, row.PersonId) for row in iter_rows(cursor, EVENT_LINKS_SQL)))
+    log.info("Synced relation index", extra=fields(**changes))
+    return changes
+
+def side_indexes() -> List[Any]:
+    return [get_geo_index(), get_lexical_index(), get_relation_index()]
+
+def mark_side_indexes_filled():
+    for index in side_indexes():
+        index.mark_filled(SIDE_INDEX_VERSION)
+
+def backfill_side_indexes(collection):
+    """Fill the side indexes from what is already in Chroma, once per SIDE_INDEX_VERSION (e.g. after
+       upgrading an existing index). Decided by each index's filled marker, not its row count: an index
+       that is legitimately empty (no Event has coordinates) must not trigger a full re-read every run."""
+    if all(index.filled_version() == SIDE_INDEX_VERSION for index in side_indexes()):
+        return
+    with stage("side_index_backfill"):
+        for docs in batched(iter_indexed(collection, ["metadatas", "documents"]), UPSERT_BATCH_SIZE):
+            update_side_indexes(docs)
+    mark_side_indexes_filled()
+
+def open_index_collection(full: bool):
+    """Collection to index into (dropped first with full=True), with its side indexes reset or backfilled
+       and the relation index synced from SQL."""
+    chroma_client = get_chroma_client()
+    # the collection may be dropped/recreated below; reopen it on the next question
+    _handles.pop("collection", None)
+    if full:
+        try:
+            chroma_client.delete_collection(COLLECTION_NAME)
+        except Exception:
+            pass
+    collection = get_collection(chroma_client)
+    if full or not collection.count():
+        # an empty collection is filled by this run, and the side indexes with it
+        reset_side_indexes()
+        mark_side_indexes_filled()
+    else:
+        backfill_side_indexes(collection)
+    sync_relation_index()
+    return collection
+
+def changed_chunks(docs: Iterable[Dict[str, Any]], indexed: Dict[str, str], indexed_chunks: Dict[str, List[str]],
+                   stats: Dict[str, int], seen_ids: set, stale_chunks: List[str]) -> Iterator[Dict[str, Any]]:
+    """Chunks of the new/changed documents; records every document id seen and the chunks changed rows no longer have."""
+    for doc in docs:
+        stats["fetched"] += 1
+        seen_ids.add(doc["id"])
+        # An Event's text includes its linked person names, so EventPerson changes show up here too
+        if indexed.get(doc["id"]) != doc["meta"]["content_hash"]:
+            stats["changed"] += 1
+            stats["chunks"] += len(doc["chunks"])
+            new_ids = {c["id"] for c in doc["chunks"]}
+            stale_chunks.extend(c for c in indexed_chunks.get(doc["id"], ()) if c not in new_ids)
+            yield from doc["chunks"]
+
+def upsert_embedded(collection, chunk: List[tuple]):
+    """Write (chunk, vector) pairs to the vector store and the side indexes."""
+    # Upsert into Chroma so changed rows replace their previous vectors
+    with stage("vector_upsert", batch=len(chunk)):
+        collection.upsert(
+            ids=[d["id"] for d, _ in chunk],
+            documents=[d["text"] for d, _ in chunk],
+            metadatas=[d["meta"] for d, _ in chunk],
+            embeddings=[v for _, v in chunk]
+        )
+    with stage("side_index_update", batch=len(chunk)):
+        update_side_indexes([d for d, _ in chunk])
+    _invalidate_answers(list({d["meta"]["parent"] for d, _ in chunk}))
+
+def delete_chunks(collection, chunk_ids: List[str], removed: List[str]):
+    """Delete chunks from the vector store and side indexes; `removed` are rows gone from SQL Server."""
+    removed_set = set(removed)
+    for ids in batched(chunk_ids, UPSERT_BATCH_SIZE):
+        with stage("vector_delete", batch=len(ids)):
+            collection.delete(ids=ids)
+        remove_from_side_indexes(ids, {parent_of(c) for c in ids if parent_of(c) in removed_set})
+    _invalidate_answers(removed)
+
+def finish_index_run(collection, stats: Dict[str, int], started: float):
+    # chroma_client.persist()
+    if VECTOR_BACKEND == "numpy":
+        # lets query processes open the index from the column snapshot instead of reading every row
+        with stage("vector_snapshot"):
+            collection.save_snapshot()
+    elapsed = time.perf_counter() - started
+    metrics.STAGE_SECONDS.observe(elapsed, stage="index")
+    for outcome, count in (("changed", stats["changed"]), ("unchanged", stats["fetched"] - stats["changed"]),
+                           ("removed", stats["removed"])):
+        metrics.ROWS.inc(count, outcome=outcome)
+    log.info("Indexed documents into the vector store",
+             extra=fields(fetched=stats["fetched"], changed=stats["changed"], chunks=stats["chunks"],
+                          unchanged=stats["fetched"] - stats["changed"], removed=stats["removed"],
+                          seconds=round(elapsed, 2), docs_per_s=round(stats["fetched"] / elapsed, 1) if elapsed else 0))
+    if get_embedding_cache() is not None:
+        get_embedding_cache().flush()
+        log.info("Embedding cache", extra=fields(**get_embedding_cache().stats()))
+
+def load_and_index_all(full: bool = False):
     """
     1) Read Person and Event tables
-    2) Create embeddings via Ollama
-    3) Add to Chroma collection
+    2) Diff against the content hashes already stored in Chroma (skipped with full=True)
+    3) Chunk new/changed rows and create embeddings via Ollama for their chunks only
+    4) Upsert new chunks, delete leftover chunks of changed rows and everything of rows removed from SQL Server
     """
+    started = time.perf_counter()
     # init Ollama client
-    ollama_client = Client(host=OLLAMA_HOST)
+    ollama_client = get_embed_client()
+    collection = open_index_collection(full)
+    with stage("index_state"):
+        indexed, indexed_chunks = ({}, {}) if full else load_index_state(collection)
 
-    # init chroma
-    chroma_client = PersistentClient(path=CHROMA_PERSIST_DIR)
-    collection_name = "sql_docs"
-    try:
-        collection = chroma_client.get_collection(collection_name)
-    except Exception:
-        collection = chroma_client.create_collection(name=collection_name)
-
-    # Connect to SQL Server
-    conn = get_sql_connection()
-    cursor = conn.cursor()
-
-    docs_texts = []
-    docs_ids = []
-    docs_metadatas = []
-
-    # --- Persons ---
-    cursor.execute("SELECT [Id],[Name],[SSN],[BioData],[Education],[Work] FROM Person")
-    for row in cursor.fetchall():
-        doc = row_to_person_doc(row)
-        docs_ids.append(f"Person:{doc['id']}")
-        docs_texts.append(doc['text'])
-        docs_metadatas.append({"table": "Person", "row_id": doc['id']})
-
-    # --- Events ---
-    cursor.execute("SELECT e.Id,e.Subject,e.Date,e.Source,e.Latitude,e.Longitude,e.Address,e.Description, STRING_AGG(p.Name, ', ') AS PersonsInvolved \
-        FROM Event e LEFT JOIN EventPerson ep ON e.Id = ep.EventId LEFT JOIN Person p ON ep.PersonId=p.Id \
-        GROUP BY e.Id,e.Subject,e.Date,e.Source,e.Latitude,e.Longitude,e.Address,e.Description;")
-    for row in cursor.fetchall():
-        doc = row_to_event_doc(row)
-        docs_ids.append(f"Event:{doc['id']}")
-        docs_texts.append(doc['text'])
-        docs_metadatas.append({"table": "Event", "row_id": doc['id']})
-
-    print(f"[+] Fetched {len(docs_texts)} documents from SQL Server")
-
-    # Generate embeddings in batches using Ollama embedding endpoint
-    # Ollama's python client exposes a .embeddings(...) function in examples
-    # We'll call it iteratively in small batches to avoid timeouts.
-    
-    # BATCH = 32
-    BATCH = 1
-    all_embeddings = []
-    for i in range(0, len(docs_texts), BATCH):
-        batch_texts = [str(text).replace('\r', ' ').replace('\n', ' ') for text in docs_texts[i:i+BATCH]]
-        # print(batch_texts)
-        # Ensure all items are strings and no newlines
-        batch_texts_clean = [str(text).replace('\n', ' ').strip() for text in batch_texts]
-        # print('batch_texts_clean', len(batch_texts_clean))
-        print(batch_texts_clean[0])
-        # Defensive: if only one doc, still pass as list        
-        if len(batch_texts_clean) == 1:
-            resp = ollama_client.embeddings(model=EMBED_MODEL, prompt=batch_texts_clean[0])
-        else:
-            resp = ollama_client.embeddings(model=EMBED_MODEL, prompt=batch_texts_clean)
-        # Response shape depends on Ollama client version: normalize
-        # If resp is list/dict, extract 'embedding' fields accordingly
-        # We'll accept resp to be either a list of dicts or a dict with 'embedding' for single item.
-        if isinstance(resp, dict) and "embedding" in resp:
-            all_embeddings.append(resp["embedding"])
-        else:
-            # try to flatten
-            for item in resp:
-                if isinstance(item, dict) and "embedding" in item:
-                    all_embeddings.append(item["embedding"])
-                else:
-                    # sometimes response is direct list of list floats
-                    all_embeddings.append(item)
-
-    print(f"[+] Generated {len(all_embeddings)} embeddings")
-
-    # Add to Chroma
-    # We may want to upsert to update existing docs
-    embeddings2 = [e[1] for e in all_embeddings]
-    #for e in all_embeddings:
-    #    print(e[1])
-    collection.add(
-        ids=docs_ids,
-        documents=docs_texts,
-        metadatas=docs_metadatas,
-        embeddings=embeddings2
-    )
-    # chroma_client.persist()
-    print("[+] Indexed documents into ChromaDB")
+    # Three overlapping stages joined by bounded queues:
+    #   fetch (parallel fetchmany pages over pooled connections -> chunks of changed rows) -> embed (batched, concurrent) -> upsert (main thread)
+    # Only ids are kept for the whole run (to detect deletions); texts and vectors are dropped per chunk.
+    stats = {"fetched": 0, "changed": 0, "chunks": 0}
+    seen_ids = set()
+    stale_chunks = []
+
+    chunks = changed_chunks(iter_documents(FETCH_PARTITIONS), indexed, indexed_chunks, stats, seen_ids, stale_chunks)
+    doc_batches = prefetch(batched(chunks, EMBED_BATCH_SIZE))
+    embedded = prefetch(embed_doc_batches(doc_batches, ollama_client))
+    upserted = 0
+    for chunk in batched(((d, v) for docs, vectors in embedded for d, v in zip(docs, vectors)), UPSERT_BATCH_SIZE):
+        upsert_embedded(collection, chunk)
+        upserted += len(chunk)
+        log.debug("Upserted chunks", extra=fields(chunks=upserted, rows_read=stats["fetched"]))
+
+    removed = [parent for parent in indexed if parent not in seen_ids]
+    removed_chunks = [c for parent in removed for c in indexed_chunks[parent]]
+    delete_chunks(collection, stale_chunks + removed_chunks, removed)
+    if removed or stale_chunks:
+        log.info("Deleted chunks", extra=fields(removed_rows=len(removed), removed_chunks=len(removed_chunks),
+                                                 leftover_chunks=len(stale_chunks)))
+    finish_index_run(collection, {**stats, "removed": len(removed)}, started)
+
+# ---------- Parallel indexing ----------
+# Worker processes fetch, diff and embed Id-range partitions; the parent process is the only vector store
+# writer (neither Chroma nor the NumPy index supports concurrent writers) and checkpoints each partition.
+def index_settings() -> Dict[str, Any]:
+    """What an index checkpoint must match to be resumed."""
+    return {"collection": COLLECTION_NAME, "backend": VECTOR_BACKEND, "embed_model": EMBED_MODEL,
+            "chunking": [CHUNK_SIZE, CHUNK_OVERLAP]}
+
+def plan_partitions(parts: int) -> List[Dict[str, Any]]:
+    with get_sql_pool().connection() as conn:
+        return [{"table": table, "low": low, "high": high}
+                for table, _, _ in table_sources() for low, high in id_partitions(conn, table, parts)]
+
+def split_index_state(indexed: Dict[str, str], partitions: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """{partition key: indexed parent ids whose row Id falls in that partition's range}.
+       `partitions` must be the whole plan, so every indexed row has exactly one owner."""
+    by_table: Dict[str, List[Dict[str, Any]]] = {}
+    for p in partitions:
+        by_table.setdefault(p["table"], []).append(p)
+    owners = {table: ([p["low"] for p in parts[1:]], parts) for table, parts in by_table.items()}
+    out = {partition_key(p["table"], p["low"], p["high"]): [] for p in partitions}
+    for parent in indexed:
+        table, _, row_id = parent.partition(":")
+        if table not in owners or not row_id.lstrip("-").isdigit():
+            continue
+        cuts, parts = owners[table]
+        p = parts[bisect_right(cuts, int(row_id))]
+        out[partition_key(table, p["low"], p["high"])].append(parent)
+    return out
+
+def _init_index_worker(results):
+    global _handles, _handles_lock
+    # Fresh clients and connections per worker. A forked worker keeps the parent's handles referenced but
+    # unused: closing them here would close sockets the parent still uses.
+    _handles = {"index_results": results, "parent_handles": _handles}
+    _handles_lock = threading.RLock()
+
+def index_partition(task: Dict[str, Any]):
+    """Fetch, diff and embed one partition in a worker process. Embedded chunks are sent to the parent,
+       followed by a 'done' message with the chunk ids to delete."""
+    results = _handles["index_results"]
+    to_doc = {table: fn for table, _, fn in table_sources()}[task["table"]]
+    sql, params = partition_query(task["sql"], task["low"], task["high"])
+    stats = {"fetched": 0, "changed": 0, "chunks": 0}
+    seen_ids, stale_chunks = set(), []
+    docs = (doc for page in fetch_documents(task["table"], sql, params, to_doc) for doc in page)
+    chunks = changed_chunks(docs, task["hashes"], task["chunk_ids"], stats, seen_ids, stale_chunks)
+    client = Client(host=task["host"], timeout=EMBED_TIMEOUT)
+    for docs, vectors in embed_doc_batches(prefetch(batched(chunks, EMBED_BATCH_SIZE)), client):
+        results.put(("chunks", task["key"], docs, vectors))
+    removed = [parent for parent in task["hashes"] if parent not in seen_ids]
+    stale_chunks += [c for parent in removed for c in task["chunk_ids"][parent]]
+    results.put(("done", task["key"], stale_chunks, removed, {**stats, "removed": len(removed)}))
+
+def load_and_index_parallel(workers: int, full: bool = False, partitions: int = INDEX_PARTITIONS):
+    """
+    load_and_index_all split over `workers` processes: Person and Event are cut into `partitions` Id ranges
+    each; workers fetch + embed a range at a time (round-robin over OLLAMA_HOSTS) while this process upserts.
+    Finished partitions are checkpointed in INDEX_CHECKPOINT_PATH, so after a crash or a failed partition
+    a rerun only processes the unfinished ones.
+    """
+    started = time.perf_counter()
+    checkpoint = IndexCheckpoint.load(INDEX_CHECKPOINT_PATH, index_settings())
+    if checkpoint is not None and (checkpoint.full or not full):
+        log.info("Resuming indexing run", extra=fields(partitions=len(checkpoint.partitions),
+                                                       done=len(checkpoint.done), full=checkpoint.full))
+        collection = open_index_collection(full=False)
+    else:
+        collection = open_index_collection(full)
+        checkpoint = IndexCheckpoint(INDEX_CHECKPOINT_PATH, index_settings(), plan_partitions(partitions), full)
+        checkpoint.save()
+    with stage("index_state"):
+        indexed, indexed_chunks = load_index_state(collection)
+
+    pending = checkpoint.pending()
+    owned = split_index_state(indexed, checkpoint.partitions)
+    sql = {table: table_sql for table, table_sql, _ in table_sources()}
+    hosts = [h.strip() for h in (OLLAMA_HOSTS or OLLAMA_HOST).split(",") if h.strip()]
+    tasks = []
+    for i, p in enumerate(pending):
+        key = checkpoint.key(p)
+        tasks.append({**p, "key": key, "sql": sql[p["table"]], "host": hosts[i % len(hosts)],
+                      "hashes": {parent: indexed[parent] for parent in owned[key]},
+                      "chunk_ids": {parent: indexed_chunks[parent] for parent in owned[key]}})
+    del indexed, indexed_chunks, owned
+
+    stats = {"fetched": 0, "changed": 0, "chunks": 0, "removed": 0}
+    failed = {}
+    context = multiprocessing.get_context()
+    remaining = {task["key"] for task in tasks}
+    # a manager queue stays usable when a worker dies mid-put, which can leave a plain multiprocessing.Queue locked
+    with context.Manager() as manager:
+        results = manager.Queue(maxsize=PIPELINE_QUEUE_SIZE * max(1, workers))
+
+        def report_failure(future, key):
+            # a crashed worker process fails its future without ever sending "done"
+            if not future.cancelled() and future.exception() is not None:
+                results.put(("failed", key, repr(future.exception())))
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_index_worker, initargs=(results,)) as pool:
+            futures = []
+            for task in tasks:
+                futures.append(pool.submit(index_partition, task))
+                futures[-1].add_done_callback(lambda f, key=task["key"]: report_failure(f, key))
+            try:
+                while remaining:
+                    kind, key, *payload = results.get()
+                    if kind == "chunks":
+                        docs, vectors = payload
+                        for chunk in batched(list(zip(docs, vectors)), UPSERT_BATCH_SIZE):
+                            upsert_embedded(collection, chunk)
+                    elif kind == "done":
+                        chunk_ids, removed, partition_stats = payload
+                        delete_chunks(collection, chunk_ids, removed)
+                        checkpoint.mark_done(key)
+                        for name, value in partition_stats.items():
+                            stats[name] += value
+                        remaining.discard(key)
+                        log.info("Partition indexed", extra=fields(partition=key, left=len(remaining), **partition_stats))
+                    elif key in remaining:
+                        failed[key] = payload[0]
+                        remaining.discard(key)
+                        log.error("Partition failed", extra=fields(partition=key, error=payload[0]))
+            except BaseException:
+                # workers blocked on a full queue would never finish: keep draining until they stop
+                pool.shutdown(wait=False, cancel_futures=True)
+                while not all(f.done() for f in futures):
+                    try:
+                        results.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+                raise
+
+    finish_index_run(collection, stats, started)
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(tasks)} partitions failed; run the same command again "
+                           f"to resume them (progress is saved in {INDEX_CHECKPOINT_PATH})")
+    checkpoint.remove()
 
 # ---------- Retrieval + answer generation ----------
-def retrieve_context(query: str, top_k: int = TOP_K):
-    """Embed query and query ChromaDB to get top_k documents and metadata."""
-    ollama_client = Client(host=OLLAMA_HOST)
-    chroma_client = PersistentClient(path=CHROMA_PERSIST_DIR)
-    collection = chroma_client.get_collection("sql_docs")
-    print(f"collection length: {collection.count()}")
-    
-    q_resp = ollama_client.embeddings(model=EMBED_MODEL, prompt=query)
-    if isinstance(q_resp, dict) and "embedding" in q_resp:
-        q_emb = q_resp["embedding"]
-        # print("q_emb:1")
-    elif isinstance(q_resp, list) and len(q_resp) > 0 and isinstance(q_resp[0], dict) and "embedding" in q_resp[0]:
-        q_emb = q_resp[0]["embedding"]
-        # print("q_emb:2")
+def geo_candidates(geo: Dict[str, Any]) -> List[str]:
+    """Event row ids inside the requested radius/box, nearest first (capped at GEO_MAX_CANDIDATES)."""
+    index = get_geo_index()
+    if "bbox" in geo:
+        doc_ids = index.within_bbox(*geo["bbox"])[:GEO_MAX_CANDIDATES]
     else:
-        # fallback: assume direct list returned
-        q_emb = q_resp["embedding"]
-        # print("q_emb:3")
-
-    # print("q_emb:", q_emb)
-    
-    results = collection.query(query_embeddings=[q_emb], n_results=top_k, include=["documents", "metadatas", "distances"])
-    docs = results["documents"][0]
-    metadatas = results["metadatas"][0]
-    distances = results["distances"][0]
+        center = (geo["lat"], geo["lon"]) if "lat" in geo else index.locate(**geo["place"])
+        if center is None:
+            return []
+        doc_ids = [doc_id for doc_id, _ in index.within_radius(*center, geo["km"], limit=GEO_MAX_CANDIDATES)]
+    return [doc_id.split(":", 1)[1] for doc_id in doc_ids]
+
+@stage("entity_lookup")
+def entity_where(query: str, filters: Dict[str, Any]) -> tuple:
+    """(where, linked) restricting the search to the rows linked to the people named in the question: their
+       Person rows, and their events that also match the question's dates, places and area.
+       linked = {"persons": [(id, name)], "events": [event id], "total": matching events before the cap}.
+       (None, None) when no known person is named or ENTITY_MAX_ROWS=0."""
+    if ENTITY_MAX_ROWS <= 0:
+        return None, None
+    index = get_relation_index()
+    persons = index.find_persons(query)
+    if not persons:
+        return None, None
+    events = index.events_for_persons([pid for pid, _ in persons], filters.get("date_from"), filters.get("date_to"))
+    event_ids = [str(event_id) for event_id, _ in events]
+    if "row_ids" in filters:
+        inside = set(filters["row_ids"])
+        event_ids = [event_id for event_id in event_ids if event_id in inside]
+    linked = {"persons": persons, "events": event_ids[:max(0, ENTITY_MAX_ROWS - len(persons))],
+              "total": len(event_ids)}
+    where = {"$and": [{"table": {"$eq": "Person"}}, {"row_id": {"$in": [str(pid) for pid, _ in persons]}}]}
+    if linked["events"]:
+        where = {"$or": [where, build_where({**filters, "row_ids": linked["events"]})]}
+    return where, linked
+
+_FIELD_LINE_RE = re.compile(r"^(Subject|Date): (.*)$", re.M)
+
+@stage("entity_block")
+def linked_events_block(collection, linked: Dict[str, Any]) -> Dict[str, Any]:
+    """Context block listing every linked event on one line each ("- Event Id 12 | Subject | Date | City, ST"),
+       read from the events' first chunks, which hold the short fields. build_prompt() packs it under
+       ENTITY_TOKEN_BUDGET, so all of a person's events reach the prompt, not only the top_k full rows."""
+    names = " and ".join(f"{name} (person {pid})" for pid, name in linked["persons"])
+    lines = {}
+    if linked["events"]:
+        page = collection.get(where={"$and": [{"table": {"$eq": "Event"}}, {"row_id": {"$in": linked["events"]}},
+                                              {"chunk": {"$eq": 0}}]}, include=["documents", "metadatas"])
+        for doc, meta in zip(page["documents"], page["metadatas"]):
+            fields = dict(_FIELD_LINE_RE.findall(doc))
+            place = ", ".join(v for v in (str(meta.get("city", "")).title(), meta.get("state", "")) if v)
+            values = [fields.get("Subject", "").strip(), fields.get("Date", "").strip(), place]
+            if len(linked["persons"]) > 1:
+                values.append("with " + ", ".join(name for _, name in linked["persons"]
+                                                  if name and name in meta.get("persons", "")))
+            lines[meta["row_id"]] = " | ".join([f"- Event Id {meta['row_id']}"] + [v for v in values if v])
+    shown = [lines[event_id] for event_id in linked["events"] if event_id in lines]
+    more = f" (first {len(shown)} of {linked['total']} shown)" if linked["total"] > len(shown) else ""
+    text = "\n".join([f"Events linked to {names}, oldest first: {len(shown)}{more}"] + shown)
+    meta = {"table": "EventPerson", "row_id": ",".join(str(pid) for pid, _ in linked["persons"]),
+            "content_hash": content_hash(text)}
+    return {"doc": text, "meta": meta, "distance": None, "score": None}
+
+@stage("filters")
+def query_filters(query: str, collection=None) -> Dict[str, Any]:
+    """Structured filters in the question (date range, places), keeping only places that exist in the index
+       so a capitalised phrase that is not a place cannot filter every row away.
+       Radius/box searches are resolved through the geo index into candidate row ids; an area with no indexed
+       event adds no restriction, so the dates and places still apply."""
+    filters =extract_filters(query, default_km=GEO_DEFAULT_RADIUS_KM)
+    if "geo" in filters:
+        # no indexed event inside the area (or an unknown place): drop only the area, keep dates and places
+        row_ids = geo_candidates(filters.pop("geo"))
+        if row_ids:
+            filters["row_ids"] = row_ids
+    if filters.get("places"):
+        collection = collection or get_query_collection()
+        places = [p for p in filters["places"] if collection.get(where=place_clause(p), limit=1, include=[])["ids"]]
+        if places:
+            filters["places"] = places
+        else:
+            del filters["places"]
+    return filters
+
+def _vector_search(collection, q_embs: List[List[float]], n: int, where) -> List[List[Dict[str, Any]]]:
+    """Hits for each query embedding, from one multi-query call."""
+    with stage("vector_query", batch=len(q_embs)):
+        results = collection.query(query_embeddings=q_embs, n_results=n, where=where,
+                                   include=["documents", "metadatas", "distances"])
+    return [[{"id": doc_id, "doc": doc, "meta": meta, "distance": dist}
+             for doc_id, doc, meta, dist in zip(results["ids"][q], results["documents"][q],
+                                                results["metadatas"][q], results["distances"][q])]
+            for q in range(len(q_embs))]
+
+@stage("lexical_search")
+def _lexical_search(collection, query: str, n: int, where) -> List[str]:
+    hits = [doc_id for doc_id, _ in get_lexical_index().search(query, n)]
+    if hits and where is not None:
+        allowed = set(collection.get(ids=hits, where=where, include=[])["ids"])
+        hits = [doc_id for doc_id in hits if doc_id in allowed]
+    return hits
+
+def aggregate_parents(ranked: List[tuple], by_id: Dict[str, Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    """Group ranked chunk hits by parent row, keep the best top_k rows and merge each row's matched chunks
+       into one context block: identity line once, then the chunk bodies in document order."""
+    parents: Dict[str, Dict[str, Any]] = {}
+    for chunk_id, score in ranked:
+        hit = by_id.get(chunk_id)
+        if hit is None:
+            continue
+        parent = hit["meta"].get("parent") or chunk_id
+        if parent not in parents:
+            if len(parents) == top_k:
+                continue
+            meta = {k: v for k, v in hit["meta"].items() if k not in ("parent", "chunk")}
+            parents[parent] = {"meta": meta, "distance": hit["distance"], "score": score, "chunks": []}
+        entry = parents[parent]
+        entry["chunks"].append((hit["meta"].get("chunk", 0), hit["doc"]))
+        if hit["distance"] is not None and (entry["distance"] is None or hit["distance"] < entry["distance"]):
+            entry["distance"] = hit["distance"]
+    retrieved = []
+    for entry in parents.values():
+        texts = [doc for _, doc in sorted(entry["chunks"], key=lambda c: c[0])]
+        identity = texts[0].split("\n", 1)[0]
+        bodies = [t.split("\n", 1)[1] if t.startswith(identity + "\n") else t for t in texts]
+        doc = identity + "\n" + "\n...\n".join(bodies) if len(texts) > 1 else texts[0]
+        retrieved.append({"doc": doc, "meta": entry["meta"], "distance": entry["distance"], "score": entry["score"]})
+    return retrieved
+
+@stage("retrieve")
+def retrieve_context(query: str, top_k: int = TOP_K, q_emb: List[float] = None):
+    """Embed query (unless q_emb is given) and query ChromaDB to get the top_k rows and their metadata.
+       Dates, places and radius/box searches in the question become a `where` pre-filter on Event metadata.
+       In hybrid mode BM25 hits over the same chunks are fused with the vector hits (reciprocal rank fusion),
+       so exact names, professions and subjects are not lost at a small top_k.
+       Hits are chunks; they are grouped back into their rows so each row appears once in the context."""
+    return retrieve_contexts([query], top_k, [q_emb] if q_emb is not None else None)[0]
+
+def retrieve_contexts(queries: List[str], top_k: int = TOP_K, q_embs: List[List[float]] = None) -> List[List[Dict[str, Any]]]:
+    """retrieve_context() for many questions: questions that share a `where` filter are searched with one
+       multi-query collection.query call. Results are aligned with `queries`.
+       A question naming known people (relation index) is searched only among their linked rows, and also
+       gets a compact list of all those events (up to ENTITY_MAX_ROWS) as its first context block."""
+    collection = get_query_collection()
+    use_vector = RETRIEVAL_MODE != "lexical"
+    use_lexical = RETRIEVAL_MODE != "vector"
+    if use_vector and q_embs is None:
+        q_embs = embed_queries(queries)
+    wheres, links = [], []
+    for query in queries:
+        filters = query_filters(query, collection)
+        where, linked = entity_where(query, filters)
+        links.append(linked)
+        if where is None:
+            where = build_where(filters)
+        wheres.append(where)
+
+    def search(indexes: List[int], where, linked: bool = False) -> List[tuple]:
+        # several chunks of one row can rank high, so ask for more chunks than rows
+        n = top_k * CHUNK_CANDIDATES_PER_ROW
+        # the vector search already sees every chunk of the linked rows; BM25 would rank the whole index
+        lexical = use_lexical and not (linked and use_vector)
+        if lexical:
+            n = max(n, HYBRID_CANDIDATES)
+        vector_hits = _vector_search(collection, [q_embs[i] for i in indexes], n, where) if use_vector \
+            else [[] for _ in indexes]
+        lexical_ids = [_lexical_search(collection, queries[i], n, where) if lexical else [] for i in indexes]
+        return list(zip(vector_hits, lexical_ids))
+
+    groups: Dict[str, List[int]] = {}
+    for i, where in enumerate(wheres):
+        groups.setdefault(json.dumps(where, sort_keys=True), []).append(i)
+    hits: List[tuple] = [None] * len(queries)
+    for indexes in groups.values():
+        for i, found in zip(indexes, search(indexes, wheres[indexes[0]], links[indexes[0]] is not None)):
+            hits[i] = found
+    # nothing matches the structured filter; fall back to an unfiltered search
+    empty = [i for i, (vector_hits, lexical_ids) in enumerate(hits)
+             if wheres[i] is not None and not vector_hits and not lexical_ids]
+    if empty:
+        for i, found in zip(empty, search(empty, None)):
+            hits[i] = found
+
     retrieved = []
-    for doc, meta, dist in zip(docs, metadatas, distances):
-        retrieved.append({"doc": doc, "meta": meta, "distance": dist})
+    for (vector_hits, lexical_ids), linked in zip(hits, links):
+        fused = reciprocal_rank_fusion([[h["id"] for h in vector_hits], lexical_ids], k=RRF_K)
+        by_id = {h["id"]: h for h in vector_hits}
+        missing = [doc_id for doc_id, _ in fused if doc_id not in by_id]
+        if missing:
+            # lexical-only hits: load their text and metadata (no vector distance for these)
+            page = collection.get(ids=missing, include=["documents", "metadatas"])
+            for doc_id, doc, meta in zip(page["ids"], page["documents"], page["metadatas"]):
+                by_id[doc_id] = {"id": doc_id, "doc": doc, "meta": meta, "distance": None}
+        entity = [linked_events_block(collection, linked)] if linked is not None else []
+        retrieved.append(entity + aggregate_parents(fused, by_id, top_k))
     return retrieved
 
-def generate_answer(query: str, retrieved_docs: List[Dict[str,Any]]):
+# Byte-identical on every call and sent first, so Ollama reuses the KV cache of this prefix across questions;
+# everything that varies (question, context) comes after it.
+SYSTEM_PROMPT = textwrap.dedent("""
+    You are a helpful assistant answering questions about events and people.
+    ONLY use the information provided in the CONTEXT blocks of the user message (do not hallucinate).
+    If the answer is not present in the context, say you don't have enough information.
+    Keep answers concise and list facts (do not invent details).
+
+    INSTRUCTIONS:
+    - Answer using only facts available in the CONTEXT.
+    - If multiple matching items exist, present a short bulleted list with identifying fields (e.g., Event Id, Subject, Date, Location).
+    - For people, show Name, Profession, and Id if available.
+""").strip()
+
+def context_header(i: int, r: Dict[str, Any]) -> str:
+    return f"--- CONTEXT {i} (table={r['meta'].get('table')}, row_id={r['meta'].get('row_id')}) ---\n"
+
+@stage("context")
+def build_prompt(query: str, retrieved_docs: List[Dict[str,Any]], stats: Dict[str, Any] = None) -> List[Dict[str, str]]:
+    """Chat messages: the fixed system prompt, then the question and the packed context.
+       Rows are trimmed to the fields the question needs, near-duplicates dropped (MMR) and the rest packed
+       into CONTEXT_TOKEN_BUDGET. The router's SQL block goes first, cut to its share of the budget with a
+       "(first N of M rows shown)" marker if it is too long. A linked-events list (entity questions) has its
+       own ENTITY_TOKEN_BUDGET on top, cut the same way. `stats` gets context_tokens/docs."""
+    entity = [r for r in retrieved_docs if r["meta"].get("table") == "EventPerson"]
+    if entity and ENTITY_TOKEN_BUDGET > 0:
+        entity = [{**r, "doc": cut_rows(r["doc"], ENTITY_TOKEN_BUDGET // len(entity))} for r in entity]
+    entity_tokens = sum(estimate_tokens(context_header(1, r) + r["doc"]) for r in entity)
+    retrieved_docs = [r for r in retrieved_docs if r["meta"].get("table") != "EventPerson"]
+    if CONTEXT_TOKEN_BUDGET > 0:
+        packed, packing = pack_context(retrieved_docs, query, CONTEXT_TOKEN_BUDGET, CONTEXT_MMR_LAMBDA,
+                                       CONTEXT_DEDUP_THRESHOLD, header=context_header,
+                                       pinned=lambda r: r["meta"].get("table") == "SQL")
+    else:
+        tokens = sum(estimate_tokens(context_header(i, r) + r["doc"]) for i, r in enumerate(retrieved_docs, start=1))
+        packed, packing = retrieved_docs, {"candidates": len(retrieved_docs), "packed": len(retrieved_docs),
+                                           "duplicates": 0, "tokens": tokens, "raw_tokens": tokens}
+    packed = entity + packed
+    packing.update(candidates=packing["candidates"] + len(entity), packed=len(packed),
+                   tokens=packing["tokens"] + entity_tokens)
+    metrics.BATCH_SIZE.observe(packing["packed"], stage="context")
+    if stats is not None:
+        stats.update(context_tokens=packing["tokens"], context_docs=packing["packed"])
+    log.debug("Packed context", extra=fields(**packing))
+    context_text = "\n\n".join(context_header(i, r) + r["doc"] for i, r in enumerate(packed, start=1))
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"QUESTION:\n{query}\n\nCONTEXT:\n{context_text}"}
+    ]
+
+def warm_llm():
+    """Load LLM_MODEL and evaluate the fixed system prompt once, so the first question already reuses it."""
+    try:
+        get_llm_client().chat(model=LLM_MODEL, messages=[{"role": "system", "content": SYSTEM_PROMPT}],
+                              options={"num_predict": 1}, keep_alive=LLM_KEEP_ALIVE)
+    except Exception as exc:
+        log.warning("LLM warm-up failed", extra=fields(model=LLM_MODEL, error=repr(exc)))
+
+def generate_answer_stream(query: str, retrieved_docs: List[Dict[str,Any]], stats: Dict[str, Any] = None) -> Iterator[str]:
+    """
+    Stream the answer token by token from Ollama.
+    If given, `stats` is filled with ttft_s (time to first token), tokens, generate_s and tokens_per_s.
+    """
+    ollama_client = get_llm_client()
+    stats = stats if stats is not None else {}
+    messages = build_prompt(query, retrieved_docs, stats)
+    t0 = time.perf_counter()
+    first = None
+    pieces = 0
+    eval_count = prompt_count = None
+
+    def chunks():
+        # Use 'chat' interface if model supports it. Otherwise use generate with the concatenated prompt,
+        # but only if chat failed before producing anything.
+        try:
+            for chunk in ollama_client.chat(model=LLM_MODEL, messages=messages, stream=True,
+                                             keep_alive=LLM_KEEP_ALIVE):
+                yield chunk, chunk["message"]["content"]
+        except Exception:
+            if first is not None:
+                raise
+            full_prompt = messages[0]["content"] + "\n\n" + messages[1]["content"]
+            for chunk in ollama_client.generate(model=LLM_MODEL, prompt=full_prompt, stream=True,
+                                                 keep_alive=LLM_KEEP_ALIVE):
+                yield chunk, chunk["response"]
+
+    for chunk, text in chunks():
+        if text:
+            if first is None:
+                first = time.perf_counter()
+            pieces += 1
+            yield text
+        if chunk.get("done"):
+            eval_count = chunk.get("eval_count")
+            prompt_count = chunk.get("prompt_eval_count")
+
+    end = time.perf_counter()
+    tokens = eval_count or pieces
+    decode_s = end - first if first is not None else 0.0
+    metrics.STAGE_SECONDS.observe(end - t0, stage="llm_generate")
+    if first is not None:
+        metrics.STAGE_SECONDS.observe(first - t0, stage="llm_first_token")
+    metrics.TOKENS.inc(tokens, kind="completion")
+    if prompt_count:
+        metrics.TOKENS.inc(prompt_count, kind="prompt")
+    stats.update({
+        "ttft_s": round(first - t0, 4) if first is not None else None,
+        "tokens": tokens,
+        "generate_s": round(end - t0, 4),
+        "tokens_per_s": round(tokens / decode_s, 2) if decode_s > 0 else None,
+        # prompt tokens Ollama actually evaluated; a reused KV-cache prefix is not counted
+        "prompt_tokens": prompt_count,
+    })
+
+def generate_answer(query: str, retrieved_docs: List[Dict[str,Any]], stats: Dict[str, Any] = None) -> str:
     """
     Build a prompt combining retrieved context + query and call Ollama LLM.
     Instruct model to answer only using provided context.
     """
-    ollama_client = Client(host=OLLAMA_HOST)
-
-    # Build context block — we include metadata to be explicit
-    context_blocks = []
-    for i, r in enumerate(retrieved_docs, start=1):
-        context_blocks.append(f"--- CONTEXT {i} (table={r['meta'].get('table')}, row_id={r['meta'].get('row_id')}) ---\n{r['doc']}")
-    context_text = "\n\n".join(context_blocks)
-
-    system_prompt = textwrap.dedent(f"""
-        You are a helpful assistant answering questions about events and people.
-        ONLY use the information provided in the CONTEXT blocks below (do not hallucinate).
-        If the answer is not present in the context, say you don't have enough information.
-        Keep answers concise and list facts (do not invent details).
-    """).strip()
-
-    user_prompt = textwrap.dedent(f"""
-        CONTEXT:
-        {context_text}
-
-        QUESTION:
-        {query}
-
-        INSTRUCTIONS:
-        - Answer using only facts available in the CONTEXT.
-        - If multiple matching items exist, present a short bulleted list with identifying fields (e.g., Event Id, Subject, Date, Location).
-        - For people, show Name, Profession, and Id if available.
-    """).strip()
-
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt}
-    ]
+    return "".join(generate_answer_stream(query, retrieved_docs, stats))
 
-    # Call Ollama chat/generate
-    # Use 'chat' interface if model supports it (gemma3/gpt-style). Otherwise use generate with prompt.
+def get_llm_slots() -> threading.BoundedSemaphore:
+    return _warm_handle("llm_slots", lambda: threading.BoundedSemaphore(LLM_CONCURRENCY))
+
+def rag_answer_stream(query: str, top_k: int = TOP_K, facts: Dict[str, Any] = None) -> Iterator[Dict[str, Any]]:
+    """Retrieve + generate for one question, yielding events as they happen:
+         {"event": "sources", "sources": [...]}
+         {"event": "token", "text": "..."}          (one per streamed token)
+         {"event": "done", "answer", "cached", "sources", "timings"}
+       Safe to call from many threads: at most LLM_CONCURRENCY generations run at once.
+       A near-identical earlier question over the same retrieved rows is answered from the answer cache.
+       `facts` (exact SQL rows from the router) goes into the prompt as the first context block."""
+    t0 = time.perf_counter()
+    # lexical-only retrieval never embeds the question (and so cannot use the semantic answer cache)
+    q_emb = embed_query(query) if RETRIEVAL_MODE != "lexical" else None
+    retrieved = retrieve_context(query, top_k, q_emb=q_emb)
+    if facts is not None:
+        retrieved = [facts] + retrieved
+    sources = [{**r["meta"], "distance": r["distance"]} for r in retrieved]
+    t1 = time.perf_counter()
+    yield {"event": "sources", "sources": sources}
+
+    cache = get_answer_cache() if q_emb is not None else None
+    answer = cache.get(q_emb, [r["meta"] for r in retrieved]) if cache else None
+    cached = answer is not None
+    if cache:
+        metrics.cache_lookups("answer", int(cached), int(not cached))
+    llm_stats = {}
+    t2 = time.perf_counter()
+    if cached:
+        yield {"event": "token", "text": answer}
+    else:
+        pieces = []
+        with get_llm_slots():
+            t2 = time.perf_counter()
+            for text in generate_answer_stream(query, retrieved, llm_stats):
+                pieces.append(text)
+                yield {"event": "token", "text": text}
+        answer = "".join(pieces)
+        if cache:
+            cache.put(q_emb, [r["meta"] for r in retrieved], answer)
+    t3 = time.perf_counter()
+    timings = {"retrieve_s": round(t1 - t0, 4), "llm_wait_s": round(t2 - t1, 4),
+               "generate_s": round(t3 - t2, 4), "total_s": round(t3 - t0, 4)}
+    metrics.STAGE_SECONDS.observe(t2 - t1, stage="llm_wait")
+    metrics.STAGE_SECONDS.observe(t3 - t0, stage="answer")
+    if llm_stats:
+        timings.update({"ttft_s": llm_stats["ttft_s"], "tokens": llm_stats["tokens"],
+                        "tokens_per_s": llm_stats["tokens_per_s"], "context_tokens": llm_stats["context_tokens"],
+                        "prompt_tokens": llm_stats["prompt_tokens"]})
+    yield {"event": "done", "question": query, "answer": answer, "cached": cached, "sources": sources, "timings": timings}
+
+# ---------- Query routing ----------
+def table_versions() -> Dict[str, Any]:
+    """Last write time per table, for the SQL result cache; empty (TTL only) without VIEW SERVER STATE."""
+    sql = TABLE_VERSIONS_SQL.get(SQL_DIALECT)
+    if not sql:
+        return {}
     try:
-        resp = ollama_client.chat(model=LLM_MODEL, messages=messages)
-        # response format may be { 'choices': [{'message': {'content': '...'}}]} or similar
-        if isinstance(resp, dict):
-            if "choices" in resp and resp["choices"]:
-                content = resp["choices"][0].get("message", {}).get("content") or resp["choices"][0].get("text")
-            else:
-                content = resp.get("text") or json.dumps(resp)
+        with get_sql_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql)
+            return {row[0]: str(row[1]) for row in cursor.fetchall() if row[0]}
+    except pyodbc.Error as exc:
+        log.debug("Table write versions unavailable", extra=fields(error=repr(exc)))
+        return {}
+
+@stage("sql_query")
+def run_structured(plan: Dict[str, Any]) -> tuple:
+    """(result, cached) for a router plan: {"columns", "rows"} from the result cache or a pooled connection."""
+    cache = get_sql_result_cache()
+    result = cache.get(plan["sql"], plan["params"])
+    metrics.cache_lookups("sql_result", int(result is not None), int(result is None))
+    if result is not None:
+        return result, True
+    with get_sql_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(plan["sql"], tuple(plan["params"]))
+        columns = [d[0] for d in cursor.description]
+        # attribute access works for pyodbc rows and the benchmark's SQLite rows alike
+        rows = [tuple(getattr(row, c) for c in columns) for row in cursor.fetchall()]
+    result = {"columns": columns, "rows": rows}
+    cache.put(plan["sql"], result, tables_in(plan["sql"], SCHEMA_TABLES), rows=len(rows), params=plan["params"])
+    return result, False
+
+def facts_block(plan: Dict[str, Any], answer: str) -> Dict[str, Any]:
+    """Context block carrying the SQL answer into the RAG prompt (content hash keys the answer cache). When the
+       router could not parse part of the question, the block says which words the rows are not filtered on."""
+    meta = {"table": "SQL", "row_id": plan["intent"], "content_hash": content_hash(answer)}
+    heading = "Exact result from the database:"
+    if plan.get("unmatched"):
+        heading = (f"Database rows matching the rest of the question, NOT filtered on "
+                   f"\"{' '.join(plan['unmatched'])}\" (use the other context to narrow them down):")
+    return {"doc": heading + "\n" + answer, "meta": meta, "distance": None, "score": None}
+
+def route_question(query: str) -> Dict[str, Any]:
+    """query_router.classify() plus the routed query: {"route", "reason", "plan", "answer", "cached", "rows",
+       "route_s", "sql_s"}. The route falls back to rag when the SQL fails."""
+    t0 = time.perf_counter()
+    with stage("route"):
+        decision = classify(query, SQL_DIALECT, ROUTE_MAX_ROWS) if ROUTER else {"route": "rag", "reason": "router off",
+                                                                                "plan": None}
+    routed = {**decision, "answer": None, "cached": False, "rows": 0}
+    plan = decision["plan"]
+    t1 = time.perf_counter()
+    if plan is not None:
+        try:
+            result, routed["cached"] = run_structured(plan)
+            routed["answer"] = format_result(plan, result)
+            routed["rows"] = min(len(result["rows"]), plan["max_rows"])
+        except Exception as exc:
+            log.warning("Routed SQL failed; answering with vector RAG", extra=fields(reason=decision["reason"],
+                                                                                    error=repr(exc)))
+            routed["route"] = "rag"
+    t2 = time.perf_counter()
+    routed.update(route_s=round(t1 - t0, 4), sql_s=round(t2 - t1, 4))
+    return routed
+
+def routed_facts(routed: Dict[str, Any]) -> Dict[str, Any]:
+    """The SQL context block for a "both" route, else None."""
+    return facts_block(routed["plan"], routed["answer"]) if routed["route"] == "both" else None
+
+def sql_answer(query: str, routed: Dict[str, Any]) -> Dict[str, Any]:
+    """The "done" event of a question answered by SQL alone."""
+    sources = [{"table": "SQL", "row_id": routed["plan"]["intent"], "rows": routed["rows"]}]
+    return {"event": "done", "question": query, "answer": routed["answer"], "cached": routed["cached"],
+            "sources": sources, "timings": {}}
+
+def finish_answer(event: Dict[str, Any], routed: Dict[str, Any], started: float):
+    """Add route, reason and routing timings to a "done" event and record the route's latency."""
+    total = time.perf_counter() - started
+    event.update(route=routed["route"], reason=routed["reason"])
+    event["timings"].update(route_s=routed["route_s"], sql_s=routed["sql_s"], total_s=round(total, 4))
+    metrics.STAGE_SECONDS.observe(total, stage=f"route_{routed['route']}")
+    log.debug("Answered", extra=fields(route=routed["route"], reason=routed["reason"], seconds=round(total, 4)))
+
+def answer_question_stream(query: str, top_k: int = TOP_K) -> Iterator[Dict[str, Any]]:
+    """The single entry point for questions. query_router.classify() picks a route:
+         sql   the routed query's rows, formatted; no embedding, retrieval or LLM call
+         both  the rows become the first context block of a vector RAG answer
+         rag   rag_answer_stream() as is
+       Yields the same events as rag_answer_stream(); "done" also carries "route" and "reason", its timings
+       "route_s" and "sql_s". Each route's end-to-end latency is recorded as stage route_<route>."""
+    t0 = time.perf_counter()
+    routed = route_question(query)
+    if routed["route"] == "sql":
+        done = sql_answer(query, routed)
+        yield {"event": "sources", "sources": done["sources"]}
+        yield {"event": "token", "text": done["answer"]}
+        events = [done]
+    else:
+        events = rag_answer_stream(query, top_k, facts=routed_facts(routed))
+    for event in events:
+        if event["event"] == "done":
+            finish_answer(event, routed, t0)
+        yield event
+
+def answer_question(query: str, top_k: int = TOP_K) -> Dict[str, Any]:
+    """Non-streaming answer_question_stream(): returns answer, cached flag, route, sources and timings."""
+    for event in answer_question_stream(query, top_k):
+        if event["event"] == "done":
+            del event["event"]
+            return event
+
+def print_streamed_answer(query: str, top_k: int = TOP_K) -> Dict[str, Any]:
+    """Print tokens as they arrive, then a one-line latency summary."""
+    for event in answer_question_stream(query, top_k):
+        if event["event"] == "sources":
+            print(f"[+] Retrieved {len(event['sources'])} documents")
+            print("\n--- Answer ---\n")
+        elif event["event"] == "token":
+            print(event["text"], end="", flush=True)
         else:
-            content = str(resp)
-    except Exception:
-        # fallback to generate with concatenated prompt
-        full_prompt = system_prompt + "\n\n" + user_prompt
-        gen = ollama_client.generate(model=LLM_MODEL, prompt=full_prompt)
-        # extract reasonably
-        if isinstance(gen, dict) and "text" in gen:
-            content = gen["text"]
+            t = event["timings"]
+            print()
+            if event["route"] == "sql":
+                print(f"\n[+] answered by SQL ({event['reason']}{', result cache' if event['cached'] else ''}), "
+                      f"total {t['total_s']}s")
+            elif event["cached"]:
+                print(f"\n[+] answer cache hit, total {t['total_s']}s")
+            else:
+                print(f"\n[+] time to first token {t['ttft_s']}s, {t['tokens']} tokens at {t['tokens_per_s']} tokens/s, "
+                      f"total {t['total_s']}s")
+            return event
+
+# ---------- Batch questions ----------
+def load_batch(path: str) -> List[Dict[str, Any]]:
+    """Requests from a JSONL file: one {"question": ..., <any other keys>} object (or a bare string) per line.
+       Extra keys such as an id are copied to the answer. A malformed line fails before anything is asked."""
+    requests = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                request = {"question": request} if isinstance(request, str) else dict(request)
+                request["question"] = str(request["question"]).strip()
+            except (ValueError, KeyError, TypeError) as exc:
+                raise ValueError(f"{path}:{line_no}: expected a JSON object with a \"question\" ({exc})") from None
+            requests.append(request)
+    return requests
+
+def _answer_retrieved(request: Dict[str, Any], routed: Dict[str, Any], retrieved: List[Dict[str, Any]],
+                      q_emb: List[float], started: float, retrieve_s: float) -> Dict[str, Any]:
+    """Answer-cache lookup and generation for one batch question whose rows are already retrieved."""
+    query = request["question"]
+    ready = time.perf_counter()
+    cache = get_answer_cache() if q_emb is not None else None
+    answer = cache.get(q_emb, [r["meta"] for r in retrieved]) if cache else None
+    cached = answer is not None
+    if cache:
+        metrics.cache_lookups("answer", int(cached), int(not cached))
+    llm_stats = {}
+    t1 = time.perf_counter()
+    if not cached:
+        with get_llm_slots():
+            t1 = time.perf_counter()
+            answer = generate_answer(query, retrieved, llm_stats)
+        if cache:
+            cache.put(q_emb, [r["meta"] for r in retrieved], answer)
+    t2 = time.perf_counter()
+    timings = {"retrieve_s": round(retrieve_s, 4), "llm_wait_s": round(t1 - ready, 4), "generate_s": round(t2 - t1, 4)}
+    timings.update({k: llm_stats.get(k) for k in ("ttft_s", "tokens", "tokens_per_s", "context_tokens",
+                                                   "prompt_tokens")} if llm_stats else {})
+    event = {"event": "done", "question": query, "answer": answer, "cached": cached,
+             "sources": [{**r["meta"], "distance": r["distance"]} for r in retrieved], "timings": timings}
+    finish_answer(event, routed, started)
+    return event
+
+def _batch_result(request: Dict[str, Any], event: Dict[str, Any]) -> Dict[str, Any]:
+    return {**request, **{k: v for k, v in event.items() if k not in ("event", "question")}}
+
+def _batch_error(request: Dict[str, Any], exc: Exception) -> Dict[str, Any]:
+    log.warning("Batch question failed", extra=fields(question=request["question"], error=repr(exc)))
+    return {**request, "error": str(exc)}
+
+def _submit_slice(pool: ThreadPoolExecutor, requests: List[Dict[str, Any]], top_k: int) -> List[Future]:
+    """Route a slice of requests, embed and search its RAG questions together, and queue their generation.
+       Returns one future per request, in order."""
+    t0 = time.perf_counter()
+    futures: List[Future] = []
+    rag_items = []
+    for request in requests:
+        future = Future()
+        futures.append(future)
+        try:
+            routed = route_question(request["question"])
+        except Exception as exc:
+            future.set_result(_batch_error(request, exc))
+            continue
+        if routed["route"] == "sql":
+            event = sql_answer(request["question"], routed)
+            finish_answer(event, routed, t0)
+            future.set_result(_batch_result(request, event))
         else:
-            content = str(gen)
+            rag_items.append((future, request, routed))
+    if not rag_items:
+        return futures
+
+    queries = [request["question"] for _, request, _ in rag_items]
+    try:
+        with stage("retrieve_batch", batch=len(queries)):
+            # lexical-only retrieval never embeds the questions (and so cannot use the answer cache)
+            q_embs = embed_queries(queries) if RETRIEVAL_MODE != "lexical" else [None] * len(queries)
+            contexts = retrieve_contexts(queries, top_k, q_embs if RETRIEVAL_MODE != "lexical" else None)
+    except Exception as exc:
+        for future, request, _ in rag_items:
+            future.set_result(_batch_error(request, exc))
+        return futures
+    retrieve_s = time.perf_counter() - t0
+
+    def generate(future: Future, request, routed, retrieved, q_emb):
+        try:
+            facts = routed_facts(routed)
+            retrieved = [facts] + retrieved if facts is not None else retrieved
+            future.set_result(_batch_result(request, _answer_retrieved(request, routed, retrieved, q_emb, t0,
+                                                                       retrieve_s)))
+        except Exception as exc:
+            future.set_result(_batch_error(request, exc))
+
+    for (future, request, routed), retrieved, q_emb in zip(rag_items, contexts, q_embs):
+        pool.submit(generate, future, request, routed, retrieved, q_emb)
+    return futures
 
-    return content
+def answer_batch(requests: Iterable[Dict[str, Any]], top_k: int = TOP_K, concurrency: int = LLM_CONCURRENCY,
+                 batch_size: int = BATCH_QUESTIONS) -> Iterator[Dict[str, Any]]:
+    """Answer many {"question": ...} requests; yields one result per request, in input order.
+       Requests are taken `batch_size` at a time: SQL-routed questions are answered at once, the others are
+       embedded in multi-input calls and searched with multi-query vector calls (retrieve_contexts), then
+       generated on `concurrency` threads. The next slice is retrieved while the previous one generates.
+       A result is the request plus answer, cached, route, reason, sources and timings, or plus "error"."""
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+        for requests_slice in batched(requests, batch_size):
+            pending.extend(_submit_slice(pool, requests_slice, top_k))
+            # retrieval runs at most two slices ahead of generation
+            while len(pending) > 2 * batch_size or (pending and pending[0].done()):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def run_batch(path: str, out_path: str, concurrency: int = LLM_CONCURRENCY, top_k: int = TOP_K):
+    """Answer every question in a JSONL file and write the results as JSONL, in input order."""
+    requests = load_batch(path)
+    print(f"[*] Answering {len(requests)} questions from {path} with {concurrency} concurrent generations")
+    get_query_collection()
+    warm_llm()
+    t0 = time.perf_counter()
+    routes: Dict[str, int] = {}
+    failed = 0
+    with open(out_path, "w", encoding="utf-8") as out:
+        for done, result in enumerate(answer_batch(requests, top_k, concurrency), start=1):
+            out.write(json.dumps(result, default=str) + "\n")
+            if "error" in result:
+                failed += 1
+            else:
+                routes[result["route"]] = routes.get(result["route"], 0) + 1
+            if done % 100 == 0:
+                log.info("Batch progress", extra=fields(done=done, total=len(requests),
+                                                        seconds=round(time.perf_counter() - t0, 1)))
+    elapsed = time.perf_counter() - t0
+    print(f"[+] Wrote {len(requests)} answers to {out_path} in {elapsed:.1f}s "
+          f"({len(requests) / elapsed if elapsed > 0 else 0:.2f} questions/s); routes {routes}, {failed} failed")
 
 # ---------- Example queries ----------
 EXAMPLE_QUERIES = [
@@ -302,13 +1569,41 @@ EXAMPLE_QUERIES = [
 
 def run_examples():
     print("[*] Retrieving answers for example queries:")
-    for q in EXAMPLE_QUERIES:
+    for result in answer_batch([{"question": q} for q in EXAMPLE_QUERIES]):
         print("\n-----")
-        print("Q:", q)
-        retrieved = retrieve_context(q)
-        print(f"[+] Retrieved {len(retrieved)} documents (top {TOP_K})")
-        ans = generate_answer(q, retrieved)
-        print("\nAnswer:\n", ans)
+        print("Q:", result["question"])
+        if "error" in result:
+            print("[!] Failed:", result["error"])
+            continue
+        print(f"[+] Route {result['route']}: {len(result['sources'])} sources, {result['timings']['total_s']}s")
+        print("\nAnswer:\n", result["answer"])
+
+def run_repl(stream: bool = False):
+    """Interactive loop that keeps the Ollama/Chroma clients warm between questions."""
+    print("[*] RAG chatbot REPL — type a question, or 'exit' to quit")
+    get_query_collection()
+    warm_llm()
+    while True:
+        try:
+            q = input("\nQ> ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            return
+        if not q:
+            continue
+        if q.lower() in ("exit", "quit"):
+            return
+        if stream:
+            print_streamed_answer(q)
+            continue
+        result = answer_question(q)
+        t = result["timings"]
+        if result["route"] == "sql":
+            print(f"[+] Answered by SQL ({result['reason']}) in {t['total_s']}s{' (result cache)' if result['cached'] else ''}")
+        else:
+            print(f"[+] Route {result['route']}: retrieved {len(result['sources'])} documents in {t['retrieve_s']}s, "
+                  f"answered in {t['generate_s']}s{' (answer cache)' if result['cached'] else ''}")
+        print("\nAnswer:\n", result["answer"])
 
 # ---------- CLI ----------
 if __name__ == "__main__":
@@ -316,19 +1611,45 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="RAG Chatbot over SQL Server using Ollama & ChromaDB")
     parser.add_argument("--index", action="store_true", help="Index SQL Server rows into vector DB (run first)")
+    parser.add_argument("--full", action="store_true", help="With --index: drop the collection and rebuild it instead of a delta update")
+    parser.add_argument("--workers", type=int, default=INDEX_WORKERS, help="With --index: fetch and embed partitions in this many processes, resumable after a crash")
     parser.add_argument("--ask", type=str, help="Ask a natural language question")
     parser.add_argument("--examples", action="store_true", help="Run built-in example queries")
+    parser.add_argument("--repl", action="store_true", help="Answer questions interactively with warm clients")
+    parser.add_argument("--batch", help="Answer every question in this JSONL file (one {\"question\": ...} per line)")
+    parser.add_argument("--batch-out", default="answers.jsonl", help="With --batch: write the answers here as JSONL, in input order")
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_CONCURRENCY, help="With --batch: max concurrent LLM generations")
+    parser.add_argument("--stream", action="store_true", help="With --ask/--repl: print the answer token by token as it is generated")
+    parser.add_argument("--profile", action="store_true", help="Print a per-stage timing breakdown when done")
+    parser.add_argument("--metrics-out", help="Write Prometheus-format metrics to this file when done (textfile collector)")
     args = parser.parse_args()
+    metrics.configure_logging(LOG_LEVEL, LOG_FORMAT)
 
-    if args.index:
-        load_and_index_all()
+    if args.index and args.workers > 0:
+        load_and_index_parallel(args.workers, full=args.full)
+    elif args.index:
+        load_and_index_all(full=args.full)
+    elif args.ask and args.stream:
+        print_streamed_answer(args.ask)
     elif args.ask:
-        retrieved = retrieve_context(args.ask)
-        print(f"[+] Retrieved {len(retrieved)} documents")
-        ans = generate_answer(args.ask, retrieved)
+        result = answer_question(args.ask)
+        print(f"[+] Route {result['route']} ({result['reason']}): {len(result['sources'])} sources, "
+              f"{result['timings']['total_s']}s")
         print("\n--- Answer ---\n")
-        print(ans)
+        print(result["answer"])
+    elif args.batch:
+        LLM_CONCURRENCY = args.llm_concurrency
+        run_batch(args.batch, args.batch_out, args.llm_concurrency)
     elif args.examples:
         run_examples()
+    elif args.repl:
+        run_repl(stream=args.stream)
     else:
         parser.print_help()
+
+    if args.profile:
+        print("\n--- Profile ---\n")
+        print(metrics.profile_report())
+    if args.metrics_out:
+        with open(args.metrics_out, "w") as f:
+            f.write(metrics.render_prometheus())
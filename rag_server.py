@@ -0,0 +1,267 @@
+"""
+Long-lived HTTP service for the RAG chatbot.
+
+Keeps the Ollama/Chroma clients and the collection warm for the lifetime of the process, so each
+question only pays for embedding, vector search and generation. Built on asyncio streams (no web
+framework dependency); blocking work runs on a thread pool and concurrent LLM calls are capped at
+LLM_CONCURRENCY (or --llm-concurrency).
+
+Endpoints:
+  POST /ask      {"question": "...", "top_k": 3}  -> {"answer", "cached", "route", "reason", "sources", "timings"}
+                 (top_k from 1 to MAX_TOP_K, otherwise 400)
+  POST /ask      {"question": "...", "stream": true}  -> text/event-stream of sources, token and done events
+  GET  /health   -> {"status": "ok", "documents": <collection size>, "embedding_cache": ..., "answer_cache": ...,
+                     "sql_result_cache": ...}
+  GET  /metrics  -> per-stage latency histograms, batch sizes, token and cache counters (Prometheus text format)
+
+Questions are routed (rag.answer_question_stream): counts, date/place ranges and attendance lists are
+answered by SQL without an LLM call, everything else by vector RAG.
+
+Usage:
+    python rag_server.py --host 127.0.0.1 --port 8000 --llm-concurrency 2
+    curl -X POST localhost:8000/ask -d '{"question": "What events involved John Smith in 2023?"}'
+    curl -N -X POST localhost:8000/ask -d '{"question": "What events involved John Smith in 2023?", "stream": true}'
+"""
+
+import json
+import asyncio
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Tuple
+
+import metrics
+import rag_chatbot_sqlserver_ollama as rag
+from metrics import fields
+
+log = logging.getLogger("rag.server")
+
+MAX_BODY_BYTES = 1 << 20
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    """A request that cannot be read; answered with `status` and the connection is closed."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class RagService:
+    """Runs questions on a thread pool; rag.answer_question caps concurrent LLM calls at LLM_CONCURRENCY."""
+
+    def __init__(self, workers: int = 16):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag")
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def warm_up(self) -> int:
+        rag.get_embed_client()
+        rag.get_llm_client()
+        await self.run(rag.warm_llm)
+        collection = await self.run(rag.get_query_collection)
+        return await self.run(collection.count)
+
+    async def ask(self, question: str, top_k: int = rag.TOP_K) -> Dict[str, Any]:
+        return await self.run(rag.answer_question, question, top_k)
+
+    async def ask_stream(self, question: str, top_k: int = rag.TOP_K) -> AsyncIterator[Dict[str, Any]]:
+        """Bridge rag.answer_question_stream (a blocking generator) onto the event loop.
+           Closing this iterator early (the client went away) stops the producer at its next event,
+           which closes the generation and frees its LLM_CONCURRENCY slot."""
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        done = object()
+        cancelled = threading.Event()
+
+        def produce():
+            stream = rag.answer_question_stream(question, top_k)
+            try:
+                for event in stream:
+                    if cancelled.is_set():
+                        log.info("Client gone, stopping answer", extra=fields(question=question))
+                        break
+                    loop.call_soon_threadsafe(events.put_nowait, event)
+            except Exception as exc:
+                loop.call_soon_threadsafe(events.put_nowait, {"event": "error", "error": str(exc)})
+            finally:
+                stream.close()
+                loop.call_soon_threadsafe(events.put_nowait, done)
+
+        self.executor.submit(produce)
+        try:
+            while True:
+                event = await events.get()
+                if event is done:
+                    return
+                yield event
+        finally:
+            cancelled.set()
+
+
+async def read_request(reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str], bytes]:
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    if not request_line:
+        raise ConnectionError("client closed connection")
+    parts = request_line.split(" ", 2)
+    if len(parts) != 3:
+        raise RequestError(400, "malformed request line")
+    method, path, _ = parts
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1")
+        if line in ("\r\n", "\n", ""):
+            break
+        key, _, value = line.partition(":")
+        headers[key.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise RequestError(400, "invalid Content-Length") from None
+    if length < 0:
+        raise RequestError(400, "invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise RequestError(413, "payload too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+def write_json(writer: asyncio.StreamWriter, status: int, body: Any, keep_alive: bool):
+    write_body(writer, status, json.dumps(body).encode("utf-8"), "application/json", keep_alive)
+
+
+def write_body(writer: asyncio.StreamWriter, status: int, data: bytes, content_type: str, keep_alive: bool):
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode("latin-1") + data)
+
+
+async def write_event_stream(service: RagService, writer: asyncio.StreamWriter, question: str, top_k: int):
+    """Server-sent events: one `data:` line per sources/token/done event, then close the connection.
+       If the client disconnects, the stream is closed so the answer stops generating."""
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                 b"Connection: close\r\n\r\n")
+    events = service.ask_stream(question, top_k)
+    try:
+        async for event in events:
+            writer.write(f"event: {event['event']}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        await events.aclose()
+
+
+def parse_ask(body: bytes) -> Dict[str, Any]:
+    request = json.loads(body or b"{}")
+    return {"question": str(request["question"]).strip(),
+            "top_k": int(request.get("top_k", rag.TOP_K)),
+            "stream": bool(request.get("stream", False))}
+
+
+async def handle_connection(service: RagService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            try:
+                method, path, headers, body = await read_request(reader)
+            except RequestError as exc:
+                write_json(writer, exc.status, {"error": str(exc)}, False)
+                await writer.drain()
+                break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                break
+            keep_alive = headers.get("connection", "").lower() != "close"
+            if path.split("?", 1)[0] == "/metrics":
+                write_body(writer, 200, metrics.render_prometheus().encode("utf-8"),
+                           "text/plain; version=0.0.4", keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+                continue
+            if path.split("?", 1)[0] == "/ask" and method == "POST" and _wants_stream(body, headers):
+                request = parse_ask(body)
+                await write_event_stream(service, writer, request["question"], request["top_k"])
+                break
+            status, payload = await dispatch(service, method, path.split("?", 1)[0], body)
+            write_json(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+def _wants_stream(body: bytes, headers: Dict[str, str]) -> bool:
+    try:
+        request = parse_ask(body)
+    except (ValueError, KeyError, TypeError):
+        return False  # let dispatch() report the bad request
+    if not request["question"] or not 1 <= request["top_k"] <= rag.MAX_TOP_K:
+        return False
+    return request["stream"] or "text/event-stream" in headers.get("accept", "")
+
+
+async def health(service: RagService) -> Dict[str, Any]:
+    count = await service.run(lambda: rag.get_query_collection().count())
+    embedding_cache, answer_cache = rag.get_embedding_cache(), rag.get_answer_cache()
+    return {"status": "ok", "documents": count,
+            "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+            "answer_cache": answer_cache.stats() if answer_cache else None,
+            "sql_result_cache": rag.get_sql_result_cache().stats()}
+
+
+async def dispatch(service: RagService, method: str, path: str, body: bytes) -> Tuple[int, Any]:
+    if path == "/health":
+        try:
+            return 200, await health(service)
+        except Exception as exc:
+            log.exception("Health check failed")
+            return 500, {"status": "error", "error": str(exc)}
+    if path != "/ask":
+        return 404, {"error": f"unknown path {path}"}
+    if method != "POST":
+        return 405, {"error": "use POST"}
+    try:
+        request = parse_ask(body)
+        question, top_k = request["question"], request["top_k"]
+    except (ValueError, KeyError, TypeError):
+        return 400, {"error": 'expected JSON body {"question": "...", "top_k": 3}'}
+    if not question:
+        return 400, {"error": "question is empty"}
+    if not 1 <= top_k <= rag.MAX_TOP_K:
+        return 400, {"error": f"top_k must be between 1 and {rag.MAX_TOP_K}"}
+    try:
+        return 200, await service.ask(question, top_k)
+    except Exception as exc:
+        log.exception("Failed to answer", extra=fields(question=question))
+        return 500, {"error": str(exc)}
+
+
+async def serve(host: str, port: int, llm_concurrency: int):
+    rag.LLM_CONCURRENCY = llm_concurrency
+    service = RagService(workers=max(16, 4 * llm_concurrency))
+    count = await service.warm_up()
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port)
+    log.info("Serving", extra=fields(documents=count, url=f"http://{host}:{port}", llm_concurrency=llm_concurrency))
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-lived RAG chatbot HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--llm-concurrency", type=int, default=rag.LLM_CONCURRENCY,
+                        help="Max concurrent LLM generations sent to Ollama")
+    args = parser.parse_args()
+    metrics.configure_logging(rag.LOG_LEVEL, rag.LOG_FORMAT)
+    try:
+        asyncio.run(serve(args.host, args.port, args.llm_concurrency))
+    except KeyboardInterrupt:
+        pass
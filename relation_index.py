@@ -0,0 +1,193 @@
+"""
+Person <-> Event relationship index.
+
+A SQLite copy of EventPerson, with each person's name and each event's date, kept next to the other side
+indexes. sync() streams the plain Person (Id, Name) and EventPerson tables and writes only what changed
+since the last run, so listing an event's people no longer needs a STRING_AGG join over all three tables.
+
+Lookups go both ways: a person (by name or Id) to their event Ids with dates, optionally inside a date
+range, and an event to its people. find_persons() spots the known people named in a question.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_SYNC_BATCH = 5000
+_SQL_BATCH = 500
+_CAPITALISED_RUN_RE = re.compile(r"[A-Z][\w'.-]*(?:\s+[A-Z][\w'.-]*)*")
+_PERSON_ID_RE = re.compile(r"\bperson\s*(?:id\s*)?#?\s*(\d+)\b", re.I)
+
+
+def name_key(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+def _batches(items: Iterable, size: int) -> Iterable[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class RelationIndex:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS person (id INTEGER PRIMARY KEY, name TEXT, name_key TEXT);"
+            "CREATE INDEX IF NOT EXISTS person_name ON person(name_key);"
+            "CREATE TABLE IF NOT EXISTS link (event_id INTEGER NOT NULL, person_id INTEGER NOT NULL,"
+            " PRIMARY KEY (event_id, person_id)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS link_person ON link(person_id, event_id);"
+            "CREATE TABLE IF NOT EXISTS event (id INTEGER PRIMARY KEY, date_num INTEGER);"
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);"
+            "CREATE TEMP TABLE IF NOT EXISTS new_person (id INTEGER PRIMARY KEY, name TEXT, name_key TEXT);"
+            "CREATE TEMP TABLE IF NOT EXISTS new_link (event_id INTEGER NOT NULL, person_id INTEGER NOT NULL,"
+            " PRIMARY KEY (event_id, person_id)) WITHOUT ROWID;"
+        )
+        self._conn.commit()
+
+    # ----- updates -----
+    def sync(self, persons: Iterable[Tuple[int, Optional[str]]], links: Iterable[Tuple[int, int]]) -> Dict[str, int]:
+        """Make the stored people and links equal to `persons` (Id, Name) and `links` (EventId, PersonId),
+           writing only the differences. Both are streamed. Returns the number of changed rows of each kind."""
+        with self._lock:
+            self._conn.execute("DELETE FROM new_person")
+            self._conn.execute("DELETE FROM new_link")
+        # staged in batches so lookups from other threads are not blocked for the whole read
+        for batch in _batches(persons, _SYNC_BATCH):
+            with self._lock:
+                self._conn.executemany("INSERT OR REPLACE INTO new_person VALUES (?, ?, ?)",
+                                       [(int(pid), name, name_key(name) if name else None) for pid, name in batch])
+        for batch in _batches(links, _SYNC_BATCH):
+            with self._lock:
+                self._conn.executemany("INSERT OR IGNORE INTO new_link VALUES (?, ?)",
+                                       [(int(eid), int(pid)) for eid, pid in batch])
+        with self._lock:
+            changes = {
+                "persons_removed": self._conn.execute(
+                    "DELETE FROM person WHERE id NOT IN (SELECT id FROM new_person)").rowcount,
+                "persons_changed": self._conn.execute(
+                    "INSERT OR REPLACE INTO person SELECT n.id, n.name, n.name_key FROM new_person n WHERE NOT EXISTS"
+                    " (SELECT 1 FROM person p WHERE p.id = n.id AND p.name IS n.name)").rowcount,
+                "links_removed": self._conn.execute(
+                    "DELETE FROM link WHERE NOT EXISTS (SELECT 1 FROM new_link n"
+                    " WHERE n.event_id = link.event_id AND n.person_id = link.person_id)").rowcount,
+                "links_added": self._conn.execute(
+                    "INSERT INTO link SELECT n.event_id, n.person_id FROM new_link n WHERE NOT EXISTS"
+                    " (SELECT 1 FROM link l WHERE l.event_id = n.event_id AND l.person_id = n.person_id)").rowcount,
+            }
+            self._conn.execute("DELETE FROM new_person")
+            self._conn.execute("DELETE FROM new_link")
+            self._conn.commit()
+        return changes
+
+    def upsert_events(self, events: Iterable[Tuple[int, Optional[int]]]):
+        """events: (event id, date as YYYYMMDD or None)."""
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO event VALUES (?, ?)",
+                                   [(int(eid), date) for eid, date in events])
+            self._conn.commit()
+
+    def remove_events(self, event_ids: Iterable[int]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM event WHERE id = ?", [(int(eid),) for eid in event_ids])
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.executescript("DELETE FROM person; DELETE FROM link; DELETE FROM event; DELETE FROM state;")
+            self._conn.commit()
+
+    def count(self) -> int:
+        """Number of events with a known date (0 until the indexer has filled the index)."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM event").fetchone()[0]
+
+    def filled_version(self) -> Optional[str]:
+        """Version marker set by mark_filled() once the index holds every indexed row; None until then."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM state WHERE key = 'filled'").fetchone()
+        return row[0] if row else None
+
+    def mark_filled(self, version: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO state VALUES ('filled', ?)", (version,))
+            self._conn.commit()
+
+    # ----- lookups -----
+    def _in_batches(self, sql: str, ids: List[int], tail: str = "", params: tuple = ()) -> List[tuple]:
+        rows = []
+        with self._lock:
+            for i in range(0, len(ids), _SQL_BATCH):
+                chunk = ids[i:i + _SQL_BATCH]
+                marks = ",".join("?" * len(chunk))
+                rows += self._conn.execute(sql.format(marks=marks) + tail, (*chunk, *params)).fetchall()
+        return rows
+
+    def persons_involved(self, event_ids: Iterable[int]) -> Dict[int, str]:
+        """{event id: "Name, Name, ..."} sorted by name, as STRING_AGG ... WITHIN GROUP (ORDER BY Name) lists
+           them; events without people are left out."""
+        rows = self._in_batches("SELECT l.event_id, p.name FROM link l JOIN person p ON p.id = l.person_id"
+                                " WHERE p.name IS NOT NULL AND l.event_id IN ({marks})",
+                                [int(e) for e in event_ids], " ORDER BY l.event_id, p.name COLLATE NOCASE, p.name")
+        names: Dict[int, List[str]] = {}
+        for event_id, name in rows:
+            names.setdefault(event_id, []).append(name)
+        return {event_id: ", ".join(found) for event_id, found in names.items()}
+
+    def persons_for_event(self, event_id: int) -> List[Tuple[int, str]]:
+        """(person id, name) of everyone linked to the event."""
+        with self._lock:
+            return self._conn.execute("SELECT p.id, p.name FROM link l JOIN person p ON p.id = l.person_id"
+                                      " WHERE l.event_id = ? ORDER BY p.name", (int(event_id),)).fetchall()
+
+    def events_for_persons(self, person_ids: Iterable[int], date_from: Optional[int] = None,
+                           date_to: Optional[int] = None, limit: Optional[int] = None) -> List[Tuple[int, Optional[int]]]:
+        """(event id, YYYYMMDD date) of the events linked to any of the people, oldest first. With a date range,
+           events whose date is unknown are left out."""
+        tail, params = "", ()
+        if date_from is not None:
+            tail, params = " AND e.date_num BETWEEN ? AND ?", (date_from, date_to if date_to is not None else 99991231)
+        rows = self._in_batches("SELECT DISTINCT l.event_id, e.date_num FROM link l LEFT JOIN event e"
+                                " ON e.id = l.event_id WHERE l.person_id IN ({marks})",
+                                [int(p) for p in person_ids], tail, params)
+        rows.sort(key=lambda row: (row[1] is None, row[1] or 0, row[0]))
+        return rows[:limit] if limit else rows
+
+    def persons_named(self, names: Iterable[str]) -> List[Tuple[int, str]]:
+        """(person id, name) of everyone whose name matches one of `names` (case and spacing ignored)."""
+        keys = sorted({name_key(n) for n in names if n.strip()})
+        rows = []
+        with self._lock:
+            for i in range(0, len(keys), _SQL_BATCH):
+                chunk = keys[i:i + _SQL_BATCH]
+                rows += self._conn.execute(f"SELECT id, name FROM person WHERE name_key IN ({','.join('?' * len(chunk))})"
+                                           " ORDER BY id", chunk).fetchall()
+        return rows
+
+    def find_persons(self, text: str) -> List[Tuple[int, str]]:
+        """Known people mentioned in `text`: "person 42" / "person id 42", or a name of two or more capitalised
+           words, also inside a longer capitalised run ("Did John Smith ...")."""
+        candidates = set()
+        for run in _CAPITALISED_RUN_RE.findall(text):
+            words = [w.strip(".") for w in run.split()]
+            for size in range(2, len(words) + 1):
+                for start in range(len(words) - size + 1):
+                    candidates.add(" ".join(words[start:start + size]))
+        found = self.persons_named(candidates) if candidates else []
+        ids = [int(m) for m in _PERSON_ID_RE.findall(text)]
+        if ids:
+            with self._lock:
+                found += self._conn.execute(f"SELECT id, name FROM person WHERE id IN ({','.join('?' * len(ids))})",
+                                            ids).fetchall()
+        seen = set()
+        return [(pid, name) for pid, name in found if not (pid in seen or seen.add(pid))]
@@ -0,0 +1,180 @@
+"""
+Schema context for the NL-to-SQL prompt: cached table descriptions and retrieval of the relevant tables.
+
+SQLDatabase.get_table_info() reflects the schema and runs a sample-row query per table on every call, and
+every table ends up in the prompt. SchemaContext reads each table's description once and keeps it, in
+memory and in a JSON file, until the schema fingerprint changes. The fingerprint is one cheap query
+against the live catalog (INFORMATION_SCHEMA.COLUMNS plus sys.objects modify dates on SQL Server,
+PRAGMA schema_version on SQLite), run at most every `check_interval_s` seconds; it never looks at the
+table list SQLDatabase reflected when it was built.
+
+SQLDatabase reflects its tables and MetaData once, so after a change the descriptions are re-read from a
+new one, made by `reload` (e.g. lambda: SQLDatabase.from_uri(uri)). Use `SchemaContext.db` rather than
+the original object afterwards.
+
+With an `embed` function, one description per table and one per column are embedded when the schema is
+read, and each question is matched against them. Only the `top_tables` best tables, plus the tables
+their foreign keys reference, go into {table_info}.
+"""
+
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+FINGERPRINT_SQL = {
+    "mssql": "SELECT COUNT(*), CHECKSUM_AGG(CHECKSUM(TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_TYPE,"
+             " CHARACTER_MAXIMUM_LENGTH, IS_NULLABLE)),"
+             " (SELECT MAX(modify_date) FROM sys.objects WHERE type IN ('U', 'V'))"
+             " FROM INFORMATION_SCHEMA.COLUMNS",
+    "sqlite": "PRAGMA schema_version",
+}
+# other dialects (PostgreSQL, MySQL, ...) list their columns
+DEFAULT_FINGERPRINT_SQL = ("SELECT table_schema, table_name, column_name, data_type FROM information_schema.columns"
+                           " ORDER BY 1, 2, 3")
+
+_COLUMN = re.compile(r'^\s*[\["`]?(\w+)[\]"`]?\s+([A-Za-z]\w*(?:\s*\([^)]*\))?)', re.M)
+_REFERENCES = re.compile(r'REFERENCES\s+(?:\[?\w+\]?\.)?[\["`]?(\w+)[\]"`]?', re.I)
+_NOT_COLUMNS = {"CONSTRAINT", "PRIMARY", "FOREIGN", "UNIQUE", "CHECK", "CREATE", "INDEX", "KEY", "ON"}
+
+
+def table_columns(table_info: str) -> List[tuple]:
+    """(column, type) pairs from the CREATE TABLE part of a get_table_info() description."""
+    create = table_info.split("/*", 1)[0]
+    body = create[create.find("(") + 1:create.rfind(")")] if "(" in create else ""
+    return [(name, kind) for name, kind in _COLUMN.findall(body) if name.upper() not in _NOT_COLUMNS]
+
+
+def referenced_tables(table_info: str) -> List[str]:
+    return _REFERENCES.findall(table_info.split("/*", 1)[0])
+
+
+def _split_name(name: str) -> str:
+    # "InvoiceLine" / "invoice_line" -> "Invoice Line", so names embed like words
+    return re.sub(r"(?<=[a-z])(?=[A-Z])|_", " ", name)
+
+
+def schema_documents(tables: Dict[str, str]) -> List[tuple]:
+    """(table, text) pairs to embed: one per table and one per column."""
+    docs = []
+    for table, info in tables.items():
+        columns = table_columns(info)
+        docs.append((table, f"Table {_split_name(table)} with columns "
+                            + ", ".join(_split_name(name) for name, _ in columns)))
+        docs.extend((table, f"{_split_name(table)} {_split_name(name)} ({kind})") for name, kind in columns)
+    return docs
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SchemaContext:
+    def __init__(self, db, embed: Optional[Callable[[List[str]], List[List[float]]]] = None, model: str = "",
+                 path: Optional[str] = None, top_tables: int = 4, check_interval_s: float = 300.0,
+                 embed_batch: int = 64, reload: Optional[Callable[[], Any]] = None):
+        self.db = db
+        self.reload = reload
+        self.embed = embed
+        self.model = model
+        self.path = path
+        self.top_tables = top_tables
+        self.check_interval_s = check_interval_s
+        self.embed_batch = embed_batch
+        self.reflections = 0            # times table descriptions were read from the database
+        self._state: Optional[Dict[str, Any]] = None
+        self._db_fingerprint: Optional[str] = None   # schema self.db reflected
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def fingerprint(self) -> str:
+        """Changes whenever a table or view is created, altered or dropped; read from the live catalog."""
+        sql = FINGERPRINT_SQL.get(self.db.dialect, DEFAULT_FINGERPRINT_SQL)
+        parts = [self.db.dialect, str(self.db.run(sql)), self.model]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _refresh_db(self, fingerprint: str):
+        # the first fingerprint is taken right after self.db was built, so it describes that reflection
+        if self._db_fingerprint is not None and self._db_fingerprint != fingerprint and self.reload is not None:
+            self.db = self.reload()
+        self._db_fingerprint = fingerprint
+
+    def _load_file(self) -> Optional[Dict[str, Any]]:
+        if not self.path:
+            return None
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_file(self, state: Dict[str, Any]):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.path)
+
+    def _read_schema(self, fingerprint: str) -> Dict[str, Any]:
+        self.reflections += 1
+        tables = {name: self.db.get_table_info([name]) for name in sorted(self.db.get_usable_table_names())}
+        state = {"fingerprint": fingerprint, "tables": tables, "vectors": []}
+        if self.embed is not None:
+            docs = schema_documents(tables)
+            for i in range(0, len(docs), self.embed_batch):
+                batch = docs[i:i + self.embed_batch]
+                state["vectors"].extend([table, vector] for (table, _), vector
+                                        in zip(batch, self.embed([text for _, text in batch])))
+        return state
+
+    def state(self) -> Dict[str, Any]:
+        """Current schema descriptions, re-read only when the fingerprint changed."""
+        with self._lock:
+            now = time.monotonic()
+            if self._state is not None and now - self._checked_at < self.check_interval_s:
+                return self._state
+            fingerprint = self.fingerprint()
+            self._checked_at = now
+            self._refresh_db(fingerprint)
+            if self._state is None or self._state["fingerprint"] != fingerprint:
+                saved = self._load_file()
+                if saved is not None and saved.get("fingerprint") == fingerprint:
+                    self._state = saved
+                else:
+                    self._state = self._read_schema(fingerprint)
+                    self._save_file(self._state)
+            return self._state
+
+    def invalidate(self):
+        """Forget the cached schema (e.g. right after running DDL)."""
+        with self._lock:
+            self._state = None
+
+    def relevant_tables(self, question: str) -> List[str]:
+        """The top_tables tables closest to the question, plus the tables their foreign keys reference."""
+        state = self.state()
+        tables = state["tables"]
+        if self.embed is None or not state["vectors"] or len(tables) <= self.top_tables:
+            return list(tables)
+        q = self.embed([question])[0]
+        scores: Dict[str, float] = {}
+        for table, vector in state["vectors"]:
+            scores[table] = max(scores.get(table, -1.0), _cosine(q, vector))
+        chosen = sorted(scores, key=lambda t: -scores[t])[:self.top_tables]
+        for table in list(chosen):
+            chosen.extend(t for t in referenced_tables(tables[table]) if t in tables and t not in chosen)
+        return chosen
+
+    def table_info(self, question: Optional[str] = None) -> str:
+        """{table_info} for the prompt: every table, or only those relevant to `question`."""
+        tables = self.state()["tables"]
+        names = self.relevant_tables(question) if question else list(tables)
+        return "\n\n".join(tables[name] for name in names)
@@ -0,0 +1,231 @@
+"""
+Two-level cache for the text-to-SQL path.
+
+QueryCache (level 1) maps a question to the SQL that answered it. It tries the normalized question first,
+then the closest earlier question by embedding (cosine >= `threshold`) that mentions the same literals
+(numbers, quoted strings, names), so "events in 2023" never reuses the SQL written for "events in 2024".
+Only read-only SQL that ran successfully is stored. Entries are tied to a schema fingerprint, so they stop
+matching after a schema change.
+
+ResultCache (level 2) maps a hash of the SQL text (and its parameters) to its result for `ttl_s` seconds. Each entry records the
+tables the query reads and their write versions, as reported by a `versions()` callable (for example the
+last_user_update times from sys.dm_db_index_usage_stats). An entry is dropped as soon as one of those
+tables has been written. SQL that writes through this path invalidates the tables it touches.
+
+cached_query() runs one question through both levels. A repeated question skips both the LLM and the
+database.
+"""
+
+import re
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+# Per-table write versions; the DMV needs VIEW SERVER STATE and resets on restart (which only invalidates)
+TABLE_VERSIONS_SQL = {
+    "mssql": "SELECT OBJECT_NAME(object_id), MAX(last_user_update) FROM sys.dm_db_index_usage_stats "
+             "WHERE database_id = DB_ID() GROUP BY object_id",
+}
+
+_WRITE = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|DROP|ALTER|CREATE|TRUNCATE|EXEC|EXECUTE|INTO|GRANT)\b", re.I)
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+
+def question_literals(question: str) -> frozenset:
+    """Numbers, quoted strings and capitalised words after the first: the parts a reused query must share."""
+    words = question.split()
+    names = {w.strip(",.?!:;'\"").lower() for w in words[1:] if w[:1].isupper()}
+    quoted = {q.lower() for pair in re.findall(r"'([^']*)'|\"([^\"]*)\"", question) for q in pair if q}
+    return frozenset(names | quoted | set(re.findall(r"\d+(?:\.\d+)?", question)))
+
+
+def normalize_sql(sql: str) -> str:
+    return " ".join(sql.split()).rstrip(";").strip()
+
+
+def sql_key(sql: str, params: Sequence[Any] = ()) -> str:
+    text = normalize_sql(sql) + ("\0" + repr(tuple(params)) if params else "")
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def is_read_only(sql: str) -> bool:
+    text = _COMMENT.sub(" ", sql).strip()
+    return bool(re.match(r"(SELECT|WITH)\b", text, re.I)) and not _WRITE.search(text)
+
+
+def tables_in(sql: str, tables: Iterable[str]) -> List[str]:
+    """Known table names that appear in the SQL text (over-matching only over-invalidates)."""
+    tokens = set(re.findall(r"\w+", _COMMENT.sub(" ", sql).lower()))
+    return [t for t in tables if t.lower() in tokens]
+
+
+def _unit(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class QueryCache:
+    def __init__(self, threshold: float = 0.97, max_entries: int = 1000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()     # (schema, normalized question) -> (sql, literals, unit vector or None)
+        self._lock = threading.Lock()
+
+    def get(self, question: str, embedding: Optional[Sequence[float]] = None, schema: str = "") -> Optional[str]:
+        """SQL for the same question or, given an embedding, for a near-duplicate. Counts hits only; the
+           caller records one miss() once every lookup for a question failed."""
+        key = (schema, normalize_question(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and embedding is not None:
+                query, literals = _unit(embedding), question_literals(question)
+                best_sim = self.threshold
+                for (entry_schema, _), candidate in self._entries.items():
+                    if entry_schema != schema or candidate[2] is None or candidate[1] != literals:
+                        continue
+                    sim = sum(a * b for a, b in zip(query, candidate[2]))
+                    if sim >= best_sim:
+                        entry, best_sim = candidate, sim
+            if entry is None:
+                return None
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            return entry[0]
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, question: str, sql: str, embedding: Optional[Sequence[float]] = None, schema: str = ""):
+        with self._lock:
+            key = (schema, normalize_question(question))
+            self._entries[key] = (sql, question_literals(question), _unit(embedding) if embedding is not None else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+class ResultCache:
+    def __init__(self, ttl_s: float = 300, max_entries: int = 1000, max_rows: int = 10000,
+                 versions: Optional[Callable[[], Dict[str, Any]]] = None, check_interval_s: float = 5.0):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.check_interval_s = check_interval_s
+        self.hits = 0
+        self.misses = 0
+        self._versions_fn = versions
+        self._versions: Dict[str, Any] = {}
+        self._versions_at = -math.inf
+        self._entries = OrderedDict()     # sql key -> (result, {table: version}, created)
+        self._lock = threading.Lock()
+
+    def _current_versions(self) -> Dict[str, Any]:
+        # at most one catalog query per check_interval_s, however many lookups. The query runs outside the
+        # lock: the thread that claims the refresh waits for the database, the others use the last versions
+        with self._lock:
+            now = time.monotonic()
+            if self._versions_fn is None or now - self._versions_at < self.check_interval_s:
+                return self._versions
+            self._versions_at = now
+        try:
+            versions = {k.lower(): v for k, v in self._versions_fn().items()}
+        except BaseException:
+            with self._lock:
+                self._versions_at = -math.inf
+            raise
+        with self._lock:
+            self._versions = versions
+        return versions
+
+    def get(self, sql: str, params: Sequence[Any] = ()) -> Optional[Any]:
+        key = sql_key(sql, params)
+        versions = self._current_versions()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, tables, created = entry
+                if time.time() - created > self.ttl_s or any(versions.get(t) != v for t, v in tables.items()):
+                    del self._entries[key]
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return result
+
+    def put(self, sql: str, result: Any, tables: Iterable[str], rows: int = 0, params: Sequence[Any] = ()):
+        """Cache `result` of `sql` run with `params`, which reads `tables`; results over max_rows rows are not kept."""
+        if rows > self.max_rows:
+            return
+        versions = self._current_versions()
+        with self._lock:
+            key = sql_key(sql, params)
+            self._entries[key] = (result, {t.lower(): versions.get(t.lower()) for t in tables}, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """Drop every result that read any of `tables`."""
+        tables = {t.lower() for t in tables}
+        with self._lock:
+            stale = [key for key, (_, read, _) in self._entries.items() if tables & set(read)]
+            for key in stale:
+                del self._entries[key]
+            # the next lookup must see the write
+            self._versions_at = -math.inf
+            return len(stale)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+def cached_query(question: str, write_sql: Callable[[str], str], run_sql: Callable[[str], Dict[str, Any]],
+                 queries: QueryCache, results: ResultCache, tables: Sequence[str] = (),
+                 embed: Optional[Callable[[str], List[float]]] = None, schema: str = "") -> Dict[str, Any]:
+    """Answer `question` with SQL: cached SQL or write_sql(question), then a cached result or run_sql(sql).
+       run_sql returns {"columns": [...], "rows": [...]}, plus "truncated": True when it stopped at a row
+       cap; the flag is cached with the rows. Only SQL that ran without error is cached."""
+    embedding = None
+    sql = queries.get(question, schema=schema)
+    if sql is None and embed is not None:
+        embedding = embed(question)
+        sql = queries.get(question, embedding, schema=schema)
+    sql_cached = sql is not None
+    if not sql_cached:
+        queries.miss()
+        sql = write_sql(question)
+
+    result = results.get(sql)
+    result_cached = result is not None
+    if not result_cached:
+        result = run_sql(sql)
+        touched = tables_in(sql, tables)
+        if is_read_only(sql):
+            results.put(sql, result, touched, rows=len(result.get("rows", ())))
+        else:
+            results.invalidate_tables(touched)
+    if not sql_cached and is_read_only(sql):
+        queries.put(question, sql, embedding, schema=schema)
+    return {"sql": sql, "result": result, "sql_cached": sql_cached, "result_cached": result_cached}
@@ -0,0 +1,133 @@
+"""
+Shared SQL Server connection settings and a small thread-safe connection pool.
+
+ConnectionPool hands out DB-API connections (pyodbc, or sqlite3 in the benchmarks) made by a factory,
+with at most `max_size` open at once. Idle connections are reused newest-first; one that sat idle longer
+than `check_after_s` is pinged with `SELECT 1` before reuse and replaced if the ping fails, and a
+connection that raised while checked out is only returned to the pool if it still answers the ping.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+from urllib.parse import quote_plus
+
+log = logging.getLogger("rag.sql")
+
+
+# defaults of the SQL_* settings, shared by the app, the text-to-SQL script and the seeder
+SQL_DEFAULTS = {"SQL_DRIVER": "{ODBC Driver 18 for SQL Server}", "SQL_SERVER": "localhost",
+                "SQL_DATABASE": "rag_chatbot_ollama", "SQL_USERNAME": "sa", "SQL_PASSWORD": "pakistan"}
+
+
+def connection_string(driver: str, server: str, database: str, username: str = "", password: str = "") -> str:
+    """ODBC connection string; SQL authentication when a username is set, Windows authentication otherwise."""
+    conn_str = (
+        f"DRIVER={driver};"
+        f"SERVER={server};"
+        f"DATABASE={database};"
+    )
+    if username:
+        conn_str += f"UID={username};PWD={password};"
+    else:
+        conn_str += "Trusted_Connection=yes;"
+    return conn_str
+
+
+def env_connection_string() -> str:
+    """connection_string() from the SQL_* environment settings (load .env first), with SQL_DEFAULTS."""
+    setting = lambda name: os.getenv(name, SQL_DEFAULTS[name])
+    return connection_string(setting("SQL_DRIVER"), setting("SQL_SERVER"), setting("SQL_DATABASE"),
+                             setting("SQL_USERNAME"), setting("SQL_PASSWORD"))
+
+
+def sqlalchemy_url(conn_str: str) -> str:
+    """SQLAlchemy URL for an ODBC connection string, so SQLAlchemy tools reach the same server and database."""
+    return "mssql+pyodbc:///?odbc_connect=" + quote_plus(conn_str)
+
+
+class ConnectionPool:
+    def __init__(self, factory: Callable[[], Any], max_size: int = 4, timeout: float = 30.0,
+                 check_after_s: float = 30.0, health_sql: str = "SELECT 1"):
+        self._factory = factory
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after_s = check_after_s
+        self.health_sql = health_sql
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = deque()            # (connection, monotonic time it was returned)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _healthy(self, conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.health_sql)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """Check out a connection, waiting up to `timeout` seconds for a free slot."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No SQL connection free after {self.timeout:g}s (pool size {self.max_size})")
+        try:
+            while True:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    return self._factory()
+                conn, returned_at = item
+                if time.monotonic() - returned_at < self.check_after_s or self._healthy(conn):
+                    return conn
+                log.warning("Dropping SQL connection that failed its health check")
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn, broken: bool = False):
+        try:
+            if broken or self._closed:
+                self._discard(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            broken = not self._healthy(conn)
+            raise
+        finally:
+            self.release(conn, broken)
+
+    def idle(self) -> int:
+        with self._lock:
+            return len(self._idle)
+
+    def close(self):
+        """Close idle connections; connections still checked out are closed when they come back."""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._discard(conn)
@@ -0,0 +1,61 @@
+"""
+Shared fixtures: the RAG module pointed at the benchmark stand-ins, i.e. rows from a SQLite copy of the
+schema (bench/sqlite_db.py) and embeddings/answers from the fake Ollama server (bench/fake_ollama.py).
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "bench")]
+
+import rag_chatbot_sqlserver_ollama as rag
+from fake_ollama import start_server
+import sqlite_db
+from sqlite_db import connect, populate
+
+
+@pytest.fixture(scope="session")
+def fake_ollama():
+    server, url = start_server()
+    yield url
+    server.shutdown()
+
+
+def configure(work, db_path: str, ollama_url: str, setattr=setattr):
+    """Point the RAG module at the stand-ins and a private state directory (`setattr` may be monkeypatch's)."""
+    settings = {"_handles": {}, "OLLAMA_HOST": ollama_url, "CHROMA_PERSIST_DIR": str(work / "chroma_db"),
+                "EMBED_CACHE_PATH": str(work / "embedding_cache.sqlite3"),
+                "GEO_INDEX_PATH": str(work / "geo_index.sqlite3"),
+                "LEXICAL_INDEX_PATH": str(work / "lexical_index.sqlite3"),
+                "RELATION_INDEX_PATH": str(work / "relation_index.sqlite3"),
+                "INDEX_CHECKPOINT_PATH": str(work / "index_checkpoint.json"),
+                "ANSWER_CACHE": False, "ROUTER": False,
+                "get_sql_connection": lambda: connect(db_path), "SQL_DIALECT": "sqlite",
+                "PERSON_SQL": sqlite_db.PERSON_SQL, "EVENT_SQL": sqlite_db.EVENT_SQL}
+    for name, value in settings.items():
+        setattr(rag, name, value)
+
+
+@pytest.fixture(scope="session")
+def indexed(tmp_path_factory, fake_ollama):
+    """(rag module, SQLite connection) with 300 persons and 1500 events indexed into a private state dir."""
+    work = tmp_path_factory.mktemp("rag")
+    db_path = str(work / "rows.sqlite3")
+    conn = connect(db_path)
+    populate(conn, persons=300, events=1500, seed=3)
+    configure(work, db_path, fake_ollama)
+    rag.load_and_index_all(full=True)
+    yield rag, conn
+    rag._handles.clear()
+    conn.close()
+
+
+@pytest.fixture
+def fresh_rag(tmp_path, fake_ollama, monkeypatch):
+    """configure(rag) for one test on its own database (tmp_path/rows.sqlite3, created by the test);
+       every setting is restored afterwards."""
+    configure(tmp_path, str(tmp_path / "rows.sqlite3"), fake_ollama, monkeypatch.setattr)
+    return rag
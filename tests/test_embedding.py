@@ -0,0 +1,73 @@
+"""Concurrent, retried embedding against the fake Ollama server: vectors must come back in document order."""
+
+import pytest
+from ollama import Client, ResponseError
+
+import metrics
+import rag_chatbot_sqlserver_ollama as rag
+from fake_ollama import fake_vector, start_server
+
+DIM = 64
+TEXTS = [f"Event {i}\nabout   topic {i % 7}" for i in range(100)]
+
+
+@pytest.fixture
+def embed_settings(monkeypatch):
+    monkeypatch.setattr(rag, "_handles", {})
+    monkeypatch.setattr(rag, "EMBED_CACHE", False)
+    monkeypatch.setattr(rag, "EMBED_CONCURRENCY", 4)
+    monkeypatch.setattr(rag, "EMBED_RETRY_BACKOFF", 0.01)
+    monkeypatch.setattr(rag, "EMBED_MAX_RETRIES", 3)
+
+
+def serve(**options):
+    server, url = start_server(dim=DIM, **options)
+    return server, url, server.RequestHandlerClass.stats
+
+
+def expected(texts):
+    return [fake_vector(rag.clean_text(t), DIM) for t in texts]
+
+
+def test_vectors_keep_document_order_under_jitter(embed_settings):
+    # random latency per request, so the concurrent batches finish out of order
+    server, url, stats = serve(latency_ms=2, jitter_ms=30)
+    try:
+        assert rag.embed_texts(TEXTS, Client(host=url), batch_size=7) == expected(TEXTS)
+        assert stats["requests"] == 15
+    finally:
+        server.shutdown()
+
+
+def test_overloaded_batches_are_retried(embed_settings):
+    server, url, stats = serve(latency_ms=2, jitter_ms=10, fail_first=3)
+    retries = metrics.EMBED_RETRIES.value()
+    try:
+        assert rag.embed_texts(TEXTS, Client(host=url), batch_size=10) == expected(TEXTS)
+        assert stats["failures"] == 3
+        assert stats["requests"] == 10 + 3
+        assert metrics.EMBED_RETRIES.value() - retries == 3
+    finally:
+        server.shutdown()
+
+
+def test_timed_out_batch_is_retried(embed_settings):
+    server, url, stats = serve(hang_first=1, hang_ms=1500)
+    retries = metrics.EMBED_RETRIES.value()
+    try:
+        assert rag.embed_texts(TEXTS, Client(host=url, timeout=0.3), batch_size=25) == expected(TEXTS)
+        assert stats["hangs"] == 1
+        assert metrics.EMBED_RETRIES.value() - retries == 1
+    finally:
+        server.shutdown()
+
+
+def test_gives_up_after_max_retries(embed_settings, monkeypatch):
+    monkeypatch.setattr(rag, "EMBED_MAX_RETRIES", 1)
+    server, url, stats = serve(fail_first=2)
+    try:
+        with pytest.raises(ResponseError):
+            rag.embed_texts(TEXTS[:5], Client(host=url))
+        assert stats["requests"] == 2
+    finally:
+        server.shutdown()
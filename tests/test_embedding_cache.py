@@ -0,0 +1,74 @@
+"""Embedding cache: lookups only read, last_used times are written in batches, and a locked file never raises."""
+
+import time
+import sqlite3
+import threading
+
+from embedding_cache import EmbeddingCache, cache_key
+
+
+def _last_used(cache, model, text):
+    return cache._conn.execute("SELECT last_used FROM embeddings WHERE key = ?",
+                               (cache_key(model, text),)).fetchone()[0]
+
+
+def test_lookups_do_not_write(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), memory_items=2)
+    texts = [f"text {i}" for i in range(5)]
+    cache.put_many("m", texts, [[float(i)] * 4 for i in range(5)])
+    writes = cache._conn.total_changes
+    for _ in range(3):
+        # two memory hits, three disk hits, one miss
+        assert cache.get_many("m", texts + ["new"]) == [[float(i)] * 4 for i in range(5)] + [None]
+    assert cache._conn.total_changes == writes
+    assert not cache._conn.in_transaction
+
+
+def test_touches_are_written_in_batches(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), touch_batch=3)
+    cache.put_many("m", ["a", "b", "c"], [[1.0], [2.0], [3.0]])
+    written = _last_used(cache, "m", "a")
+    time.sleep(0.01)
+    cache.get_many("m", ["a", "b"])
+    assert _last_used(cache, "m", "a") == written
+    cache.get_many("m", ["c"])
+    assert _last_used(cache, "m", "a") > written
+    assert not cache._conn.in_transaction
+
+    time.sleep(0.01)
+    cache.get_many("m", ["b"])
+    cache.flush()
+    assert _last_used(cache, "m", "b") > _last_used(cache, "m", "a")
+
+
+def test_recently_read_rows_survive_eviction(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), memory_items=0, max_bytes=10 * 4 * 4)
+    cache.put_many("m", [f"old {i}" for i in range(8)], [[0.0] * 4] * 8)
+    time.sleep(0.01)
+    cache.get_many("m", ["old 0"])     # only a pending touch, written before the eviction
+    cache.put_many("m", ["new 0", "new 1", "new 2"], [[1.0] * 4] * 3)
+    assert cache.get_many("m", ["old 0"]) == [[0.0] * 4]
+    assert cache.get_many("m", [f"old {i}" for i in range(1, 8)]).count(None) == 2
+
+
+def test_writer_waits_for_another_process_lock(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path, busy_timeout_s=5)
+    other = sqlite3.connect(path, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.3, other.commit).start()
+    cache.put_many("m", ["a"], [[1.0]])
+    assert EmbeddingCache(path, memory_items=0).get_many("m", ["a"]) == [[1.0]]
+
+
+def test_locked_write_is_skipped_not_raised(tmp_path, caplog):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path, busy_timeout_s=0.1)
+    other = sqlite3.connect(path)
+    other.execute("BEGIN IMMEDIATE")
+    cache.put_many("m", ["a"], [[1.0]])
+    assert "write skipped" in caplog.text
+    assert cache.get_many("m", ["a"]) == [[1.0]]      # still served from memory
+    other.rollback()
+    cache.put_many("m", ["b"], [[2.0]])
+    assert EmbeddingCache(path, memory_items=0).get_many("m", ["a", "b"]) == [None, [2.0]]
@@ -0,0 +1,42 @@
+"""Entity questions: every event linked to the named person must reach the prompt."""
+
+import re
+
+
+def _linked(conn, limit_events: int):
+    rows = conn.execute("SELECT p.Id AS Id, p.Name AS Name, COUNT(*) AS n FROM Person p"
+                        " JOIN EventPerson ep ON ep.PersonId = p.Id GROUP BY p.Id ORDER BY n DESC").fetchall()
+    return [(row.Id, row.Name, row.n) for row in rows if row.n <= limit_events]
+
+
+def _prompt_event_ids(rag, question: str) -> set:
+    messages = rag.build_prompt(question, rag.retrieve_context(question))
+    return {int(event_id) for event_id in re.findall(r"Event Id:? (\d+)", messages[1]["content"])}
+
+
+def test_every_linked_event_reaches_the_prompt(indexed):
+    rag, conn = indexed
+    checked = 0
+    for person_id, name, events in _linked(conn, rag.ENTITY_MAX_ROWS - 1):
+        question = f"What events involved {name}?"
+        if [pid for pid, _ in rag.get_relation_index().find_persons(question)] != [person_id]:
+            continue   # another person shares the name
+        linked = {row.EventId for row in conn.execute("SELECT EventId FROM EventPerson WHERE PersonId = ?",
+                                                      (person_id,))}
+        assert linked <= _prompt_event_ids(rag, question), name
+        checked += 1
+        if checked == 20:
+            break
+    assert checked >= 5
+
+
+def test_capped_list_says_how_many_are_shown(indexed):
+    rag, conn = indexed
+    top = conn.execute("SELECT p.Name AS Name, COUNT(*) AS n FROM Person p JOIN EventPerson ep"
+                       " ON ep.PersonId = p.Id GROUP BY p.Id ORDER BY n DESC LIMIT 1").fetchone()
+    assert top.n > rag.ENTITY_MAX_ROWS
+    question = f"What events involved {top.Name}?"
+    persons = rag.get_relation_index().find_persons(question)
+    block = rag.retrieve_context(question)[0]
+    assert block["meta"]["table"] == "EventPerson"
+    assert f"(first {rag.ENTITY_MAX_ROWS - len(persons)} of " in block["doc"].split("\n")[0]
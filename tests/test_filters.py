@@ -0,0 +1,14 @@
+"""Structured filters: an area with no indexed events must not drop the question's other filters."""
+
+
+def test_unknown_area_keeps_the_date_range(indexed):
+    rag, conn = indexed
+    query = "Events within 20 km of Springfield IL in March 2023"
+    filters = rag.query_filters(query)
+    assert "row_ids" not in filters and filters["date_from"] == 20230301
+
+    retrieved = rag.retrieve_context(query, top_k=5)
+    assert retrieved
+    for row in retrieved:
+        assert row["meta"]["table"] == "Event"
+        assert 20230301 <= row["meta"]["date_num"] <= 20230331
@@ -0,0 +1,119 @@
+"""rag_server.py over a real socket; streamed answers come from a slow stand-in for rag.answer_question_stream."""
+
+import json
+import time
+import asyncio
+import threading
+
+import pytest
+
+import rag_chatbot_sqlserver_ollama as rag
+import rag_server
+
+
+@pytest.fixture
+def slow_answers(monkeypatch):
+    """One LLM slot; each answer holds it while yielding 200 tokens, 20 ms apart."""
+    monkeypatch.setattr(rag, "_handles", {})
+    monkeypatch.setattr(rag, "LLM_CONCURRENCY", 1)
+    produced, closed = [], threading.Event()
+
+    def answer_question_stream(question, top_k=rag.TOP_K):
+        try:
+            with rag.get_llm_slots():
+                yield {"event": "sources", "sources": []}
+                for i in range(200):
+                    time.sleep(0.02)
+                    produced.append(i)
+                    yield {"event": "token", "text": f"t{i} "}
+                yield {"event": "done", "answer": "", "timings": {}}
+        finally:
+            closed.set()
+
+    monkeypatch.setattr(rag, "answer_question_stream", answer_question_stream)
+    return produced, closed
+
+
+async def _serve(client):
+    service = rag_server.RagService(workers=4)
+    server = await asyncio.start_server(lambda r, w: rag_server.handle_connection(service, r, w), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        async with server:
+            return await client(port)
+    finally:
+        service.executor.shutdown(wait=False)
+
+
+async def _request(port: int, raw: bytes):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(raw)
+    await writer.drain()
+    return reader, writer
+
+
+def _post(body: dict) -> bytes:
+    data = json.dumps(body).encode("utf-8")
+    return b"POST /ask HTTP/1.1\r\nContent-Length: " + str(len(data)).encode() + b"\r\n\r\n" + data
+
+
+def test_disconnect_mid_stream_frees_the_llm_slot(slow_answers):
+    produced, closed = slow_answers
+
+    async def client(port):
+        reader, writer = await _request(port, _post({"question": "who came?", "stream": True}))
+        while b"event: token" not in await reader.readline():
+            pass
+        writer.close()
+        # the next write fails, the producer sees the flag and closes the generation
+        return await asyncio.get_running_loop().run_in_executor(None, closed.wait, 2.0)
+
+    assert asyncio.run(_serve(client))
+    assert len(produced) < 200
+    assert rag.get_llm_slots().acquire(timeout=1)
+
+
+@pytest.mark.parametrize("raw, status", [
+    (b"GARBAGE\r\n\r\n", 400),
+    (b"POST /ask HTTP/1.1\r\nContent-Length: ten\r\n\r\n", 400),
+    (b"POST /ask HTTP/1.1\r\nContent-Length: -1\r\n\r\n", 400),
+    (b"POST /ask HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % (rag_server.MAX_BODY_BYTES + 1), 413),
+])
+def test_unreadable_requests_get_their_own_status(raw, status):
+    async def client(port):
+        reader, writer = await _request(port, raw)
+        status_line = await reader.readline()
+        writer.close()
+        return int(status_line.split()[1])
+
+    assert asyncio.run(_serve(client)) == status
+
+
+@pytest.mark.parametrize("top_k", [0, -1, 10 ** 9])
+@pytest.mark.parametrize("stream", [False, True])
+def test_top_k_out_of_range_is_a_bad_request(slow_answers, top_k, stream):
+    async def client(port):
+        reader, writer = await _request(port, _post({"question": "who came?", "top_k": top_k, "stream": stream}))
+        status_line = await reader.readline()
+        writer.close()
+        return int(status_line.split()[1])
+
+    assert asyncio.run(_serve(client)) == 400
+    assert not slow_answers[0]
+
+
+def test_health_failure_is_answered(monkeypatch):
+    def broken():
+        raise RuntimeError("vector store unavailable")
+
+    monkeypatch.setattr(rag, "get_query_collection", broken)
+
+    async def client(port):
+        reader, writer = await _request(port, b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+        return response
+
+    head, _, body = asyncio.run(_serve(client)).partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 500")
+    assert json.loads(body)["error"] == "vector store unavailable"
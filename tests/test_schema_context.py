@@ -0,0 +1,45 @@
+"""SchemaContext must notice DDL through the live catalog and re-read it from a freshly reflected database."""
+
+import sqlite3
+
+from schema_context import SchemaContext
+
+
+class ReflectedDatabase:
+    """The parts of LangChain's SQLDatabase that SchemaContext uses, on SQLite. Like SQLDatabase, the tables
+       are reflected once, when it is built; run() goes to the live database."""
+
+    dialect = "sqlite"
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self._tables = dict(self.conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table'"))
+
+    def get_usable_table_names(self):
+        return sorted(self._tables)
+
+    def get_table_info(self, names):
+        return "\n\n".join(self._tables[name] for name in names)
+
+    def run(self, sql: str) -> str:
+        return str(self.conn.execute(sql).fetchall())
+
+
+def test_schema_change_reaches_the_table_info(tmp_path):
+    path = str(tmp_path / "schema.sqlite3")
+    ddl = sqlite3.connect(path)
+    ddl.execute("CREATE TABLE Person (Id INTEGER PRIMARY KEY, Name TEXT)")
+    ddl.commit()
+    context = SchemaContext(ReflectedDatabase(path), path=str(tmp_path / "schema_cache.json"), check_interval_s=0,
+                            reload=lambda: ReflectedDatabase(path))
+    assert "Email" not in context.table_info()
+    context.table_info()
+    assert context.reflections == 1
+
+    ddl.execute("ALTER TABLE Person ADD COLUMN Email TEXT")
+    ddl.execute("CREATE TABLE Venue (Id INTEGER PRIMARY KEY, City TEXT)")
+    ddl.commit()
+    info = context.table_info()
+    assert "Email" in info and "CREATE TABLE Venue" in info
+    assert context.db.get_usable_table_names() == ["Person", "Venue"]
+    assert context.reflections == 2
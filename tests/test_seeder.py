@@ -0,0 +1,21 @@
+"""Seeded events must have a city, state, zip and coordinates that agree with each other."""
+
+import os
+import random
+import importlib.util
+
+# db_seeder/main.py is a script, and bench/ has its own main.py, so load it by path
+_spec = importlib.util.spec_from_file_location(
+    "db_seeder_main", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db_seeder", "main.py"))
+seeder = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(seeder)
+
+
+def test_event_addresses_match_their_coordinates():
+    cities = {(city, state): (zip_prefix, lat, lon) for city, state, zip_prefix, lat, lon in seeder.US_CITIES}
+    for event in seeder.iter_events(500, seeder.Pools(7, size=200), random.Random(7)):
+        street, city, state_zip = event[6].rsplit(", ", 2)
+        state, zip_code = state_zip.split()
+        zip_prefix, lat, lon = cities[(city, state)]
+        assert zip_code.startswith(zip_prefix)
+        assert abs(event[4] - lat) <= 0.05 and abs(event[5] - lon) <= 0.05
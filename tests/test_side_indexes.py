@@ -0,0 +1,28 @@
+"""Incremental runs must not rebuild the side indexes from Chroma when one is legitimately empty."""
+
+from sqlite_db import connect, populate
+
+
+def test_empty_geo_index_does_not_trigger_backfill(fresh_rag, tmp_path, monkeypatch):
+    rag = fresh_rag
+    conn = connect(str(tmp_path / "rows.sqlite3"))
+    populate(conn, persons=50, events=100, seed=5)
+    conn.execute("UPDATE Event SET Latitude = NULL, Longitude = NULL")
+    conn.commit()
+    conn.close()
+    rag.load_and_index_all(full=True)
+    assert rag.get_geo_index().count() == 0
+
+    reads = []
+    iter_indexed = rag.iter_indexed
+    monkeypatch.setattr(rag, "iter_indexed", lambda collection, include, *a: reads.append(include) or
+                        iter_indexed(collection, include, *a))
+    rag.load_and_index_all()
+    assert ["metadatas", "documents"] not in reads
+
+    # an index without the marker (e.g. from before it existed) is filled from Chroma once
+    rag.get_lexical_index().clear()
+    rag.load_and_index_all()
+    rag.load_and_index_all()
+    assert reads.count(["metadatas", "documents"]) == 1
+    assert rag.get_lexical_index().count() == rag.get_query_collection().count()
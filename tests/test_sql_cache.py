@@ -0,0 +1,45 @@
+"""Text-to-SQL result cache: the table-version query must not block other lookups, and row caps stay visible."""
+
+import threading
+
+from sql_cache import QueryCache, ResultCache, cached_query
+
+
+def test_version_query_runs_outside_the_lock():
+    calls, started, release = [], threading.Event(), threading.Event()
+
+    def versions():
+        calls.append(1)
+        if len(calls) == 2:
+            started.set()
+            release.wait(5)
+        return {"Event": 1}
+
+    cache = ResultCache(versions=versions, check_interval_s=60)
+    cache.put("SELECT 1 FROM Event", {"rows": [(1,)]}, ["Event"])
+    cache.invalidate_tables(["Person"])          # forces a version check on the next lookup
+    slow = threading.Thread(target=cache.get, args=("SELECT 1 FROM Event",))
+    slow.start()
+    assert started.wait(5)
+    # that check is waiting on the database; other threads are still answered from the cache
+    hit = []
+    other = threading.Thread(target=lambda: hit.append(cache.get("SELECT 1 FROM Event")))
+    other.start()
+    other.join(1)
+    release.set()
+    slow.join(5)
+    assert hit == [{"rows": [(1,)]}]
+
+
+def test_truncated_flag_is_cached_with_the_rows():
+    runs = []
+
+    def run_sql(sql):
+        runs.append(sql)
+        return {"columns": ["Id"], "rows": [(i,) for i in range(3)], "truncated": True}
+
+    queries, results = QueryCache(), ResultCache(max_rows=3)
+    for _ in range(2):
+        answer = cached_query("list events", lambda q: "SELECT Id FROM Event", run_sql, queries, results, ["Event"])
+        assert answer["result"]["truncated"]
+    assert answer["result_cached"] and len(runs) == 1
@@ -0,0 +1,132 @@
+"""NumpyCollection (VECTOR_BACKEND=numpy) against brute force, and its storage paths: slot reuse, resize, snapshot."""
+
+import numpy as np
+import pytest
+
+from vector_store import NumpyCollection
+
+DIM = 32
+
+
+def _vectors(n: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def _filled(path, n: int, dtype: str = "float32", seed: int = 0):
+    collection = NumpyCollection(str(path), "test", dtype)
+    vectors = _vectors(n, seed)
+    collection.upsert([f"id{i}" for i in range(n)], vectors.tolist(), [f"doc {i}" for i in range(n)],
+                      [{"n": i, "parity": "even" if i % 2 == 0 else "odd"} for i in range(n)])
+    return collection, vectors
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_query_matches_brute_force_cosine(tmp_path, dtype):
+    collection, vectors = _filled(tmp_path, 500, dtype)
+    queries = _vectors(5, seed=1)
+    result = collection.query(queries.tolist(), n_results=10)
+    similarity = _unit(queries) @ _unit(vectors).T
+    for q in range(len(queries)):
+        expected = np.argsort(-similarity[q], kind="stable")[:10]
+        ids = [int(doc_id[2:]) for doc_id in result["ids"][q]]
+        if dtype == "float32":
+            assert ids == expected.tolist()
+            np.testing.assert_allclose(result["distances"][q], 1 - similarity[q][expected], atol=1e-5)
+        else:
+            # int8 keeps about two decimal digits per component: the same rows, near-exact distances
+            assert len(set(ids) & set(expected.tolist())) >= 9
+            np.testing.assert_allclose(result["distances"][q], 1 - similarity[q][ids], atol=0.02)
+        assert result["documents"][q] == [f"doc {i}" for i in ids]
+
+
+def test_where_filters(tmp_path):
+    collection, _ = _filled(tmp_path, 20)
+
+    def ids(where):
+        return sorted(int(doc_id[2:]) for doc_id in collection.get(where=where, include=[])["ids"])
+
+    assert ids({"n": {"$gte": 15}}) == [15, 16, 17, 18, 19]
+    assert ids({"parity": "odd", "n": {"$lt": 6}}) == [1, 3, 5]
+    assert ids({"$and": [{"parity": {"$eq": "even"}}, {"n": {"$in": [2, 3, 4]}}]}) == [2, 4]
+    assert ids({"$or": [{"n": {"$eq": 0}}, {"n": {"$gt": 18}}]}) == [0, 19]
+    assert ids({"n": {"$nin": list(range(2, 20))}}) == [0, 1]
+    assert ids({"n": {"$ne": 3}, "parity": "odd"}) == [1, 5, 7, 9, 11, 13, 15, 17, 19]
+    assert ids({"missing": {"$eq": 1}}) == []
+
+
+def test_where_on_mixed_type_column(tmp_path):
+    collection = NumpyCollection(str(tmp_path), "test")
+    codes = [1, 7, "a", "b", 9, None]
+    collection.upsert([f"id{i}" for i in range(6)], _vectors(6).tolist(),
+                      metadatas=[{"code": c} if c is not None else {} for c in codes])
+
+    def ids(where):
+        return sorted(int(doc_id[2:]) for doc_id in collection.get(where=where, include=[])["ids"])
+
+    assert ids({"code": {"$gte": 5}}) == [1, 4]         # strings are not compared with numbers
+    assert ids({"code": {"$eq": "a"}}) == [2]
+    assert ids({"code": {"$gt": "a"}}) == [3]
+    assert ids({"code": {"$in": [1, "b"]}}) == [0, 3]
+    assert ids({"code": {"$ne": 1}}) == [1, 2, 3, 4]    # a row without the key never matches
+
+    # a mixed column cannot go into columns.npz, so a second process reads the rows instead
+    collection.save_snapshot()
+    reader = NumpyCollection(str(tmp_path), "test")
+    assert sorted(reader.get(where={"code": {"$in": [1, "b"]}}, include=[])["ids"]) == ["id0", "id3"]
+
+
+def test_delete_then_upsert_reuses_the_slot(tmp_path):
+    collection, _ = _filled(tmp_path, 10)
+    slot = dict(collection._db.execute("SELECT id, slot FROM rows"))["id3"]
+    collection.delete(["id3"])
+    assert collection.count() == 9
+    assert collection.get(ids=["id3"])["ids"] == []
+    assert collection.get(where={"n": 3}, include=[])["ids"] == []
+
+    replacement = _vectors(1, seed=5)
+    collection.upsert(["new"], replacement.tolist(), ["new doc"], [{"n": 100}])
+    assert dict(collection._db.execute("SELECT id, slot FROM rows"))["new"] == slot
+    assert collection.count() == 10 and collection._n == 10
+    hit = collection.query(replacement.tolist(), n_results=1)
+    assert hit["ids"] == [["new"]] and hit["metadatas"] == [[{"n": 100}]]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_resize_keeps_existing_vectors(tmp_path, dtype):
+    collection, first = _filled(tmp_path, 1000, dtype)
+    assert collection._vectors.shape[0] == 1024
+    more = _vectors(100, seed=2)
+    collection.upsert([f"more{i}" for i in range(100)], more.tolist())
+    assert collection._vectors.shape[0] >= 1100 and collection.count() == 1100
+
+    stored = collection.get(ids=[f"id{i}" for i in range(1000)], include=["embeddings"])
+    by_id = dict(zip(stored["ids"], stored["embeddings"]))
+    atol = 1e-6 if dtype == "float32" else 0.02
+    np.testing.assert_allclose([by_id[f"id{i}"] for i in range(1000)], _unit(first), atol=atol)
+    assert collection.query(first[:3].tolist(), n_results=1)["ids"] == [["id0"], ["id1"], ["id2"]]
+
+
+def test_second_reader_sees_committed_writes(tmp_path, monkeypatch):
+    writer, _ = _filled(tmp_path, 50)
+    writer.save_snapshot()
+
+    # a current snapshot means opening the collection reads no rows
+    load_rows = NumpyCollection._load_rows
+    monkeypatch.setattr(NumpyCollection, "_load_rows", lambda self: pytest.fail("rows read despite snapshot"))
+    reader = NumpyCollection(str(tmp_path), "test")
+    assert reader.count() == 50
+    assert sorted(reader.get(where={"parity": "odd", "n": {"$lt": 10}}, include=[])["ids"]) == \
+        ["id1", "id3", "id5", "id7", "id9"]
+    monkeypatch.setattr(NumpyCollection, "_load_rows", load_rows)
+
+    # later writes (snapshot now stale, matrix resized) reach the open reader on its next call
+    extra = _vectors(1100, seed=3)
+    writer.upsert([f"x{i}" for i in range(1100)], extra.tolist(), metadatas=[{"n": -1}] * 1100)
+    writer.delete(["id0"])
+    assert reader.count() == 50 + 1100 - 1
+    assert reader.get(ids=["id0"])["ids"] == []
+    assert reader.query(extra[1099:].tolist(), n_results=1, where={"n": -1})["ids"] == [["x1099"]]
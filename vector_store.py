@@ -0,0 +1,395 @@
+"""
+In-process exact vector index on NumPy, usable in place of ChromaDB (VECTOR_BACKEND=numpy).
+
+It implements the part of the Chroma collection API this project uses (upsert / delete / get / query /
+count), so indexing and retrieval code work unchanged. A collection is a directory holding:
+  vectors.npy   unit-normalised embeddings, float32 or int8 (int8 keeps one float32 scale per row in
+                scales.npy). Both are opened with np.memmap, so every process searching the same index
+                shares one copy in the OS page cache and opening the index reads almost nothing.
+  rows.sqlite3  id, document text and metadata JSON per slot (the source of truth) plus a version counter.
+  columns.npz   metadata as parallel arrays, one per key, used to evaluate `where` filters without
+                touching row data. Rebuilt from rows.sqlite3 whenever it is older than the rows.
+
+Search is exact: a blocked matmul of the query against the (pre-filtered) matrix and an argpartition for
+the top k. Distances are cosine distances (1 - cosine similarity). Only one process should write at a
+time; any number of processes can read, and they pick up committed writes on their next call.
+"""
+
+import os
+import json
+import shutil
+import sqlite3
+import operator
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+_BLOCK_ROWS = 8192          # rows scored per matmul block; bounds the temporary copy for int8/filtered scans
+_SQL_BATCH = 500            # ids/slots per "IN (...)" lookup
+_COMPARE = {"$eq": operator.eq, "$ne": operator.ne, "$gt": operator.gt, "$gte": operator.ge,
+            "$lt": operator.lt, "$lte": operator.le}
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def _grown(array: np.ndarray, size: int, fill) -> np.ndarray:
+    if len(array) >= size:
+        return array
+    out = np.full(max(size, 2 * len(array), 1024), fill, dtype=array.dtype)
+    out[:len(array)] = array
+    return out
+
+
+class NumpyCollection:
+    def __init__(self, path: str, name: str, dtype: str = "float32"):
+        self.name = name
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(path, "rows.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS rows (slot INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL,
+                                             document TEXT, metadata TEXT);
+            CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        # the storage type is fixed when the collection is created
+        self._db.execute("INSERT OR IGNORE INTO state VALUES ('dtype', ?)", (np.dtype(dtype).name,))
+        self._db.execute("INSERT OR IGNORE INTO state VALUES ('version', '0')")
+        self._db.commit()
+        self.dtype = np.dtype(self._state("dtype"))
+        self._version = None
+        self._n = 0                                  # slots in use (live or free)
+        self._live = np.zeros(0, dtype=bool)
+        self._columns: Dict[str, List[np.ndarray]] = {}   # key -> [values, present]
+        self._vectors = None
+        self._scales = None
+        self._refresh()
+
+    # ----- loading -----
+    def _state(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _refresh(self):
+        """Reload metadata columns and re-open the memory maps if another process committed writes."""
+        with self._lock:
+            version = self._state("version")
+            if version == self._version:
+                return
+            if not self._load_snapshot(version):
+                self._load_rows()
+            self._open_vectors("r")
+            self._version = version
+
+    def _load_snapshot(self, version: str) -> bool:
+        try:
+            with np.load(self._file("columns.npz"), allow_pickle=False) as snap:
+                if str(snap["version"]) != version:
+                    return False
+                self._n = int(snap["n"])
+                self._live = snap["live"].copy()
+                self._columns = {str(key): [snap[f"v{i}"].astype(object) if snap[f"v{i}"].dtype.kind == "U"
+                                            else snap[f"v{i}"].copy(), snap[f"p{i}"].copy()]
+                                 for i, key in enumerate(snap["keys"])}
+            return True
+        except (OSError, KeyError, ValueError):
+            return False
+
+    def _load_rows(self):
+        rows = self._db.execute("SELECT slot, metadata FROM rows").fetchall()
+        self._n = max((slot for slot, _ in rows), default=-1) + 1
+        self._live = np.zeros(self._n, dtype=bool)
+        self._columns = {}
+        for slot, metadata in rows:
+            self._live[slot] = True
+            self._set_meta(slot, json.loads(metadata or "{}"))
+
+    def _open_vectors(self, mode: str):
+        self._vectors = self._scales = None
+        if os.path.exists(self._file("vectors.npy")):
+            self._vectors = np.load(self._file("vectors.npy"), mmap_mode=mode)
+            if self.dtype == np.int8:
+                self._scales = np.load(self._file("scales.npy"), mmap_mode=mode)
+
+    # ----- metadata columns -----
+    def _set_meta(self, slot: int, meta: Dict[str, Any]):
+        for key in set(self._columns) | set(meta):
+            value = meta.get(key)
+            column = self._columns.get(key)
+            numeric = value is None or isinstance(value, (int, float))
+            if column is None:
+                values = np.full(len(self._live), np.nan) if numeric else np.full(len(self._live), "", dtype=object)
+                column = self._columns[key] = [values, np.zeros(len(self._live), dtype=bool)]
+            if not numeric and column[0].dtype != object:
+                column[0] = column[0].astype(object)
+            if len(column[0]) < len(self._live):
+                column[0] = _grown(column[0], len(self._live), np.nan if column[0].dtype != object else "")
+                column[1] = _grown(column[1], len(self._live), False)
+            column[0][slot] = value if value is not None else (np.nan if column[0].dtype != object else "")
+            column[1][slot] = value is not None
+
+    def _compare(self, key: str, op: str, operand) -> np.ndarray:
+        column = self._columns.get(key)
+        if column is None:
+            return np.zeros(self._n, dtype=bool)
+        values, present = column[0][:self._n], column[1][:self._n]
+        if op in ("$in", "$nin"):
+            if values.dtype == object:
+                # np.isin would turn a mixed operand list into strings, so 1 would not match [1, "b"]
+                wanted = set(operand)
+                hit = np.fromiter((v in wanted for v in values), dtype=bool, count=len(values))
+            else:
+                hit = np.isin(values, list(operand))
+            return present & (hit if op == "$in" else ~hit)
+        compare = _COMPARE[op]
+        try:
+            hit = compare(values, operand)
+        except TypeError:
+            # mixed numbers/strings in one column: compare only values of the operand's kind
+            hit = np.array([isinstance(v, str) == isinstance(operand, str) and compare(v, operand) for v in values],
+                           dtype=bool)
+        return present & np.asarray(hit, dtype=bool)
+
+    def _mask(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        if not where:
+            return np.ones(self._n, dtype=bool)
+        mask = np.ones(self._n, dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._mask(clause)
+            elif key == "$or":
+                any_mask = np.zeros(self._n, dtype=bool)
+                for clause in condition:
+                    any_mask |= self._mask(clause)
+                mask &= any_mask
+            else:
+                if not isinstance(condition, dict):
+                    condition = {"$eq": condition}
+                for op, operand in condition.items():
+                    mask &= self._compare(key, op, operand)
+        return mask
+
+    # ----- row data -----
+    def _slots_for(self, ids: Sequence[str]) -> Dict[str, int]:
+        found = {}
+        for i in range(0, len(ids), _SQL_BATCH):
+            chunk = list(ids[i:i + _SQL_BATCH])
+            marks = ",".join("?" * len(chunk))
+            found.update(self._db.execute(f"SELECT id, slot FROM rows WHERE id IN ({marks})", chunk).fetchall())
+        return found
+
+    def _rows(self, slots: Sequence[int]) -> Dict[int, tuple]:
+        rows = {}
+        for i in range(0, len(slots), _SQL_BATCH):
+            chunk = [int(s) for s in slots[i:i + _SQL_BATCH]]
+            marks = ",".join("?" * len(chunk))
+            for slot, doc_id, document, metadata in self._db.execute(
+                    f"SELECT slot, id, document, metadata FROM rows WHERE slot IN ({marks})", chunk):
+                rows[slot] = (doc_id, document, json.loads(metadata) if metadata else None)
+        return rows
+
+    def _result(self, slots: Sequence[int], include: Iterable[str]) -> Dict[str, Any]:
+        rows = self._rows(slots)
+        slots = [s for s in slots if s in rows]
+        result: Dict[str, Any] = {"ids": [rows[s][0] for s in slots]}
+        if "documents" in include:
+            result["documents"] = [rows[s][1] for s in slots]
+        if "metadatas" in include:
+            result["metadatas"] = [rows[s][2] for s in slots]
+        if "embeddings" in include:
+            result["embeddings"] = [self._dequantize(np.array([s]))[0].tolist() for s in slots]
+        return result
+
+    def _dequantize(self, slots) -> np.ndarray:
+        block = self._vectors[slots].astype(np.float32)
+        return block * self._scales[slots][:, None] if self._scales is not None else block
+
+    # ----- Chroma-compatible API -----
+    def count(self) -> int:
+        self._refresh()
+        return int(self._live[:self._n].sum())
+
+    def get(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None,
+            include: Iterable[str] = ("documents", "metadatas"), limit: Optional[int] = None,
+            offset: Optional[int] = None) -> Dict[str, Any]:
+        self._refresh()
+        with self._lock:
+            mask = self._live[:self._n] & self._mask(where)
+            if ids is not None:
+                slots = [s for s in self._slots_for(list(ids)).values() if s < self._n and mask[s]]
+            else:
+                slots = np.flatnonzero(mask).tolist()
+            slots = slots[offset or 0:]
+            if limit is not None:
+                slots = slots[:limit]
+            return self._result(slots, include)
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None,
+              include: Iterable[str] = ("documents", "metadatas", "distances")) -> Dict[str, Any]:
+        """Exact top-n by cosine similarity for each query, restricted to rows matching `where`."""
+        self._refresh()
+        with self._lock:
+            queries = _unit_rows(np.asarray(query_embeddings, dtype=np.float32))
+            candidates = np.flatnonzero(self._live[:self._n] & self._mask(where))
+            out = {"ids": [], "distances": [], "documents": [], "metadatas": []}
+            if self._vectors is None or len(candidates) == 0:
+                for key in out:
+                    out[key] = [[] for _ in queries]
+                return out
+            scores = self._scores(queries, candidates)
+            for q in range(len(queries)):
+                k = min(n_results, len(candidates))
+                top = np.argpartition(-scores[:, q], k - 1)[:k]
+                top = top[np.argsort(-scores[top, q], kind="stable")]
+                hits = self._result(candidates[top].tolist(), include)
+                out["ids"].append(hits["ids"])
+                out["distances"].append((1.0 - scores[top, q]).tolist())
+                out["documents"].append(hits.get("documents"))
+                out["metadatas"].append(hits.get("metadatas"))
+            return out
+
+    def _scores(self, queries: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        """(len(candidates), len(queries)) cosine similarities, computed block by block."""
+        scores = np.empty((len(candidates), len(queries)), dtype=np.float32)
+        # a scan over every slot reads the memory map in place instead of gathering rows
+        dense = len(candidates) == self._n
+        for start in range(0, len(candidates), _BLOCK_ROWS):
+            stop = min(start + _BLOCK_ROWS, len(candidates))
+            rows = slice(start, stop) if dense else candidates[start:stop]
+            block = self._vectors[rows]
+            if self._scales is not None:
+                scores[start:stop] = (block.astype(np.float32) @ queries.T) * self._scales[rows][:, None]
+            else:
+                scores[start:stop] = block @ queries.T
+        return scores
+
+    def upsert(self, ids: Sequence[str], embeddings: Sequence[Sequence[float]],
+               documents: Optional[Sequence[str]] = None, metadatas: Optional[Sequence[Dict[str, Any]]] = None):
+        ids = list(ids)
+        vectors = _unit_rows(np.asarray(embeddings, dtype=np.float32))
+        documents = list(documents) if documents is not None else [None] * len(ids)
+        metadatas = list(metadatas) if metadatas is not None else [None] * len(ids)
+        self._refresh()
+        with self._lock:
+            existing = self._slots_for(ids)
+            free = iter(np.flatnonzero(~self._live[:self._n]).tolist())
+            slots = []
+            for doc_id in ids:
+                slot = existing.get(doc_id)
+                if slot is None:
+                    slot = next(free, None)
+                if slot is None:
+                    slot, self._n = self._n, self._n + 1
+                existing[doc_id] = slot
+                slots.append(slot)
+            self._write_vectors(np.array(slots), vectors)
+            self._live = _grown(self._live, self._n, False)
+            for slot, meta in zip(slots, metadatas):
+                self._live[slot] = True
+                self._set_meta(slot, meta or {})
+            self._db.executemany("INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?)",
+                                 [(slot, doc_id, doc, json.dumps(meta) if meta is not None else None)
+                                  for slot, doc_id, doc, meta in zip(slots, ids, documents, metadatas)])
+            self._commit()
+
+    def delete(self, ids: Sequence[str]):
+        self._refresh()
+        with self._lock:
+            slots = list(self._slots_for(list(ids)).values())
+            self._db.executemany("DELETE FROM rows WHERE slot = ?", [(s,) for s in slots])
+            for slot in slots:
+                self._live[slot] = False
+                self._set_meta(slot, {})
+            self._commit()
+
+    def save_snapshot(self):
+        """Write the metadata columns to columns.npz so other processes open the index without reading rows."""
+        with self._lock:
+            arrays = {"version": np.array(self._version), "n": np.array(self._n),
+                      "live": self._live[:self._n], "keys": np.array(sorted(self._columns), dtype=str)}
+            for i, key in enumerate(sorted(self._columns)):
+                values, present = self._columns[key][0][:self._n], self._columns[key][1][:self._n]
+                if values.dtype == object:
+                    if any(not isinstance(v, str) for v in values[present]):
+                        return      # mixed-type column cannot be stored without pickling; readers use rows
+                    values = values.astype(str)
+                arrays[f"v{i}"], arrays[f"p{i}"] = values, present
+            tmp = self._file("columns.tmp.npz")
+            np.savez(tmp, **arrays)
+            os.replace(tmp, self._file("columns.npz"))
+
+    # ----- writing -----
+    def _commit(self):
+        self._db.execute("UPDATE state SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+        self._db.commit()
+        self._version = self._state("version")
+
+    def _write_vectors(self, slots: np.ndarray, vectors: np.ndarray):
+        dim = vectors.shape[1]
+        if self._vectors is not None and self._vectors.shape[1] != dim:
+            raise ValueError(f"Embedding dimension {dim} does not match collection dimensionality {self._vectors.shape[1]}")
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if self._n > capacity:
+            self._resize(max(self._n, 2 * capacity, 1024), dim)
+        elif self._vectors.mode != "r+":
+            self._open_vectors("r+")
+        if self._scales is not None:
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._vectors[slots] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._scales[slots] = scales
+            self._scales.flush()
+        else:
+            self._vectors[slots] = vectors
+        self._vectors.flush()
+
+    def _resize(self, capacity: int, dim: int):
+        """Copy the matrix into a larger file and swap it in; readers keep their old mapping until they refresh."""
+        names = ["vectors.npy"] + (["scales.npy"] if self.dtype == np.int8 else [])
+        old = {"vectors.npy": self._vectors, "scales.npy": self._scales}
+        for name in names:
+            shape = (capacity, dim) if name == "vectors.npy" else (capacity,)
+            dtype = self.dtype if name == "vectors.npy" else np.float32
+            tmp = self._file(name + ".tmp")
+            grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=shape)
+            if old[name] is not None:
+                grown[:len(old[name])] = old[name]
+            grown.flush()
+            del grown
+            os.replace(tmp, self._file(name))
+        self._open_vectors("r+")
+
+
+class NumpyVectorStore:
+    """Stand-in for chromadb.PersistentClient: one sub-directory per collection."""
+
+    def __init__(self, path: str, dtype: str = "float32"):
+        self.path = path
+        self.dtype = dtype
+        os.makedirs(path, exist_ok=True)
+
+    def _dir(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def get_or_create_collection(self, name: str) -> NumpyCollection:
+        return NumpyCollection(self._dir(name), name, self.dtype)
+
+    def get_collection(self, name: str) -> NumpyCollection:
+        if not os.path.exists(os.path.join(self._dir(name), "rows.sqlite3")):
+            raise ValueError(f"Collection {name} does not exist.")
+        return NumpyCollection(self._dir(name), name, self.dtype)
+
+    def delete_collection(self, name: str):
+        if not os.path.isdir(self._dir(name)):
+            raise ValueError(f"Collection {name} does not exist.")
+        shutil.rmtree(self._dir(name))